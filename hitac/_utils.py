@@ -1,13 +1,29 @@
 """Helper functions for data manipulation."""
 
+import argparse
+import atexit
+import bz2
 import concurrent.futures
-import itertools
+import functools
+import gzip
+import hashlib
+import io
 import logging
-from itertools import product
+import lzma
+import mmap
+import os
+import pickle
+import queue
+import re
+import shutil
+import tempfile
+import threading
+from itertools import islice, zip_longest
 from multiprocessing import cpu_count
 
 import numpy as np
 from hiclass import LocalClassifierPerParentNode
+from scipy import sparse as sp
 from sklearn.linear_model import LogisticRegression
 from typing import List, TextIO
 
@@ -34,26 +50,1019 @@ if not logger.hasHandlers():
     # Add ch to logger
     logger.addHandler(ch)
 
+# 2-bit code of each byte, where 4 marks anything outside ACGT
+_BASE_CODES = np.full(256, 4, dtype=np.uint8)
+_BASE_CODES[np.frombuffer(b"ACGT", dtype=np.uint8)] = np.arange(4, dtype=np.uint8)
+
+# Same as _BASE_CODES, but also accepting soft-masked (lowercase) bases
+_SOFT_MASKED_BASE_CODES = _BASE_CODES.copy()
+_SOFT_MASKED_BASE_CODES[np.frombuffer(b"acgt", dtype=np.uint8)] = np.arange(
+    4, dtype=np.uint8
+)
+
+# Bases compatible with each IUPAC code as a bit mask (A=1, C=2, G=4, T=8), 0 for non-bases
+_IUPAC_MASKS = np.zeros(256, dtype=np.uint8)
+for _codes, _mask in zip(
+    [
+        b"A",
+        b"C",
+        b"G",
+        b"T",
+        b"U",
+        b"R",
+        b"Y",
+        b"S",
+        b"W",
+        b"K",
+        b"M",
+        b"B",
+        b"D",
+        b"H",
+        b"V",
+        b"N",
+    ],
+    [1, 2, 4, 8, 8, 5, 10, 6, 9, 12, 3, 14, 13, 11, 7, 15],
+):
+    _IUPAC_MASKS[np.frombuffer(_codes + _codes.lower(), dtype=np.uint8)] = _mask
+
+# Number of bases in each mask and their 2-bit codes
+_MASK_SIZES = np.array([bin(mask).count("1") for mask in range(16)])
+_MASK_BASES = np.array(
+    [
+        [i for i in range(4) if mask >> i & 1] + [0] * (4 - _MASK_SIZES[mask])
+        for mask in range(16)
+    ],
+    dtype=np.uint8,
+)
+
+# Multiplier of the rolling k-mer index, and constants of the polynomial rolling hash and of
+# the splitmix64 finalizer
+_INDEX_MULTIPLIER = np.uint64(4)
+_HASH_MULTIPLIER = np.uint64(0x100000001B3)
+_MIX_MULTIPLIERS = (np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB))
+_MIX_SHIFTS = (np.uint64(30), np.uint64(27), np.uint64(31))
+_MAX_HASH_SEED = 2**64 - 1
+# Number of counts accumulated at once before they are cast to the output dtype
+_ACCUMULATE_SIZE = 1 << 22
+
+
+class KmerVocabulary:
+    """
+    K-mer feature space of one or more k-mer sizes or spaced seeds, with optional canonical k-mers, hashing and ambiguous bases.
+
+    The vocabulary takes constant memory for any k-mer size. It behaves as a read-only array of
+    feature names, which are only built when indexed, iterated or converted with np.asarray.
+    """
 
-def compute_possible_kmers(kmer_size: int = 6, alphabet: str = "ACGT") -> np.ndarray:
+    def __init__(
+        self,
+        kmer_size,
+        canonical: bool = False,
+        hash_buckets: int = None,
+        hash_seed: int = 0,
+        max_ambiguous: int = None,
+        spaced_seeds: list = None,
+        dtype: str = None,
+        normalization: str = None,
+        idf: np.ndarray = None,
+        selection: np.ndarray = None,
+    ):
+        """
+        Initialize the k-mer feature space.
+
+        Parameters
+        ----------
+        kmer_size : {int, list}
+            K-mer size, or list of k-mer sizes whose features are concatenated.
+        canonical : bool, default=False
+            Count each k-mer and its reverse complement as the same feature.
+        hash_buckets : int, default=None
+            If set, k-mers are hashed into this many features per k-mer size instead of
+            enumerating all of them.
+        hash_seed : int, default=0
+            Seed of the hash function when hash_buckets is set.
+        max_ambiguous : int, default=None
+            If set, windows with up to this many IUPAC ambiguity codes are counted as fractions
+            of every compatible k-mer, and soft-masked bases as uppercase ones.
+        spaced_seeds : {str, list}, default=None
+            Binary mask, e.g., "1101011", or list of masks of spaced k-mers made of the bases
+            at the positions marked with 1. If set, kmer_size is ignored.
+        dtype : str, default=None
+            Data type of the frequencies, e.g., "uint8", "uint16" or "float32". Integer counts
+            saturate at the largest value of the type. If None, counts are int64, or float64
+            when they are fractional or normalized.
+        normalization : {None, "length", "tfidf"}, default=None
+            Divide the counts of each sequence by its number of k-mers ("length"), and also
+            weight them by the inverse document frequency of each feature ("tfidf").
+        idf : np.ndarray, default=None
+            Inverse document frequency of each feature with tf-idf normalization. If None, it
+            is computed by compute_frequencies from the training sequences.
+        selection : np.ndarray, default=None
+            Indices of the features that are kept, as chosen by select_features. If None, all
+            features are kept.
+        """
+        if hash_buckets is not None and hash_buckets < 1:
+            raise ValueError("The number of hash buckets must be positive.")
+        _check_hash_seed(hash_seed)
+        if max_ambiguous is not None and max_ambiguous < 0:
+            raise ValueError(
+                "The maximum number of ambiguous bases cannot be negative."
+            )
+        if isinstance(spaced_seeds, str):
+            spaced_seeds = [spaced_seeds]
+        if spaced_seeds is not None:
+            for spaced_seed in spaced_seeds:
+                if not re.fullmatch("1[01]*1|1", spaced_seed):
+                    raise ValueError(
+                        f"Invalid spaced seed {spaced_seed}, it must be made of 0s and 1s "
+                        "and start and end with 1."
+                    )
+                # The reverse complement must sample the same positions to be comparable
+                if canonical and spaced_seed != spaced_seed[::-1]:
+                    raise ValueError(
+                        f"Spaced seed {spaced_seed} must be symmetric for canonical k-mers."
+                    )
+            kmer_size = None
+            spaced_seeds = list(spaced_seeds)
+        else:
+            # A single size is kept as an int, so that the vocabulary equals its single-k form
+            kmer_sizes = _get_kmer_sizes(kmer_size)
+            kmer_size = kmer_sizes[0] if len(kmer_sizes) == 1 else kmer_sizes
+        for block in spaced_seeds or _get_kmer_sizes(kmer_size):
+            _check_kmer_size(
+                block.count("1") if isinstance(block, str) else block, hash_buckets
+            )
+        if normalization not in (None, "length", "tfidf"):
+            raise ValueError(f"Unknown normalization {normalization}.")
+        if (
+            dtype is not None
+            and np.dtype(dtype).kind != "f"
+            and (normalization is not None or max_ambiguous)
+        ):
+            raise ValueError(
+                "Normalized or fractional counts need a floating point dtype."
+            )
+        self.kmer_size = kmer_size
+        self.canonical = canonical
+        self.hash_buckets = hash_buckets
+        self.hash_seed = hash_seed
+        self.max_ambiguous = max_ambiguous
+        self.spaced_seeds = spaced_seeds
+        self.dtype = dtype
+        self.normalization = normalization
+        self.idf = idf
+        self.selection = None if selection is None else np.asarray(selection, np.int64)
+
+    def __len__(self) -> int:
+        """Return the number of features."""
+        if self.selection is not None:
+            return len(self.selection)
+        return self.layout[-1][2]
+
+    @property
+    def layout(self) -> list:
+        """
+        Return where the features of each k-mer size or spaced seed are in the feature matrix.
+
+        Returns
+        -------
+        layout : list
+            List of (kmer_size, start, stop) tuples with the columns of each k-mer size, where
+            the spaced seed takes the place of the k-mer size for spaced k-mers. Columns refer
+            to the features before selection.
+        """
+        layout = []
+        start = 0
+        for block in self.spaced_seeds or _get_kmer_sizes(self.kmer_size):
+            kmer_size = block.count("1") if isinstance(block, str) else block
+            if self.hash_buckets is not None:
+                n_features = self.hash_buckets
+            elif self.canonical:
+                n_features = _count_canonical_kmers(kmer_size)
+            else:
+                n_features = 4**kmer_size
+            layout.append((block, start, start + n_features))
+            start += n_features
+        return layout
+
+    @property
+    def shape(self) -> tuple:
+        """Return the shape of the array of feature names."""
+        return (len(self),)
+
+    def __getitem__(self, index):
+        """
+        Return the names of features.
+
+        Parameters
+        ----------
+        index : {int, slice, array-like}
+            Column of a feature, or columns of several features.
+
+        Returns
+        -------
+        name : {str, np.ndarray}
+            The k-mer of the feature, e.g., "ACGT", with "-" at the skipped positions of spaced
+            k-mers, or the bucket of hashed k-mers, e.g., "12-mer bucket 37".
+        """
+        if np.ndim(index) == 0 and not isinstance(index, slice):
+            return self._get_name(range(len(self))[index])
+        if isinstance(index, slice):
+            columns = range(len(self))[index]
+        else:
+            columns = np.asarray(index)
+            if columns.dtype == bool:
+                columns = np.flatnonzero(columns)
+            columns = np.where(columns < 0, columns + len(self), columns)
+        return np.array([self._get_name(column) for column in columns], dtype=str)
+
+    def __iter__(self):
+        """Iterate over the feature names."""
+        for column in range(len(self)):
+            yield self._get_name(column)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        """Return the array of feature names."""
+        names = np.array(list(self), dtype=str)
+        return names if dtype is None else names.astype(dtype)
+
+    def _get_name(self, column: int) -> str:
+        if self.selection is not None:
+            column = int(self.selection[column])
+        for block, start, stop in self.layout:
+            if column < stop:
+                break
+        code = column - start
+        kmer_size = block.count("1") if isinstance(block, str) else block
+        if self.hash_buckets is not None:
+            label = block if isinstance(block, str) else f"{block}-mer"
+            return f"{label} bucket {code}"
+        if self.canonical:
+            bases = iter("ACGT"[base] for base in _unrank_canonical(code, kmer_size))
+        else:
+            bases = iter(
+                "ACGT"[(code >> (2 * i)) & 3] for i in reversed(range(kmer_size))
+            )
+        if isinstance(block, str):
+            return "".join(next(bases) if care == "1" else "-" for care in block)
+        return "".join(bases)
+
+    def __eq__(self, other):
+        """
+        Return whether both vocabularies produce the same features.
+
+        Other objects are compared with the feature names element-wise, as arrays are.
+        """
+        if not isinstance(other, KmerVocabulary):
+            return np.asarray(self) == other
+        return _equal_parameters(vars(self), vars(other))
+
+    def __ne__(self, other):
+        """Return whether both vocabularies produce different features."""
+        if not isinstance(other, KmerVocabulary):
+            return np.asarray(self) != other
+        return not self == other
+
+    def __repr__(self) -> str:
+        """Return a readable representation of the feature space."""
+        parameters = ", ".join(
+            (
+                f"{key}=array(shape={value.shape})"
+                if isinstance(value, np.ndarray)
+                else f"{key}={value}"
+            )
+            for key, value in vars(self).items()
+        )
+        return f"KmerVocabulary({parameters})"
+
+
+def compute_possible_kmers(
+    kmer_size=6,
+    alphabet: str = "ACGT",
+    hash_buckets: int = None,
+    hash_seed: int = 0,
+    canonical: bool = False,
+    max_ambiguous: int = None,
+    spaced_seeds: list = None,
+    dtype: str = None,
+    normalization: str = None,
+):
     """
-    Compute all kmer possibilities based on given alphabet.
+    Get the vocabulary of all possible k-mers.
 
     Parameters
     ----------
-    kmer_size : int, default=6
-        K-mer size.
+    kmer_size : {int, list}, default=6
+        K-mer size, or list of k-mer sizes whose features are concatenated.
     alphabet : str, default='ACGT'
-        The alphabet used to compute k-mers.
+        The alphabet of the k-mers. Only ACGT is supported.
+    hash_buckets : int, default=None
+        If set, k-mers are hashed into this many features per k-mer size instead of
+        enumerating all 4^k k-mers.
+    hash_seed : int, default=0
+        Seed of the hash function when hash_buckets is set.
+    canonical : bool, default=False
+        Count each k-mer and its reverse complement as the same feature.
+    max_ambiguous : int, default=None
+        If set, windows with up to this many IUPAC ambiguity codes are counted as fractions of
+        every compatible k-mer.
+    spaced_seeds : {str, list}, default=None
+        Binary masks of spaced k-mers, e.g., "1101011", used instead of kmer_size.
+    dtype : str, default=None
+        Data type of the frequencies, e.g., "uint8", "uint16" or "float32".
+    normalization : {None, "length", "tfidf"}, default=None
+        Normalization of the counts of each sequence.
+
+    Returns
+    -------
+    kmers : KmerVocabulary
+        The vocabulary, which names its k-mers only when they are accessed.
+    """
+    if alphabet != "ACGT":
+        raise ValueError(f"Unsupported alphabet {alphabet}, k-mers are made of ACGT.")
+    return KmerVocabulary(
+        kmer_size,
+        canonical,
+        hash_buckets,
+        hash_seed,
+        max_ambiguous,
+        spaced_seeds,
+        dtype,
+        normalization,
+    )
+
+
+def encode_sequences(sequences: list, soft_masked: bool = False) -> tuple:
+    """
+    Encode sequences as 2-bit base codes.
+
+    Parameters
+    ----------
+    sequences : {list, SequenceBuffer}
+        List containing sequences as bytes (or str), or sequences loaded from a FASTA file.
+    soft_masked : bool, default=False
+        Encode lowercase bases like uppercase ones instead of as unknown bases.
+
+    Returns
+    -------
+    codes, rows : tuple
+        Base codes of the concatenated sequences and the row of the sequence that each position
+        belongs to. Bases outside ACGT and the separators between sequences are encoded as 4.
+    """
+    buffer, rows = _join_sequences(sequences)
+    table = _SOFT_MASKED_BASE_CODES if soft_masked else _BASE_CODES
+    return table[buffer], rows
+
+
+def _join_sequences(sequences: list) -> tuple:
+    if isinstance(sequences, SequenceBuffer):
+        return sequences.join()
+    sequences = [s.encode("utf-8") if isinstance(s, str) else s for s in sequences]
+    buffer = np.frombuffer(b"\n".join(sequences), dtype=np.uint8)
+    lengths = np.fromiter(
+        (len(s) + 1 for s in sequences), dtype=np.int64, count=len(sequences)
+    )
+    rows = np.repeat(np.arange(len(sequences)), lengths)[: len(buffer)]
+    return buffer, rows
+
+
+def _encode_sequences(sequences, soft_masked: bool, ambiguous: bool) -> tuple:
+    # 2-bit codes of the concatenated sequences, their IUPAC masks if ambiguous, whether each
+    # position is a separator and its row. Packed sequences are decoded from their 2-bit codes.
+    if isinstance(sequences, PackedSequences):
+        return sequences.join_codes(soft_masked, ambiguous)
+    buffer, rows = _join_sequences(sequences)
+    codes = (_SOFT_MASKED_BASE_CODES if soft_masked else _BASE_CODES)[buffer]
+    masks = _IUPAC_MASKS[buffer] if ambiguous else None
+    return codes, masks, buffer == _NEWLINE, rows
+
+
+def _fold_kmers(
+    bases, offsets: list, lengths: list, multiplier: np.uint64, canonical: bool
+):
+    # Rolling polynomial over the bases at the given offsets of every window, where bases
+    # returns the 2-bit codes at an offset. With multiplier 4 it is the index of the k-mer.
+    # Yields the values of the windows made of the first offsets for each of the lengths, so
+    # that every k-mer size is derived from the same pass.
+    forward = reverse = None
+    power = np.ones(1, dtype=np.uint64)
+    for i, offset in enumerate(offsets[: max(lengths)]):
+        base = bases(offset) & 3
+        if forward is None:
+            forward = np.zeros(len(base), dtype=np.uint64)
+            reverse = np.zeros_like(forward)
+        forward *= multiplier
+        forward += base
+        if canonical:
+            reverse += (3 - base) * power
+            power *= multiplier
+        if i + 1 in lengths:
+            yield np.minimum(forward, reverse) if canonical else forward.copy()
+
+
+def _get_kmer_columns(
+    values: np.ndarray,
+    kmer_size: int,
+    canonical: bool = False,
+    hash_buckets: int = None,
+    hash_seed: int = 0,
+) -> tuple:
+    # Map the k-mer values computed by _fold_kmers to feature columns
+    if hash_buckets is not None:
+        values ^= np.uint64(hash_seed)
+        values ^= values >> _MIX_SHIFTS[0]
+        values *= _MIX_MULTIPLIERS[0]
+        values ^= values >> _MIX_SHIFTS[1]
+        values *= _MIX_MULTIPLIERS[1]
+        values ^= values >> _MIX_SHIFTS[2]
+        return (values % np.uint64(hash_buckets)).astype(np.int64), hash_buckets
+    if canonical:
+        return _rank_canonical(values, kmer_size), _count_canonical_kmers(kmer_size)
+    return values.astype(np.int64), 4**kmer_size
+
+
+def _count_canonical_kmers(kmer_size: int) -> int:
+    # Only k-mers of even size can be their own reverse complement
+    palindromes = 4 ** (kmer_size // 2) if kmer_size % 2 == 0 else 0
+    return (4**kmer_size + palindromes) // 2
+
+
+def _rank_canonical(values: np.ndarray, kmer_size: int) -> np.ndarray:
+    # Rank of each canonical k-mer among the canonical k-mers, which sums, over every position,
+    # the canonical k-mers that share the bases before it and have a smaller base there, as
+    # counted by _count_canonical but for all the windows at once
+    dtype = np.int32 if kmer_size <= 15 else np.int64
+    codes = [
+        ((values >> np.uint64(2 * (kmer_size - 1 - i))) & np.uint64(3)).astype(dtype)
+        for i in range(kmer_size)
+    ]
+    ranks = np.zeros(len(values), dtype=dtype)
+    # Complements of the first bases read as a number, which weigh the free mirrored bases
+    complements = [np.zeros_like(ranks)]
+    for i in range(kmer_size // 2):
+        code = codes[i]
+        free = kmer_size - 2 * i - 2
+        ranks += code * (
+            complements[-1] * 4 ** (free + 1) + _count_canonical_kmers(free)
+        )
+        ranks += (3 * code - code * (code - 1) // 2) * 4**free
+        complements.append(4 * complements[-1] + 3 - code)
+    # Whether the bases between the mirrored ones make a canonical k-mer on their own
+    if kmer_size % 2 == 0:
+        inner = np.ones(len(values), dtype=bool)
+    else:
+        code = codes[kmer_size // 2]
+        ranks += code * complements[-1] + np.minimum(code, 2)
+        inner = code <= 1
+    for i in range((kmer_size + 1) // 2, kmer_size):
+        mirrored, code = codes[kmer_size - 1 - i], codes[i]
+        ranks += code * complements[kmer_size - 1 - i] + np.minimum(code, 3 - mirrored)
+        ranks += inner & (3 - mirrored < code)
+        inner = np.where(mirrored + code == 3, inner, mirrored + code < 3)
+    return ranks.astype(np.int64, copy=False)
+
+
+def _count_canonical(prefix: list, kmer_size: int) -> int:
+    # Number of canonical k-mers starting with the given base codes. A k-mer is canonical when
+    # the first pair of mirrored bases that are not complementary sums to less than 3.
+    count = 0
+    free = kmer_size - len(prefix)
+    for i in range(kmer_size // 2):
+        j = kmer_size - 1 - i
+        if i >= len(prefix):
+            # The bases from i to j are free, and the outer ones complementary
+            return count + _count_canonical_kmers(free)
+        if j < len(prefix):
+            if prefix[i] + prefix[j] != 3:
+                return count + (4 ** free if prefix[i] + prefix[j] < 3 else 0)
+            continue
+        # The mirrored base of a known one decides the k-mer unless it is its complement
+        count += (3 - prefix[i]) * 4 ** (free - 1)
+        free -= 1
+    if kmer_size % 2 == 0:
+        return count + 1
+    middle = kmer_size // 2
+    return count + (2 if middle >= len(prefix) else int(prefix[middle] <= 1))
+
+
+def _unrank_canonical(rank: int, kmer_size: int) -> list:
+    # Base codes of the canonical k-mer of the given rank, without enumerating the k-mers
+    prefix = []
+    for _ in range(kmer_size):
+        for base in range(4):
+            count = _count_canonical(prefix + [base], kmer_size)
+            if rank < count:
+                prefix.append(base)
+                break
+            rank -= count
+    return prefix
+
+
+def _count_in_windows(flags: np.ndarray, offsets: list, windows: int) -> np.ndarray:
+    # Number of flagged bases at the given offsets of every window
+    if offsets[-1] - offsets[0] + 1 == len(offsets):
+        counts = np.concatenate(([0], np.cumsum(flags)))
+        return (
+            counts[offsets[-1] + 1 : offsets[-1] + 1 + windows]
+            - counts[offsets[0] : offsets[0] + windows]
+        )
+    return sum(flags[offset : offset + windows].astype(np.int64) for offset in offsets)
+
+
+def _expand_ambiguous_windows(
+    codes: np.ndarray, masks: np.ndarray, starts: np.ndarray, offsets: list
+) -> tuple:
+    # Enumerate the unambiguous k-mers compatible with each window, returning their base codes,
+    # the window that each one comes from and its share of the window count
+    window_codes = codes[starts[:, np.newaxis] + offsets]
+    window_masks = masks[starts[:, np.newaxis] + offsets]
+    origin = np.arange(len(starts))
+    weights = np.ones(len(starts))
+    for offset in range(len(offsets)):
+        ambiguous = window_codes[:, offset] > 3
+        if not ambiguous.any():
+            continue
+        sizes = np.where(ambiguous, _MASK_SIZES[window_masks[:, offset]], 1)
+        repeats = np.repeat(np.arange(len(origin)), sizes)
+        ranks = np.arange(len(repeats)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        window_codes = window_codes[repeats]
+        origin = origin[repeats]
+        weights = weights[repeats] / sizes[repeats]
+        expanded = ambiguous[repeats]
+        window_codes[expanded, offset] = _MASK_BASES[
+            window_masks[repeats[expanded], offset], ranks[expanded]
+        ]
+        window_masks = window_masks[repeats]
+    return window_codes, origin, weights
+
+
+def _accumulate(
+    rows: np.ndarray,
+    columns: np.ndarray,
+    weights: np.ndarray,
+    shape: tuple,
+    sparse: bool,
+    dtype: str = None,
+    out: np.ndarray = None,
+):
+    positions = rows * shape[1] + columns
+    if sparse:
+        positions, inverse = np.unique(positions, return_inverse=True)
+        counts = np.bincount(inverse.ravel(), weights=weights, minlength=len(positions))
+        indptr = np.zeros(shape[0] + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(positions // shape[1], minlength=shape[0]), out=indptr[1:]
+        )
+        counts = _cast_frequencies(counts, dtype)
+        return sp.csr_matrix((counts, positions % shape[1], indptr), shape=shape)
+    if out is None:
+        if dtype is None:
+            dtype = np.int64 if weights is None else np.float64
+        out = np.zeros(shape, dtype=dtype)
+    # Rows are counted in blocks, so that the counts before casting to the output dtype take
+    # a bounded amount of memory
+    block_rows = max(_ACCUMULATE_SIZE // max(shape[1], 1), 1)
+    if shape[0] <= block_rows:
+        blocks = [np.arange(len(positions))]
+    else:
+        block_ids = rows // block_rows
+        order = np.argsort(
+            block_ids.astype(np.min_scalar_type(shape[0] // block_rows)), kind="stable"
+        )
+        bounds = np.zeros(shape[0] // block_rows + 2, dtype=np.int64)
+        np.cumsum(np.bincount(block_ids, minlength=len(bounds) - 1), out=bounds[1:])
+        blocks = [order[begin:end] for begin, end in zip(bounds[:-1], bounds[1:])]
+    for i, block in enumerate(blocks):
+        start, stop = i * block_rows, min((i + 1) * block_rows, shape[0])
+        if start >= stop:
+            break
+        counts = np.bincount(
+            positions[block] - start * shape[1],
+            weights=None if weights is None else weights[block],
+            minlength=(stop - start) * shape[1],
+        )
+        out[start:stop] = _cast_frequencies(counts, out.dtype).reshape(
+            stop - start, shape[1]
+        )
+    return out
+
+
+def _cast_frequencies(frequencies: np.ndarray, dtype: str = None) -> np.ndarray:
+    # Integer types saturate instead of wrapping around
+    if dtype is None:
+        return frequencies
+    dtype = np.dtype(dtype)
+    if dtype.kind in "ui":
+        np.minimum(frequencies, np.iinfo(dtype).max, out=frequencies)
+    return frequencies.astype(dtype, copy=False)
+
+
+def count_kmers(
+    sequences: list,
+    kmer_size,
+    sparse: bool = False,
+    hash_buckets: int = None,
+    hash_seed: int = 0,
+    canonical: bool = False,
+    max_ambiguous: int = None,
+    spaced_seeds: list = None,
+    dtype: str = None,
+    normalization: str = None,
+    idf: np.ndarray = None,
+    selection: np.ndarray = None,
+    out: np.ndarray = None,
+):
+    """
+    Count k-mers for a batch of sequences.
+
+    Parameters
+    ----------
+    sequences : {list, SequenceBuffer}
+        List containing sequences as bytes (or str).
+    kmer_size : {int, list}
+        K-mer size (at most 31 unless hashing), or list of k-mer sizes whose features are
+        concatenated in ascending order of size.
+    sparse : bool, default=False
+        Return a scipy.sparse.csr_matrix instead of a dense array.
+    hash_buckets : int, default=None
+        If set, count hash buckets instead of k-mers, with this many buckets per k-mer size.
+    hash_seed : int, default=0
+        Seed of the hash function when hash_buckets is set.
+    canonical : bool, default=False
+        Count each k-mer and its reverse complement as the same feature.
+    max_ambiguous : int, default=None
+        If set, soft-masked bases are counted as uppercase and windows with up to this many
+        IUPAC ambiguity codes are spread as fractional counts over every compatible k-mer.
+        Windows with more ambiguous bases are skipped. If None, any window containing a base
+        outside ACGT is skipped.
+    spaced_seeds : {str, list}, default=None
+        If set, count spaced k-mers instead of contiguous ones, made of the bases at the
+        positions marked with 1 in each of these binary masks, e.g., "1101011". Their features
+        are concatenated in the given order and kmer_size is ignored.
+    dtype : str, default=None
+        Data type of the frequencies, e.g., "uint8", "uint16" or "float32". Integer counts
+        saturate at the largest value of the type.
+    normalization : {None, "length", "tfidf"}, default=None
+        Divide the counts of each sequence by its number of k-mers ("length"), and also
+        multiply them by idf ("tfidf").
+    idf : np.ndarray, default=None
+        Inverse document frequency of each feature used by tf-idf normalization. If None,
+        only the term frequencies are computed.
+    selection : np.ndarray, default=None
+        Indices of the features to keep. The other features are neither accumulated nor
+        stored, but still count towards the length normalization.
+    out : np.ndarray, default=None
+        Dense matrix of shape (n_sequences, n_features) that the counts are written into, e.g.,
+        rows of a larger or memory-mapped matrix, cast to its dtype. Ignored when sparse.
+
+    Returns
+    -------
+    frequencies : {np.ndarray, csr_matrix}
+        Matrix of shape (n_sequences, 4^k) with the k-mer counts in lexicographic ACGT order,
+        with only the lexicographically smallest k-mer of each reverse complement pair when
+        canonical, or of shape (n_sequences, hash_buckets) when hashing. With several k-mer
+        sizes or spaced seeds, their blocks are concatenated as in KmerVocabulary.layout.
+        Counts are float when max_ambiguous is positive or with normalization, unless dtype
+        is set. With selection, only the selected columns are returned, in its order.
+    """
+    _check_hash_seed(hash_seed)
+    folds = _get_kmer_folds(kmer_size, spaced_seeds)
+    for _, lengths in folds:
+        for length in lengths:
+            _check_kmer_size(length, hash_buckets)
+    spans = [
+        offsets[length - 1] + 1 for offsets, lengths in folds for length in lengths
+    ]
+    codes, masks, separators, rows = _encode_sequences(
+        sequences, max_ambiguous is not None, bool(max_ambiguous)
+    )
+    multiplier = _INDEX_MULTIPLIER if hash_buckets is None else _HASH_MULTIPLIER
+    # Windows of every span start at the same positions, with the longer ones running into
+    # unknown bases padded at the end
+    windows = max(len(codes) - min(spans) + 1, 0)
+    padding = max(spans) - min(spans)
+    codes = np.concatenate((codes, np.full(padding, 4, dtype=np.uint8)))
+    if max_ambiguous:
+        masks = np.concatenate((masks, np.zeros(padding, np.uint8)))
+    # Spaced k-mers skip positions, but must not span the separator between sequences
+    separators = np.concatenate((separators, np.ones(padding, dtype=bool)))
+    starts, columns, weights = [], [], []
+    n_features = 0
+    for offsets, lengths in folds:
+        window_values = _fold_kmers(
+            lambda offset: codes[offset : offset + windows],
+            offsets,
+            lengths,
+            multiplier,
+            canonical,
+        )
+        for length, values in zip(lengths, window_values):
+            kmer_offsets = offsets[:length]
+            n_ambiguous = _count_in_windows(codes > 3, kmer_offsets, windows)
+            if len(kmer_offsets) < kmer_offsets[-1] + 1:
+                span = range(kmer_offsets[-1] + 1)
+                n_ambiguous[_count_in_windows(separators, span, windows) > 0] = -1
+            kmer_starts = np.flatnonzero(n_ambiguous == 0)
+            values = values[kmer_starts]
+            if max_ambiguous:
+                n_invalid = _count_in_windows(masks == 0, kmer_offsets, windows)
+                ambiguous_starts = np.flatnonzero(
+                    (n_invalid == 0)
+                    & (n_ambiguous > 0)
+                    & (n_ambiguous <= max_ambiguous)
+                )
+                window_codes, origin, expanded_weights = _expand_ambiguous_windows(
+                    codes, masks, ambiguous_starts, kmer_offsets
+                )
+                (expanded_values,) = _fold_kmers(
+                    lambda offset: window_codes[:, offset],
+                    range(length),
+                    [length],
+                    multiplier,
+                    canonical,
+                )
+                weights.append(np.ones(len(kmer_starts)))
+                weights.append(expanded_weights)
+                kmer_starts = np.concatenate((kmer_starts, ambiguous_starts[origin]))
+                values = np.concatenate((values, expanded_values))
+            kmer_columns, n_columns = _get_kmer_columns(
+                values, length, canonical, hash_buckets, hash_seed
+            )
+            starts.append(kmer_starts)
+            columns.append(kmer_columns + n_features)
+            n_features += n_columns
+    rows = rows[np.concatenate(starts)]
+    columns = np.concatenate(columns)
+    weights = np.concatenate(weights) if max_ambiguous else None
+    if normalization is not None:
+        # Scale the contribution of each k-mer, so that no unnormalized matrix is built
+        totals = np.bincount(rows, weights=weights, minlength=len(sequences))
+        scale = 1 / np.maximum(totals, 1)
+        weights = scale[rows] if weights is None else weights * scale[rows]
+        if normalization == "tfidf" and idf is not None:
+            weights *= idf[columns]
+    if selection is not None:
+        # Renumber the selected features and drop the occurrences of the others
+        renumber = np.full(n_features, -1, dtype=np.int64)
+        renumber[selection] = np.arange(len(selection))
+        columns = renumber[columns]
+        kept = np.flatnonzero(columns >= 0)
+        rows, columns = rows[kept], columns[kept]
+        weights = None if weights is None else weights[kept]
+        n_features = len(selection)
+    return _accumulate(
+        rows, columns, weights, (len(sequences), n_features), sparse, dtype, out
+    )
+
+
+def _check_kmer_size(kmer_size: int, hash_buckets: int = None):
+    # Unhashed k-mers are indexed by 2 bits per base in 64-bit integers
+    if kmer_size < 1 or (hash_buckets is None and kmer_size > 31):
+        raise ValueError(
+            f"Invalid k-mer size {kmer_size}, it must be between 1 and 31, or at least 1 "
+            "with hash_buckets set."
+        )
+
+
+def _check_hash_seed(hash_seed: int):
+    # The seed is mixed into 64-bit unsigned k-mer values
+    if not 0 <= hash_seed <= _MAX_HASH_SEED:
+        raise ValueError(
+            f"Invalid hash seed {hash_seed}, it must be between 0 and 2^64 - 1."
+        )
+
+
+def _get_kmer_folds(kmer_size, spaced_seeds: list = None) -> list:
+    # Offsets folded into the k-mers of each block and the number of offsets of each k-mer
+    # derived from them. Contiguous k-mers of every size share a single fold.
+    if spaced_seeds is None:
+        kmer_sizes = _get_kmer_sizes(kmer_size)
+        return [(list(range(kmer_sizes[-1])), kmer_sizes)]
+    if isinstance(spaced_seeds, str):
+        spaced_seeds = [spaced_seeds]
+    folds = []
+    for spaced_seed in spaced_seeds:
+        offsets = [i for i, care in enumerate(spaced_seed) if care == "1"]
+        folds.append((offsets, [len(offsets)]))
+    return folds
+
+
+def parse_kmer_size(value: str):
+    """
+    Parse a k-mer size or a comma-separated list of k-mer sizes from the command line.
+
+    Parameters
+    ----------
+    value : str
+        K-mer size, e.g., "6", or k-mer sizes, e.g., "4,5,6".
 
     Returns
     -------
-    kmers : np.ndarray
-        Numpy array containing all possible k-mers.
+    kmer_size : {int, list}
+        The k-mer size, or the list of k-mer sizes.
     """
-    logger.info("Computing possible k-mers")
-    kmers = ["".join(c) for c in product(alphabet, repeat=kmer_size)]
-    return np.array(kmers)
+    kmer_sizes = [int(size) for size in value.split(",")]
+    return kmer_sizes[0] if len(kmer_sizes) == 1 else kmer_sizes
+
+
+def parse_hash_seed(value: str) -> int:
+    """
+    Parse the seed of the hash function from the command line.
+
+    Parameters
+    ----------
+    value : str
+        Seed between 0 and 2^64 - 1, e.g., "5".
+
+    Returns
+    -------
+    hash_seed : int
+        The seed.
+    """
+    try:
+        hash_seed = int(value)
+        _check_hash_seed(hash_seed)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+    return hash_seed
+
+
+def add_feature_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the k-mer feature options shared by the scripts that train models.
+
+    Parameters
+    ----------
+    parser : argparse.ArgumentParser
+        Parser of the script, whose arguments are then passed to compute_training_features
+        with get_feature_options.
+    """
+    parser.add_argument(
+        "--kmer",
+        type=parse_kmer_size,
+        required=False,
+        default=6,
+        help="K-mer size for feature extraction, or comma-separated k-mer sizes whose features are combined, e.g., 4,5,6 [default: 6]",
+    )
+    parser.add_argument(
+        "--spaced-seeds",
+        type=str,
+        required=False,
+        default=None,
+        help="Comma-separated binary masks of spaced k-mers, e.g., 1101011, made of the bases at the positions marked with 1, used instead of --kmer [default: None]",
+    )
+    parser.add_argument(
+        "--canonical",
+        action="store_true",
+        help="Count each k-mer and its reverse complement as the same feature, which makes the model strand-agnostic [default: False]",
+    )
+    parser.add_argument(
+        "--hash-buckets",
+        type=int,
+        required=False,
+        default=None,
+        help="Hash k-mers into this number of features, which allows k-mer sizes beyond 8 [default: None]",
+    )
+    parser.add_argument(
+        "--hash-seed",
+        type=parse_hash_seed,
+        required=False,
+        default=0,
+        help="Seed of the hash function used with --hash-buckets [default: 0]",
+    )
+    parser.add_argument(
+        "--max-ambiguous",
+        type=int,
+        required=False,
+        default=None,
+        help="Count k-mers with up to this number of IUPAC ambiguous bases as fractions of every compatible k-mer, and soft-masked bases as uppercase [default: None]",
+    )
+    parser.add_argument(
+        "--dtype",
+        type=str,
+        required=False,
+        default=None,
+        choices=["uint8", "uint16", "float32"],
+        help="Data type of the k-mer frequencies, which reduces memory usage. Integer counts saturate at the largest value of the type [default: int64, or float64 for fractional or normalized counts]",
+    )
+    parser.add_argument(
+        "--normalization",
+        type=str,
+        required=False,
+        default=None,
+        choices=["length", "tfidf"],
+        help="Divide k-mer counts by the number of k-mers in each sequence, and also weight them by their inverse document frequency with tfidf [default: None]",
+    )
+    parser.add_argument(
+        "--sparse",
+        action="store_true",
+        help="Store k-mer frequencies in a sparse matrix, which reduces memory usage for large k-mer sizes [default: False]",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        required=False,
+        default=cpu_count(),
+        help="Number of threads to train in parallel [default: all]",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        required=False,
+        default="thread",
+        choices=FEATURE_BACKENDS,
+        help="Compute k-mer frequencies in threads, which share memory, or in processes, which serialize their inputs and outputs [default: thread]",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        required=False,
+        default=None,
+        help="Directory to cache k-mer frequencies of the reference, which are then reused by later runs with the same reference and k-mer options [default: None]",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=float,
+        required=False,
+        default=None,
+        help="Maximum size of the cache in GB, evicting the least recently used matrices [default: unlimited]",
+    )
+    parser.add_argument(
+        "--select-kmers",
+        type=int,
+        required=False,
+        default=None,
+        help="Keep only this number of k-mers, those most associated with the taxonomy by the chi-squared statistic, so that the models store and multiply fewer coefficients [default: all]",
+    )
+    parser.add_argument(
+        "--variance-threshold",
+        type=float,
+        required=False,
+        default=None,
+        help="Drop k-mers whose frequency varies across the reference by at most this variance [default: None]",
+    )
+    parser.add_argument(
+        "--cluster-similarity",
+        type=float,
+        required=False,
+        default=None,
+        help="Train on representatives of the reference sequences of each taxon, merging sequences whose k-mer profiles have at least this cosine similarity and weighting representatives by the number of sequences they stand for [default: None]",
+    )
+    parser.add_argument(
+        "--max-per-taxon",
+        type=int,
+        required=False,
+        default=None,
+        help="Maximum number of representatives per taxon, merging the smallest clusters into the most similar representatives [default: unlimited]",
+    )
+
+
+# Options added by add_feature_arguments, named as the parameters of compute_training_features
+FEATURE_OPTIONS = [
+    "kmer",
+    "spaced_seeds",
+    "canonical",
+    "hash_buckets",
+    "hash_seed",
+    "max_ambiguous",
+    "dtype",
+    "normalization",
+    "sparse",
+    "threads",
+    "backend",
+    "cache_dir",
+    "cache_size",
+    "select_kmers",
+    "variance_threshold",
+    "cluster_similarity",
+    "max_per_taxon",
+]
+
+
+def get_feature_options(args: argparse.Namespace) -> dict:
+    """
+    Get the k-mer feature options parsed from the command line.
+
+    Parameters
+    ----------
+    args : Namespace
+        Arguments parsed by a parser with the options of add_feature_arguments.
+
+    Returns
+    -------
+    options : dict
+        Keyword arguments of compute_training_features.
+    """
+    options = {option: getattr(args, option) for option in FEATURE_OPTIONS}
+    if options["spaced_seeds"]:
+        options["spaced_seeds"] = options["spaced_seeds"].split(",")
+    return options
+
+
+def _get_kmer_sizes(kmer_size) -> list:
+    if np.ndim(kmer_size) == 0:
+        return [int(kmer_size)]
+    return sorted(set(int(size) for size in kmer_size))
 
 
 def compute_kmer_frequency(sequence: str, kmers: list) -> np.array:
@@ -64,110 +1073,823 @@ def compute_kmer_frequency(sequence: str, kmers: list) -> np.array:
     ----------
     sequence : str
         Sequence to compute k-mer frequency.
-    kmers : list
-        List containing possible k-mers to compute frequency (anything else is not counted).
+    kmers : {list, KmerVocabulary}
+        List containing all possible k-mers, as computed by compute_possible_kmers.
 
     Returns
     -------
     frequency : np.array
         Numpy array containing frequency for all possible k-mers.
     """
-    dictionary = {}
-    for kmer in kmers:
-        dictionary[kmer] = 0
-    for i in range(len(sequence) - (len(kmers[0]) - 1)):
-        key = sequence[i : i + len(kmers[0])]
-        if key in dictionary:
-            dictionary[key] = dictionary[key] + 1
-    frequency = []
-    for kmer in kmers:
-        frequency.append(dictionary[kmer])
-    return np.array(frequency)
+    return count_kmers([sequence], **_get_kmer_parameters(kmers))[0]
+
+
+def _get_kmer_parameters(kmers) -> dict:
+    if isinstance(kmers, KmerVocabulary):
+        return vars(kmers).copy()
+    return {"kmer_size": len(kmers[0])}
+
+
+def _get_frequency_dtype(kmers) -> np.dtype:
+    if not isinstance(kmers, KmerVocabulary):
+        return np.dtype(np.int64)
+    if kmers.dtype is not None:
+        return np.dtype(kmers.dtype)
+    # Ambiguous windows are spread as fractional counts
+    if kmers.max_ambiguous or kmers.normalization is not None:
+        return np.dtype(np.float64)
+    return np.dtype(np.int64)
+
+
+def _equal_parameters(parameters: dict, other: dict) -> bool:
+    return parameters.keys() == other.keys() and all(
+        np.array_equal(parameters[key], other[key]) for key in parameters
+    )
+
+
+# Bounds on the number of bases in a batch: smaller batches are dominated by the cost of
+# submitting them to a worker, larger ones by the memory of their k-mer matrix
+_MIN_BATCH_BASES = 1 << 16
+_MAX_BATCH_BASES = 1 << 22
+# Batches per worker, so that workers that finish early pick up the remaining ones
+_BATCHES_PER_WORKER = 16
+
+
+def schedule_batches(
+    sequences: list, threads: int = cpu_count(), batch_size: int = None
+) -> list:
+    """
+    Split sequences into contiguous batches with a similar number of bases.
 
+    The number of bases per batch is chosen from the total length of the sequences, so that each
+    worker receives several batches, and batches are ordered from longest to shortest, so that
+    long batches do not start last and leave the other workers idle.
 
-def grouper(maximum_elements: int, items: list) -> np.array:
+    Parameters
+    ----------
+    sequences : {list, SequenceBuffer}
+        List containing all sequences.
+    threads : int, default='all CPUs'
+        Number of workers that compute the batches.
+    batch_size : int, default=None
+        Maximum number of sequences per batch. If None, batches are only limited by their bases.
+
+    Returns
+    -------
+    batches : list
+        Start and stop indices of each batch, from the batch with most bases to the one with fewest.
+    """
+    # Count the separator of each sequence, so that empty sequences also have a cost
+    if isinstance(sequences, SequenceBuffer):
+        lengths = (sequences.lengths + 1).tolist()
+    else:
+        lengths = [len(sequence) + 1 for sequence in sequences]
+    target = min(
+        max(sum(lengths) // (threads * _BATCHES_PER_WORKER), _MIN_BATCH_BASES),
+        _MAX_BATCH_BASES,
+    )
+    batches = []
+    start = 0
+    bases = 0
+    for i, length in enumerate(lengths):
+        if i > start and (bases + length > target or i - start == batch_size):
+            batches.append((start, i, bases))
+            start = i
+            bases = 0
+        bases += length
+    if start < len(lengths):
+        batches.append((start, len(lengths), bases))
+    batches.sort(key=lambda batch: (-batch[2], batch[0]))
+    return [(start, stop) for start, stop, _ in batches]
+
+
+def compute_group_frequency(sequences_and_kmers: tuple):
     """
-    Return groups with a maximum of n elements for a given list.
+    Compute k-mer frequency for a group of sequences.
 
     Parameters
     ----------
-    maximum_elements : int
-        Maximum number of elements per group.
-    items : list
-        List containing items to divide in groups.
+    sequences_and_kmers : tuple
+        Tuple containing a list of sequences, k-mers and whether the output is sparse.
 
     Returns
     -------
-    groups : np.array
-        Numpy array containing groups of items.
+    frequencies : {np.array, csr_matrix}
+        Matrix containing frequencies for a group of sequences.
     """
-    groups = []
-    subgroup = []
-    for item in items:
-        if len(subgroup) < maximum_elements:
-            subgroup.append(item)
-        else:
-            groups.append(subgroup)
-            subgroup = [item]
-    if len(subgroup) > 0:
-        groups.append(subgroup)
-    return np.array(groups, dtype=object)
+    sequences, kmers, sparse = sequences_and_kmers
+    return count_kmers(sequences, sparse=sparse, **_get_kmer_parameters(kmers))
 
 
-def compute_group_frequency(sequences_and_kmers: tuple) -> np.array:
+def write_group_frequency(sequences_kmers_and_output: tuple) -> None:
     """
-    Compute k-mer frequency for a group of sequences.
+    Compute k-mer frequency for a group of sequences and write it into a memory-mapped matrix.
 
     Parameters
     ----------
-    sequences_and_kmers : tuple
-        Tuple containing a list of sequences and k-mers.
+    sequences_kmers_and_output : tuple
+        Tuple containing a list of sequences, k-mers, the path and shape of the memory-mapped
+        output matrix and the row where the group starts.
+    """
+    sequences, kmers, path, shape, start = sequences_kmers_and_output
+    output = np.memmap(path, dtype=_get_frequency_dtype(kmers), mode="r+", shape=shape)
+    count_kmers(
+        sequences,
+        out=output[start : start + len(sequences)],
+        **_get_kmer_parameters(kmers),
+    )
+    del output
+
+
+# K-mers installed once in every worker process of a FeaturePool
+_worker_kmers = None
+
+# Backends of FeaturePool: threads share the k-mers and the output matrix with the caller,
+# processes receive the k-mers once and write into a memory-mapped matrix
+FEATURE_BACKENDS = ["thread", "process"]
+
+
+def _initialize_worker(kmers) -> None:
+    global _worker_kmers
+    _worker_kmers = kmers
+
+
+def _compute_worker_frequency(sequences_and_sparse: tuple, kmers=None):
+    sequences, sparse = sequences_and_sparse
+    kmers = _worker_kmers if kmers is None else kmers
+    return compute_group_frequency((sequences, kmers, sparse))
+
+
+def _write_worker_frequency(sequences_and_output: tuple, kmers=None) -> None:
+    sequences, *output = sequences_and_output
+    kmers = _worker_kmers if kmers is None else kmers
+    write_group_frequency((sequences, kmers, *output))
+
+
+def _fill_worker_frequency(sequences_and_output: tuple, kmers=None) -> None:
+    sequences, output, start = sequences_and_output
+    kmers = _worker_kmers if kmers is None else kmers
+    count_kmers(
+        sequences,
+        out=output[start : start + len(sequences)],
+        **_get_kmer_parameters(kmers),
+    )
+
+
+def _parse_worker_frequency(range_and_output: tuple, kmers=None) -> tuple:
+    fasta_path, start, stop, reference, output = range_and_output
+    kmers = _worker_kmers if kmers is None else kmers
+    headers, sequences = parse_fasta_range(fasta_path, start, stop, reference)
+    if output is None:
+        return headers, compute_group_frequency((sequences, kmers, True))
+    if isinstance(output[0], np.ndarray):
+        _fill_worker_frequency((sequences, *output), kmers)
+    else:
+        write_group_frequency((sequences, kmers, *output))
+    return headers, None
+
+
+class FeaturePool:
+    """Reusable pool of worker threads or processes for k-mer feature extraction."""
+
+    def __init__(self, threads: int = cpu_count(), backend: str = "thread"):
+        """
+        Initialize the pool. Workers are started on the first submitted task.
+
+        Parameters
+        ----------
+        threads : int, default='all CPUs'
+            Number of workers.
+        backend : str, default="thread"
+            Run the workers as threads, which share memory with the caller and release the GIL
+            while counting k-mers, or as processes, whose inputs and outputs are serialized.
+        """
+        if backend not in FEATURE_BACKENDS:
+            raise ValueError(
+                f"backend must be one of {FEATURE_BACKENDS}, got {backend!r}"
+            )
+        self.threads = threads
+        self.backend = backend
+        self._executor = None
+        self._kmer_parameters = None
+
+    def submit(self, kmers, function, argument) -> concurrent.futures.Future:
+        """
+        Submit a task to the workers.
+
+        Worker threads receive the k-mers with each task. Worker processes receive them once,
+        when the workers start, and submitting with different k-mers restarts the workers.
+
+        Parameters
+        ----------
+        kmers : {list, KmerVocabulary}
+            K-mers that the workers use to compute frequencies.
+        function : callable
+            Function to run in a worker.
+        argument : object
+            Argument of the function.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            The future of the submitted task.
+        """
+        if self.backend == "thread":
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(self.threads)
+            return self._executor.submit(function, argument, kmers)
+        kmer_parameters = _get_kmer_parameters(kmers)
+        if self._executor is None or not _equal_parameters(
+            self._kmer_parameters, kmer_parameters
+        ):
+            self.shutdown()
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                self.threads, initializer=_initialize_worker, initargs=(kmers,)
+            )
+            self._kmer_parameters = kmer_parameters
+        return self._executor.submit(function, argument)
+
+    def shutdown(self) -> None:
+        """Stop the workers. The pool can still be used afterwards and restarts them on demand."""
+        if self._executor is not None:
+            self._executor.shutdown()
+        self._executor = None
+        self._kmer_parameters = None
+
+    def __enter__(self):
+        """Enter the runtime context of the pool."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        """Shut down the pool when leaving the runtime context."""
+        self.shutdown()
+
+
+# Pool shared by compute_frequencies calls that do not provide their own
+_feature_pool = None
+
+
+def get_feature_pool(threads: int = cpu_count(), backend: str = None) -> FeaturePool:
+    """
+    Get the feature extraction pool shared by all entry points of HiTaC.
+
+    Parameters
+    ----------
+    threads : int, default='all CPUs'
+        Number of workers. The shared pool is replaced if it has a different size.
+    backend : str, default=None
+        Backend of the workers, either thread or process. If None, the backend of the shared pool
+        is kept, or thread for a new pool. The shared pool is replaced if it has a different backend.
 
     Returns
     -------
-    frequencies : np.array
-        Numpy array containing frequencies for a group of sequences.
+    pool : FeaturePool
+        The shared pool, which is shut down when the interpreter exits.
     """
-    frequencies = []
-    sequences, kmers = sequences_and_kmers
-    for sequence in sequences:
-        frequencies.append(compute_kmer_frequency(sequence, kmers))
-    return np.array(frequencies)
+    global _feature_pool
+    if backend is None:
+        backend = "thread" if _feature_pool is None else _feature_pool.backend
+    if (
+        _feature_pool is None
+        or _feature_pool.threads != threads
+        or _feature_pool.backend != backend
+    ):
+        shutdown_feature_pool()
+        _feature_pool = FeaturePool(threads, backend)
+    return _feature_pool
+
+
+@atexit.register
+def shutdown_feature_pool() -> None:
+    """Shut down the feature extraction pool shared by all entry points of HiTaC."""
+    global _feature_pool
+    if _feature_pool is not None:
+        _feature_pool.shutdown()
+    _feature_pool = None
 
 
 def compute_frequencies(
-    sequences: list, kmers: list, threads: int = cpu_count(), batch_size: int = 100
-) -> np.array:
+    sequences: list,
+    kmers: list,
+    threads: int = cpu_count(),
+    batch_size: int = None,
+    sparse: bool = False,
+    pool: FeaturePool = None,
+    tmp_dir: str = None,
+):
     """
     Compute k-mer frequency for all sequences.
 
+    Parameters
+    ----------
+    sequences : {list, SequenceBuffer}
+        List containing all sequences as bytes, or sequences loaded from a FASTA file.
+    kmers : {list, KmerVocabulary}
+        List containing all possible k-mers, or their vocabulary.
+    threads : int, default='all CPUs'
+        Number of threads to compute in parallel.
+    batch_size : int, default=None
+        Maximum number of sequences per batch. If None, batches are balanced by their number of
+        bases only.
+    sparse : bool, default=False
+        Return a scipy.sparse.csr_matrix, which keeps memory usage low for large k-mer sizes.
+    pool : FeaturePool, default=None
+        Pool of workers to compute with. If None, the pool shared by all entry points is used.
+    tmp_dir : str, default=None
+        Directory of the memory-mapped matrix that worker processes write to. If None, the
+        system temporary directory is used.
+
+    Returns
+    -------
+    frequencies : {np.array, csr_matrix}
+        Matrix containing frequencies for all sequences.
+
+    Notes
+    -----
+    With tf-idf normalization and no idf in the vocabulary, as when training, the inverse
+    document frequencies are computed from these sequences and stored in the vocabulary.
+    """
+    logger.info("Computing k-mer frequency")
+    if len(sequences) == 0:
+        return compute_group_frequency(([], kmers, sparse))
+    if pool is None:
+        pool = get_feature_pool(threads)
+    batches = schedule_batches(sequences, pool.threads, batch_size)
+    if sparse:
+        futures = {
+            start: pool.submit(
+                kmers, _compute_worker_frequency, (sequences[start:stop], sparse)
+            )
+            for start, stop in batches
+        }
+        concurrent.futures.wait(futures.values())
+        frequencies = sp.vstack(
+            [futures[start].result() for start in sorted(futures)], format="csr"
+        )
+        _fit_idf(frequencies, kmers)
+        return frequencies
+    shape = (len(sequences), len(kmers))
+    if pool.backend == "thread":
+        # Threads write their rows straight into the output matrix
+        frequencies = np.zeros(shape, dtype=_get_frequency_dtype(kmers))
+        futures = [
+            pool.submit(
+                kmers,
+                _fill_worker_frequency,
+                (sequences[start:stop], frequencies, start),
+            )
+            for start, stop in batches
+        ]
+        for future in futures:
+            future.result()
+        _fit_idf(frequencies, kmers)
+        return frequencies
+    # Worker processes write their rows straight into a memory-mapped matrix, so that
+    # results are neither pickled back nor concatenated in the parent process
+    path = _create_temporary_file(tmp_dir)
+    try:
+        frequencies = np.memmap(
+            path, dtype=_get_frequency_dtype(kmers), mode="w+", shape=shape
+        )
+        futures = [
+            pool.submit(
+                kmers,
+                _write_worker_frequency,
+                (sequences[start:stop], path, shape, start),
+            )
+            for start, stop in batches
+        ]
+        concurrent.futures.wait(futures)
+        for future in futures:
+            future.result()
+    finally:
+        # The mapping stays valid after the file is removed
+        os.remove(path)
+    _fit_idf(frequencies, kmers)
+    return frequencies
+
+
+def _create_temporary_file(tmp_dir: str = None) -> str:
+    # Empty file for a memory-mapped matrix, in tmp_dir if given
+    if tmp_dir is not None:
+        os.makedirs(tmp_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix="hitac-", suffix=".dat", dir=tmp_dir)
+    os.close(fd)
+    return path
+
+
+def iter_frequencies(
+    fasta_path: str,
+    kmers,
+    chunk_size: int = 10000,
+    threads: int = cpu_count(),
+    batch_size: int = None,
+    sparse: bool = False,
+    pool: FeaturePool = None,
+    dereplicate: bool = False,
+    min_quality: int = None,
+):
+    """
+    Compute k-mer frequency for a FASTA or FASTQ file in chunks, so that memory usage does not grow with its size.
+
+    Parameters
+    ----------
+    fasta_path : str
+        Path where the FASTA or FASTQ file is stored.
+    kmers : {list, KmerVocabulary}
+        List containing all possible k-mers, or their vocabulary.
+    chunk_size : int, default=10000
+        Maximum number of sequences per chunk.
+    threads : int, default='all CPUs'
+        Number of threads to compute in parallel.
+    batch_size : int, default=None
+        Maximum number of sequences per batch. If None, batches are balanced by their number of
+        bases only.
+    sparse : bool, default=False
+        Return scipy.sparse.csr_matrix chunks.
+    pool : FeaturePool, default=None
+        Pool of workers to compute with. If None, the pool shared by all entry points is used.
+    dereplicate : bool, default=False
+        Compute the k-mer frequencies of each unique sequence in a chunk only once, and also yield
+        the index of the unique sequence of each ID.
+    min_quality : int, default=None
+        If set and the file is in FASTQ format, k-mers containing bases with a lower Phred quality
+        are not counted.
+
+    Yields
+    ------
+    ids, frequencies : tuple
+        IDs of the sequences in the next chunk and their k-mer frequencies. With dereplicate, the
+        tuple also holds the inverse indices and frequencies has one row per unique sequence.
+    """
+    for ids, sequences in iter_fasta(fasta_path, chunk_size, min_quality):
+        if dereplicate:
+            sequences, inverse = dereplicate_sequences(sequences)
+        frequencies = compute_frequencies(
+            sequences, kmers, threads, batch_size, sparse, pool
+        )
+        if dereplicate:
+            yield ids, frequencies, inverse
+        else:
+            yield ids, frequencies
+
+
+def dereplicate_sequences(sequences: list) -> tuple:
+    """
+    Collapse identical sequences, so that each one is featurized and predicted only once.
+
     Parameters
     ----------
     sequences : list
-        List containing all sequences.
-    kmers : list
-        List containing all possible k-mers.
+        Sequences to dereplicate.
+
+    Returns
+    -------
+    unique_sequences, inverse : tuple
+        Unique sequences in order of first appearance and the index of the unique sequence for each
+        input, so that results of the unique sequences are expanded back with ``results[inverse]``.
+    """
+    indices = {}
+    inverse = np.fromiter(
+        (indices.setdefault(sequence, len(indices)) for sequence in sequences),
+        dtype=np.intp,
+        count=len(sequences),
+    )
+    if len(indices) < len(sequences):
+        logger.info(
+            f"Dereplicated {len(sequences)} sequences into {len(indices)} unique sequences"
+        )
+    return list(indices), inverse
+
+
+def _fit_idf(frequencies, kmers) -> None:
+    # Compute the smoothed inverse document frequency from the training term frequencies and
+    # apply it in place
+    if (
+        not isinstance(kmers, KmerVocabulary)
+        or kmers.normalization != "tfidf"
+        or kmers.idf is not None
+    ):
+        return
+    if sp.issparse(frequencies):
+        document_frequency = np.bincount(
+            frequencies.indices, minlength=frequencies.shape[1]
+        )
+    else:
+        document_frequency = np.count_nonzero(frequencies, axis=0)
+    n_documents = frequencies.shape[0]
+    idf = np.log((1 + n_documents) / (1 + document_frequency)) + 1
+    if sp.issparse(frequencies):
+        frequencies.data *= idf[frequencies.indices].astype(frequencies.dtype)
+    else:
+        frequencies *= idf.astype(frequencies.dtype)
+    kmers.idf = idf
+
+
+# Bump when the layout of cached matrices changes, so that old entries are not reused
+_FEATURE_CACHE_VERSION = 1
+
+
+class FeatureCache:
+    """On-disk cache of k-mer frequency matrices, keyed by the content of the sequences and the k-mer options."""
+
+    def __init__(self, directory: str, max_size: float = None):
+        """
+        Initialize the cache.
+
+        Parameters
+        ----------
+        directory : str
+            Directory where the matrices are stored. It is created if it does not exist.
+        max_size : float, default=None
+            Maximum size of the cache in gigabytes. The least recently used matrices are
+            evicted when it is exceeded. If None, the size is unlimited.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_size = max_size
+
+    def get_key(self, sequences, kmers, sparse: bool = False) -> str:
+        """
+        Compute the key of a feature matrix.
+
+        Parameters
+        ----------
+        sequences : {str, list}
+            Path of a FASTA file, which is hashed without parsing it, or list of sequences.
+        kmers : {list, KmerVocabulary}
+            K-mers used to compute the frequencies.
+        sparse : bool, default=False
+            Whether the matrix is sparse.
+
+        Returns
+        -------
+        key : str
+            SHA-256 digest of the sequences and the options that produce the matrix.
+        """
+        digest = hashlib.sha256()
+        if isinstance(sequences, str):
+            with open(sequences, "rb") as fin:
+                for block in iter(lambda: fin.read(1 << 20), b""):
+                    digest.update(block)
+        else:
+            for sequence in sequences:
+                if isinstance(sequence, str):
+                    sequence = sequence.encode("utf-8")
+                digest.update(len(sequence).to_bytes(8, "little"))
+                digest.update(sequence)
+        parameters = _get_kmer_parameters(kmers)
+        for key in sorted(parameters):
+            value = parameters[key]
+            digest.update(key.encode("utf-8"))
+            if isinstance(value, np.ndarray):
+                digest.update(value.tobytes())
+            else:
+                digest.update(repr(value).encode("utf-8"))
+        digest.update(repr((sparse, _FEATURE_CACHE_VERSION)).encode("utf-8"))
+        return digest.hexdigest()
+
+    def load(self, key: str) -> tuple:
+        """
+        Load a feature matrix from the cache.
+
+        Parameters
+        ----------
+        key : str
+            Key of the matrix, as computed by get_key.
+
+        Returns
+        -------
+        frequencies, labels, kmers : tuple
+            Memory-mapped frequencies, the labels stored with them (or None) and the k-mers
+            that computed them, or None if the matrix is not in the cache.
+        """
+        path = os.path.join(self.directory, key)
+        if not os.path.isdir(path):
+            return None
+        # The modification time orders entries for eviction
+        os.utime(path)
+        with open(os.path.join(path, "kmers.pkl"), "rb") as fin:
+            kmers = pickle.load(fin)
+        if os.path.exists(os.path.join(path, "frequencies.npy")):
+            frequencies = np.load(os.path.join(path, "frequencies.npy"), mmap_mode="r")
+        else:
+            data, indices, indptr, shape = [
+                np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+                for name in ("data", "indices", "indptr", "shape")
+            ]
+            frequencies = sp.csr_matrix((data, indices, indptr), shape=tuple(shape))
+        labels = None
+        if os.path.exists(os.path.join(path, "labels.npy")):
+            labels = np.load(os.path.join(path, "labels.npy"), allow_pickle=True)
+        logger.info(f"Loaded k-mer frequencies from cache {path}")
+        return frequencies, labels, kmers
+
+    def save(self, key: str, frequencies, labels=None, kmers=None) -> None:
+        """
+        Store a feature matrix in the cache.
+
+        Parameters
+        ----------
+        key : str
+            Key of the matrix, as computed by get_key.
+        frequencies : {np.ndarray, csr_matrix}
+            The k-mer frequencies.
+        labels : np.ndarray, default=None
+            Labels of the sequences, e.g., the taxonomy parsed from the FASTA file.
+        kmers : {list, KmerVocabulary}, default=None
+            The k-mers that computed the frequencies, which may have been fitted with them.
+        """
+        path = os.path.join(self.directory, key)
+        # Entries are written aside and renamed, so that readers never see partial files
+        temporary = tempfile.mkdtemp(prefix=".hitac-", dir=self.directory)
+        try:
+            if sp.issparse(frequencies):
+                for name, array in [
+                    ("data", frequencies.data),
+                    ("indices", frequencies.indices),
+                    ("indptr", frequencies.indptr),
+                    ("shape", np.array(frequencies.shape)),
+                ]:
+                    np.save(os.path.join(temporary, f"{name}.npy"), array)
+            else:
+                np.save(os.path.join(temporary, "frequencies.npy"), frequencies)
+            if labels is not None:
+                np.save(
+                    os.path.join(temporary, "labels.npy"),
+                    np.asarray(labels, dtype="object"),
+                    allow_pickle=True,
+                )
+            with open(os.path.join(temporary, "kmers.pkl"), "wb") as fout:
+                pickle.dump(kmers, fout)
+            if not os.path.isdir(path):
+                os.rename(temporary, path)
+                logger.info(f"Stored k-mer frequencies in cache {path}")
+        finally:
+            shutil.rmtree(temporary, ignore_errors=True)
+        self._evict(key)
+
+    def _evict(self, keep: str) -> None:
+        if self.max_size is None:
+            return
+        entries = []
+        for key in os.listdir(self.directory):
+            path = os.path.join(self.directory, key)
+            if key.startswith(".") or not os.path.isdir(path):
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)
+            )
+            entries.append((os.path.getmtime(path), key, size))
+        total = sum(size for _, _, size in entries)
+        for _, key, size in sorted(entries):
+            if total <= self.max_size * 2**30:
+                break
+            if key != keep:
+                logger.info(f"Evicting k-mer frequencies {key} from cache")
+                shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+                total -= size
+
+
+def compute_fasta_frequencies(
+    fasta_path: str,
+    kmers,
+    threads: int = cpu_count(),
+    sparse: bool = False,
+    reference: bool = False,
+    pool: FeaturePool = None,
+    tmp_dir: str = None,
+) -> tuple:
+    """
+    Parse a FASTA file and compute its k-mer frequency in parallel byte ranges.
+
+    Each worker parses one range of the file and counts the k-mers of its sequences, so that
+    parsing scales with the number of workers as well. Compressed and FASTQ files, which cannot
+    be split, are parsed serially before counting in parallel.
+
+    Parameters
+    ----------
+    fasta_path : str
+        Path where the FASTA file is stored.
+    kmers : {list, KmerVocabulary}
+        List containing all possible k-mers, or their vocabulary.
     threads : int, default='all CPUs'
         Number of threads to compute in parallel.
-    batch_size : int, default=100
-        Size of each batch to run in parallel.
+    sparse : bool, default=False
+        Return a scipy.sparse.csr_matrix.
+    reference : bool, default=False
+        Return the taxonomy of the sequences instead of their IDs.
+    pool : FeaturePool, default=None
+        Pool of workers to compute with. If None, the pool shared by all entry points is used.
+    tmp_dir : str, default=None
+        Directory of the memory-mapped matrix that worker processes write to. If None, the
+        system temporary directory is used.
 
     Returns
     -------
-    frequencies : np.array
-        Numpy array containing frequencies for all sequences.
+    headers, frequencies : tuple
+        Taxonomy if reference or IDs otherwise, and k-mer frequencies of the sequences in the
+        order of the file.
     """
+    if pool is None:
+        pool = get_feature_pool(threads)
+    ranges = []
+    if _get_decompressor(fasta_path) is None and not _is_fastq(_map_fasta(fasta_path)):
+        ranges = split_fasta(fasta_path, pool.threads * _BATCHES_PER_WORKER)
+    if not ranges:
+        sequences, headers = load_fasta(fasta_path, reference, packed=True)
+        return headers, compute_frequencies(
+            sequences, kmers, threads, sparse=sparse, pool=pool, tmp_dir=tmp_dir
+        )
     logger.info("Computing k-mer frequency")
-    sequences = [s.decode("utf-8") for s in sequences]
-    executor = concurrent.futures.ProcessPoolExecutor(threads)
-    futures = [
-        executor.submit(compute_group_frequency, (group, kmers))
-        for group in grouper(batch_size, sequences)
-    ]
-    concurrent.futures.wait(futures)
-    frequencies = [f.result() for f in futures]
-    frequencies = list(itertools.chain(*frequencies))
-    return np.array(frequencies)
+    # Records are counted first, so that workers write their rows straight into the output
+    # matrix at the offset of their range, as in compute_frequencies
+    data = _map_fasta(fasta_path)
+    rows = np.zeros(len(ranges) + 1, dtype=np.int64)
+    np.cumsum(
+        [len(_find_records(data, start, stop)) for start, stop in ranges],
+        out=rows[1:],
+    )
+    del data
+    if sparse:
+        outputs = [None] * len(ranges)
+    else:
+        shape = (int(rows[-1]), len(kmers))
+        dtype = _get_frequency_dtype(kmers)
+        if pool.backend == "thread":
+            frequencies = np.zeros(shape, dtype=dtype)
+            outputs = [(frequencies, row) for row in rows[:-1]]
+        else:
+            path = _create_temporary_file(tmp_dir)
+            frequencies = np.memmap(path, dtype=dtype, mode="w+", shape=shape)
+            outputs = [(path, shape, row) for row in rows[:-1]]
+    try:
+        futures = [
+            pool.submit(
+                kmers,
+                _parse_worker_frequency,
+                (fasta_path, start, stop, reference, output),
+            )
+            for (start, stop), output in zip(ranges, outputs)
+        ]
+        results = [future.result() for future in futures]
+    finally:
+        if not sparse and pool.backend != "thread":
+            # The mapping stays valid after the file is removed
+            os.remove(path)
+    headers = [header for range_headers, _ in results for header in range_headers]
+    if sparse:
+        frequencies = sp.vstack([result for _, result in results], format="csr")
+    _fit_idf(frequencies, kmers)
+    if reference:
+        headers = np.array(headers, dtype="object")
+    return headers, frequencies
+
+
+def compute_reference_frequencies(
+    fasta_path: str,
+    kmers,
+    threads: int = cpu_count(),
+    sparse: bool = False,
+    cache: FeatureCache = None,
+    tmp_dir: str = None,
+) -> tuple:
+    """
+    Load a reference FASTA file and compute its k-mer frequency, reusing cached matrices.
+
+    Parameters
+    ----------
+    fasta_path : str
+        Path where the reference FASTA file is stored.
+    kmers : {list, KmerVocabulary}
+        List containing all possible k-mers, or their vocabulary.
+    threads : int, default='all CPUs'
+        Number of threads to compute in parallel.
+    sparse : bool, default=False
+        Return a scipy.sparse.csr_matrix.
+    cache : FeatureCache, default=None
+        Cache to load the matrix from, without parsing the file, or to store it in.
+    tmp_dir : str, default=None
+        Directory of the memory-mapped matrix that worker processes write to. If None, the
+        system temporary directory is used.
+
+    Returns
+    -------
+    frequencies, taxonomy, kmers : tuple
+        K-mer frequencies, taxonomy loaded from the FASTA file and the k-mers, which are fitted
+        by tf-idf normalization.
+    """
+    if cache is not None:
+        key = cache.get_key(fasta_path, kmers, sparse)
+        cached = cache.load(key)
+        if cached is not None:
+            return cached
+    taxonomy, frequencies = compute_fasta_frequencies(
+        fasta_path, kmers, threads, sparse, reference=True, tmp_dir=tmp_dir
+    )
+    if cache is not None:
+        cache.save(key, frequencies, taxonomy, kmers)
+    return frequencies, taxonomy, kmers
 
 
 def extract_qiime2_ranks(taxonomy: str) -> np.array:
@@ -225,6 +1947,30 @@ def _extract_reads(reads) -> zip:
     return zip(*[(r.metadata["id"], r._string) for r in reads])
 
 
+def _iter_read_chunks(reads, chunk_size: int) -> tuple:
+    """
+    Extract IDs and sequences from DNAIterator in chunks.
+
+    Parameters
+    ----------
+    reads : DNAIterator
+        Iterator containing sequences.
+    chunk_size : int
+        Maximum number of sequences per chunk.
+
+    Yields
+    ------
+    ids, sequences : tuple
+        IDs and sequences of the next chunk.
+    """
+    reads = iter(reads)
+    while True:
+        chunk = list(islice(reads, chunk_size))
+        if not chunk:
+            return
+        yield tuple(_extract_reads(chunk))
+
+
 def convert_taxonomy_to_qiime2(predictions: np.array) -> list:
     """
     Convert predictions made by HiTaC to QIIME2 taxonomy format.
@@ -314,9 +2060,649 @@ def compute_confidence(
     return predictions, confidence
 
 
-def load_fasta(fasta_path: str, reference) -> tuple:
+# Bytes that delimit FASTA records and lines
+_HEADER = ord(">")
+_NEWLINE = ord("\n")
+
+# Whitespace and control bytes removed from sequence lines
+_WHITESPACE = ord(" ")
+_WHITESPACE_BYTES = bytes(range(_WHITESPACE + 1))
+
+# Bytes of a FASTA file searched for record boundaries at a time when streaming it
+_FASTA_WINDOW = 1 << 24
+
+# Base of each 2-bit code of PackedSequences, the bit that turns it lowercase and the longest
+# gap or run length stored in one run of its side tables
+_PACKED_BASES = np.frombuffer(b"ACGT", dtype=np.uint8)
+_LOWERCASE_BIT = 0x20
+_MAX_RUN = 0xFFFF
+
+# Byte that starts the records of FASTQ files, whose qualities are encoded with Phred+33
+_FASTQ_HEADER = ord("@")
+_PHRED_OFFSET = 33
+
+# Byte that replaces bases below the quality threshold, which is neither a base nor an IUPAC
+# code, so that k-mer windows containing it are skipped
+_LOW_QUALITY_BASE = ord(".")
+
+# Bytes searched at a time for the next record when splitting a FASTA file into ranges
+_RECORD_SEARCH = 1 << 20
+
+# Decompressed blocks that a background thread reads ahead of the parser
+_DECOMPRESSION_QUEUE = 4
+
+
+class SequenceBuffer:
+    """
+    Sequences stored back to back in a single byte buffer, delimited by an offsets array.
+
+    Sequences are returned as bytes, and slices share the buffer instead of copying it, so that
+    contiguous batches of sequences are cheap to hand to workers.
+    """
+
+    def __init__(self, buffer: np.ndarray, offsets: np.ndarray):
+        """
+        Initialize the sequences.
+
+        Parameters
+        ----------
+        buffer : np.ndarray
+            Bytes of all sequences, as an array of uint8.
+        offsets : np.ndarray
+            Start of each sequence in buffer, followed by the end of the last one.
+        """
+        self.buffer = buffer
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        """Return the number of sequences."""
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Length of each sequence."""
+        return np.diff(self.offsets)
+
+    def __getitem__(self, index):
+        """Return a sequence as bytes, or a slice of the sequences sharing the buffer."""
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            stop = max(start, stop)
+            offsets = self.offsets[start : stop + 1]
+            return SequenceBuffer(
+                self.buffer[offsets[0] : offsets[-1]], offsets - offsets[0]
+            )
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("sequence index out of range")
+        return self.buffer[self.offsets[index] : self.offsets[index + 1]].tobytes()
+
+    def __iter__(self):
+        """Iterate over the sequences as bytes."""
+        data = self.buffer.tobytes()
+        offsets = self.offsets.tolist()
+        for start, stop in zip(offsets[:-1], offsets[1:]):
+            yield data[start:stop]
+
+    def __eq__(self, other):
+        """Compare the sequences with another sequence of sequences."""
+        try:
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        """Return a summary of the sequences."""
+        return f"SequenceBuffer({len(self)} sequences, {len(self.buffer)} bases)"
+
+    def unpack(self) -> "SequenceBuffer":
+        """
+        Return the sequences with one byte per base, which they already have.
+
+        Returns
+        -------
+        sequences : SequenceBuffer
+            These sequences.
+        """
+        return self
+
+    def join(self) -> tuple:
+        """
+        Concatenate the sequences with a newline between each pair.
+
+        Returns
+        -------
+        buffer, rows : tuple
+            Concatenated bytes and the row of the sequence that each byte belongs to.
+        """
+        buffer = np.insert(self.buffer, self.offsets[1:-1], _NEWLINE)
+        rows = np.repeat(np.arange(len(self)), self.lengths + 1)[: len(buffer)]
+        return buffer, rows
+
+
+class PackedSequences(SequenceBuffer):
     """
-    Load reference FASTA file.
+    Sequences stored with 2 bits per base, run-length side tables and an offsets array.
+
+    Bases are packed regardless of case, and soft-masked (lowercase) stretches are kept as runs
+    of a case mask. Other bytes, such as ambiguity codes, are kept as runs of the same byte, so
+    that unpacking restores the original bytes. Runs are stored as the gap since the end of the
+    previous run and their length, both of at most 65535, which takes 4 bytes per run of the
+    case mask and 5 bytes per run of other bytes. Slices share the packed bases, and pickling
+    one only copies the bytes that hold its sequences.
+    """
+
+    def __init__(
+        self,
+        packed: np.ndarray,
+        offsets: np.ndarray,
+        case_runs: tuple,
+        exception_runs: tuple,
+    ):
+        """
+        Initialize the sequences.
+
+        Parameters
+        ----------
+        packed : np.ndarray
+            2-bit codes of the concatenated sequences, four per byte from the most significant
+            bits, with 0 in place of bytes outside ACGT and acgt.
+        offsets : np.ndarray
+            Start of each sequence in the concatenated sequences, followed by the end of the
+            last one.
+        case_runs : tuple
+            Gaps and lengths of the runs of lowercase bases, as arrays of uint16.
+        exception_runs : tuple
+            Gaps and lengths of the runs of other bytes, as arrays of uint16, and the byte of each
+            run, as an array of uint8.
+        """
+        self.packed = packed
+        self.offsets = offsets
+        self.case_runs = case_runs
+        self.exception_runs = exception_runs
+
+    @classmethod
+    def from_sequences(cls, sequences) -> "PackedSequences":
+        """
+        Pack sequences.
+
+        Parameters
+        ----------
+        sequences : {list, SequenceBuffer}
+            List containing sequences as bytes (or str), or sequences loaded from a FASTA file.
+
+        Returns
+        -------
+        packed : PackedSequences
+            The packed sequences.
+        """
+        if not isinstance(sequences, SequenceBuffer):
+            sequences = [
+                s.encode("utf-8") if isinstance(s, str) else s for s in sequences
+            ]
+            offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+            np.cumsum([len(s) for s in sequences], out=offsets[1:])
+            sequences = SequenceBuffer(
+                np.frombuffer(b"".join(sequences), dtype=np.uint8), offsets
+            )
+        buffer, offsets = sequences.unpack().buffer, sequences.offsets
+        codes = _SOFT_MASKED_BASE_CODES[buffer]
+        lowercase = np.flatnonzero((codes < 4) & (buffer >= ord("a")))
+        exceptions = np.flatnonzero(codes > 3)
+        codes[exceptions] = 0
+        codes = np.concatenate((codes, np.zeros(-len(codes) % 4, dtype=np.uint8)))
+        packed = codes[0::4] << 6 | codes[1::4] << 4 | codes[2::4] << 2 | codes[3::4]
+        return cls(
+            packed,
+            offsets - offsets[0],
+            _encode_runs(*_find_runs(lowercase)),
+            _encode_runs(*_find_runs(exceptions, buffer[exceptions])),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """Number of bytes held by the packed sequences."""
+        return sum(
+            array.nbytes
+            for array in (
+                self.packed,
+                self.offsets,
+                *self.case_runs,
+                *self.exception_runs,
+            )
+        )
+
+    def __getitem__(self, index):
+        """Return a sequence as bytes, or a slice of the sequences sharing the packed bases."""
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            stop = max(start, stop)
+            offsets = self.offsets[start : stop + 1]
+            # Slices start at a whole byte of the packed bases
+            shift = offsets[0] - offsets[0] % 4
+            return PackedSequences(
+                self.packed[shift // 4 : -(-offsets[-1] // 4)],
+                offsets - shift,
+                _slice_runs(self.case_runs, offsets[0], offsets[-1], shift),
+                _slice_runs(self.exception_runs, offsets[0], offsets[-1], shift),
+            )
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("sequence index out of range")
+        return self[index : index + 1].unpack().buffer.tobytes()
+
+    def __iter__(self):
+        """Iterate over the sequences as bytes."""
+        return iter(self.unpack())
+
+    def __repr__(self) -> str:
+        """Return a summary of the sequences."""
+        return f"PackedSequences({len(self)} sequences, {self.offsets[-1] - self.offsets[0]} bases)"
+
+    def unpack(self) -> SequenceBuffer:
+        """
+        Unpack the sequences into one byte per base.
+
+        Returns
+        -------
+        sequences : SequenceBuffer
+            The sequences with their original bytes.
+        """
+        buffer = _PACKED_BASES[self._unpack_codes()]
+        starts, lengths = _decode_runs(*self.case_runs)
+        buffer[_expand_runs(starts, lengths)] |= _LOWERCASE_BIT
+        starts, lengths, values = _decode_runs(*self.exception_runs)
+        buffer[_expand_runs(starts, lengths)] = np.repeat(values, lengths)
+        return SequenceBuffer(
+            buffer[self.offsets[0] : self.offsets[-1]], self.offsets - self.offsets[0]
+        )
+
+    def join(self) -> tuple:
+        """
+        Concatenate the sequences with a newline between each pair.
+
+        Returns
+        -------
+        buffer, rows : tuple
+            Concatenated bytes and the row of the sequence that each byte belongs to.
+        """
+        return self.unpack().join()
+
+    def join_codes(self, soft_masked: bool = False, ambiguous: bool = False) -> tuple:
+        """
+        Concatenate the 2-bit codes of the sequences with a separator between each pair.
+
+        The codes are read from the packed bases, without restoring the original bytes.
+
+        Parameters
+        ----------
+        soft_masked : bool, default=False
+            Give lowercase bases the codes of uppercase ones instead of 4.
+        ambiguous : bool, default=False
+            Also return the IUPAC mask of each base.
+
+        Returns
+        -------
+        codes, masks, separators, rows : tuple
+            Codes as in _BASE_CODES, or _SOFT_MASKED_BASE_CODES, with 4 at separators and
+            other bytes, their IUPAC masks if ambiguous or None otherwise, whether each one is a
+            separator and the row of the sequence that each one belongs to.
+        """
+        codes = self._unpack_codes()
+        masks = np.left_shift(1, codes) if ambiguous else None
+        if not soft_masked:
+            codes[_expand_runs(*_decode_runs(*self.case_runs))] = 4
+        starts, lengths, values = _decode_runs(*self.exception_runs)
+        exceptions = _expand_runs(starts, lengths)
+        codes[exceptions] = 4
+        if ambiguous:
+            masks[exceptions] = np.repeat(_IUPAC_MASKS[values], lengths)
+        begin, end = self.offsets[0], self.offsets[-1]
+        positions = self.offsets[1:-1] - begin
+        codes = np.insert(codes[begin:end], positions, 4)
+        if ambiguous:
+            masks = np.insert(masks[begin:end], positions, 0)
+        separators = np.zeros(len(codes), dtype=bool)
+        separators[positions + np.arange(len(positions))] = True
+        rows = np.repeat(np.arange(len(self)), self.lengths + 1)[: len(codes)]
+        return codes, masks, separators, rows
+
+    def _unpack_codes(self) -> np.ndarray:
+        # 2-bit codes of the packed bases, including the padding of the last byte
+        codes = np.empty((len(self.packed), 4), dtype=np.uint8)
+        for i, shift in enumerate((6, 4, 2, 0)):
+            np.right_shift(self.packed, shift, out=codes[:, i])
+        codes &= 3
+        return codes.ravel()
+
+
+def _find_runs(positions: np.ndarray, values: np.ndarray = None) -> tuple:
+    # Runs of consecutive positions, which also hold the same value if values are given
+    new = np.ones(len(positions), dtype=bool)
+    new[1:] = np.diff(positions) != 1
+    if values is not None:
+        new[1:] |= values[1:] != values[:-1]
+    firsts = np.flatnonzero(new)
+    lengths = np.diff(np.append(firsts, len(positions)))
+    if values is None:
+        return positions[firsts], lengths
+    return positions[firsts], lengths, values[firsts]
+
+
+def _encode_runs(starts: np.ndarray, lengths: np.ndarray, values=None) -> tuple:
+    # Gaps and lengths beyond _MAX_RUN are split over several runs, with empty runs carrying
+    # the rest of long gaps
+    gaps = starts - np.concatenate(([0], starts + lengths))[:-1]
+    fillers = np.maximum(-(-(gaps - _MAX_RUN) // _MAX_RUN), 0)
+    pieces = np.maximum(-(-lengths // _MAX_RUN), 1)
+    counts = fillers + pieces
+    run = np.repeat(np.arange(len(starts)), counts)
+    piece = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    piece -= fillers[run]
+    encoded_gaps = np.where(
+        piece < 0,
+        _MAX_RUN,
+        np.where(piece == 0, gaps[run] - _MAX_RUN * fillers[run], 0),
+    )
+    encoded_lengths = np.where(
+        piece < 0, 0, np.minimum(lengths[run] - _MAX_RUN * piece, _MAX_RUN)
+    )
+    runs = (encoded_gaps.astype(np.uint16), encoded_lengths.astype(np.uint16))
+    if values is None:
+        return runs
+    return (*runs, values[run])
+
+
+def _decode_runs(gaps: np.ndarray, lengths: np.ndarray, values=None) -> tuple:
+    lengths = lengths.astype(np.int64)
+    ends = np.cumsum(gaps + lengths)
+    kept = lengths > 0
+    runs = (ends[kept] - lengths[kept], lengths[kept])
+    if values is None:
+        return runs
+    return (*runs, values[kept])
+
+
+def _expand_runs(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    return np.arange(lengths.sum()) + np.repeat(
+        starts - np.cumsum(lengths) + lengths, lengths
+    )
+
+
+def _slice_runs(runs: tuple, begin: int, end: int, shift: int) -> tuple:
+    starts, lengths, *values = _decode_runs(*runs)
+    stops = np.minimum(starts + lengths, end)
+    starts = np.maximum(starts, begin)
+    kept = starts < stops
+    values = [value[kept] for value in values]
+    return _encode_runs(starts[kept] - shift, (stops - starts)[kept], *values)
+
+
+def _open_zstd(fasta_path: str):
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(
+            f"Reading the zstd-compressed file {fasta_path} requires the zstandard package"
+        ) from None
+    return zstandard.ZstdDecompressor().stream_reader(
+        open(fasta_path, "rb"), read_across_frames=True, closefd=True
+    )
+
+
+# Magic bytes of the supported compression formats and the functions that open them
+_COMPRESSIONS = [
+    (b"\x1f\x8b", gzip.open),
+    (b"BZh", bz2.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+    (b"\x28\xb5\x2f\xfd", _open_zstd),
+]
+
+
+def _get_decompressor(fasta_path: str):
+    with open(fasta_path, "rb") as fin:
+        magic = fin.read(6)
+    for prefix, opener in _COMPRESSIONS:
+        if magic.startswith(prefix):
+            return opener
+    return None
+
+
+def _iter_decompressed(fasta_path: str, opener):
+    # Decompression releases the GIL, so reading ahead in a thread overlaps it with parsing
+    # and k-mer counting in the caller
+    blocks = queue.Queue(maxsize=_DECOMPRESSION_QUEUE)
+    stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                blocks.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def decompress() -> None:
+        try:
+            with opener(fasta_path) as fin:
+                while True:
+                    block = fin.read(_FASTA_WINDOW)
+                    if not put(block) or not block:
+                        return
+        except Exception as error:
+            put(error)
+
+    thread = threading.Thread(target=decompress, daemon=True)
+    thread.start()
+    try:
+        while True:
+            block = blocks.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                return
+            yield block
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def _map_fasta(fasta_path: str) -> np.ndarray:
+    with open(fasta_path, "rb") as fin:
+        try:
+            mapped = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, io.UnsupportedOperation):
+            # Empty files, pipes and in-memory files cannot be mapped
+            return np.frombuffer(fin.read(), dtype=np.uint8)
+    # The array keeps the mapping open after the file is closed
+    return np.frombuffer(mapped, dtype=np.uint8)
+
+
+def _read_fasta(fasta_path: str) -> np.ndarray:
+    opener = _get_decompressor(fasta_path)
+    if opener is None:
+        return _map_fasta(fasta_path)
+    data = bytearray()
+    for block in _iter_decompressed(fasta_path, opener):
+        data += block
+    return np.frombuffer(data, dtype=np.uint8)
+
+
+def _iter_fasta_blocks(fasta_path: str):
+    opener = _get_decompressor(fasta_path)
+    if opener is not None:
+        for block in _iter_decompressed(fasta_path, opener):
+            yield np.frombuffer(block, dtype=np.uint8)
+        return
+    data = _map_fasta(fasta_path)
+    for begin in range(0, len(data), _FASTA_WINDOW):
+        yield data[begin : begin + _FASTA_WINDOW]
+
+
+def _find_records(data: np.ndarray, begin: int, end: int) -> np.ndarray:
+    starts = np.flatnonzero(data[begin:end] == _HEADER) + begin
+    return starts[(starts == 0) | (data[starts - 1] == _NEWLINE)]
+
+
+def _parse_records(
+    data: np.ndarray, starts: np.ndarray, stop: int, reference: bool = False
+) -> tuple:
+    block = data[starts[0] : stop]
+    starts = starts - starts[0]
+    whitespace = np.flatnonzero(block <= _WHITESPACE)
+    newlines = whitespace[block[whitespace] == _NEWLINE]
+    header_ends = np.append(newlines, len(block))[np.searchsorted(newlines, starts)]
+    sequence_starts = np.minimum(header_ends + 1, len(block))
+    sequence_ends = np.append(starts[1:], len(block))
+    # Whitespace is deleted from the concatenated sequence lines, so each sequence is as long as
+    # its lines minus the whitespace within them
+    lengths = sequence_ends - sequence_starts
+    lengths -= np.searchsorted(whitespace, sequence_ends)
+    lengths += np.searchsorted(whitespace, sequence_starts)
+    offsets = np.zeros(len(starts) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    view = memoryview(block)
+    text = b"\n".join(
+        [view[s + 1 : e] for s, e in zip(starts.tolist(), header_ends.tolist())]
+    ).decode("utf-8")
+    headers = [header.rstrip() for header in text.split("\n")]
+    if reference:
+        headers = [extract_taxxi_taxonomy(header) for header in headers]
+    buffer = b"".join(
+        [view[s:e] for s, e in zip(sequence_starts.tolist(), sequence_ends.tolist())]
+    ).translate(None, _WHITESPACE_BYTES)
+    return headers, SequenceBuffer(np.frombuffer(buffer, dtype=np.uint8), offsets)
+
+
+def _is_fastq(data: np.ndarray) -> bool:
+    return data[:256].tobytes().lstrip()[:1] == b"@"
+
+
+def _find_fastq_records(data: np.ndarray, begin: int, end: int) -> np.ndarray:
+    # Quality lines may start with "@" as well, so records are found by counting four lines
+    # from the first record, which starts at the first byte that is not whitespace
+    first = 0
+    while first < end:
+        text = data[first : min(first + _RECORD_SEARCH, end)] > _WHITESPACE
+        if text.any():
+            first += int(text.argmax())
+            break
+        first += _RECORD_SEARCH
+    else:
+        return np.zeros(0, dtype=np.int64)
+    line_starts = np.flatnonzero(data[first:end] == _NEWLINE) + first + 1
+    starts = np.append(first, line_starts[3::4])
+    starts = starts[(starts >= begin) & (starts < end)]
+    # Trailing empty lines do not start a record
+    return starts[data[starts] > _WHITESPACE]
+
+
+def _fastq_error(block: np.ndarray, start: int, message: str) -> ValueError:
+    header = block[start + 1 : start + 1 + _RECORD_SEARCH].tobytes().split(b"\n")[0]
+    return ValueError(message.format(header.decode("utf-8", "replace").rstrip()))
+
+
+def _parse_fastq_records(
+    data: np.ndarray,
+    starts: np.ndarray,
+    stop: int,
+    reference: bool = False,
+    min_quality: int = None,
+) -> tuple:
+    block = data[starts[0] : stop]
+    newlines = np.flatnonzero(block == _NEWLINE)
+    line_starts = np.append(0, newlines + 1)
+    line_ends = np.append(newlines, len(block))
+    # A newline that ends the block does not start another line
+    if len(newlines) > 0 and newlines[-1] == len(block) - 1:
+        line_starts, line_ends = line_starts[:-1], line_ends[:-1]
+    line_starts = line_starts[: 4 * len(starts)]
+    line_ends = line_ends[: 4 * len(starts)]
+    if len(line_starts) < 4 * len(starts):
+        raise _fastq_error(
+            block,
+            starts[-1] - starts[0],
+            "Truncated FASTQ record '{}' at the end of the file",
+        )
+    # Drop the carriage returns of Windows line endings
+    line_ends -= (line_ends > line_starts) & (
+        block[np.maximum(line_ends - 1, 0)] == ord("\r")
+    )
+    line_starts = line_starts.reshape(-1, 4)
+    line_ends = line_ends.reshape(-1, 4)
+    invalid = np.flatnonzero(block[line_starts[:, 2]] != ord("+"))
+    if len(invalid) > 0:
+        raise _fastq_error(
+            block,
+            line_starts[invalid[0], 0],
+            "FASTQ record '{}' must span four lines",
+        )
+    lengths = line_ends[:, 1] - line_starts[:, 1]
+    invalid = np.flatnonzero(line_ends[:, 3] - line_starts[:, 3] != lengths)
+    if len(invalid) > 0:
+        # A short quality line that is not followed by a newline was cut off
+        message = (
+            "Truncated FASTQ record '{}' at the end of the file"
+            if invalid[0] == len(starts) - 1
+            and line_ends[-1, 3] == len(block)
+            and line_ends[-1, 3] - line_starts[-1, 3] < lengths[-1]
+            else "FASTQ sequence and quality of record '{}' must have the same length"
+        )
+        raise _fastq_error(block, line_starts[invalid[0], 0], message)
+    view = memoryview(block)
+    text = b"\n".join(
+        [
+            view[s + 1 : e]
+            for s, e in zip(line_starts[:, 0].tolist(), line_ends[:, 0].tolist())
+        ]
+    ).decode("utf-8")
+    headers = [header.rstrip() for header in text.split("\n")]
+    if reference:
+        headers = [extract_taxxi_taxonomy(header) for header in headers]
+    buffer = np.frombuffer(
+        bytearray().join(
+            [
+                view[s:e]
+                for s, e in zip(line_starts[:, 1].tolist(), line_ends[:, 1].tolist())
+            ]
+        ),
+        dtype=np.uint8,
+    )
+    if min_quality is not None:
+        qualities = np.frombuffer(
+            b"".join(
+                [
+                    view[s:e]
+                    for s, e in zip(
+                        line_starts[:, 3].tolist(), line_ends[:, 3].tolist()
+                    )
+                ]
+            ),
+            dtype=np.uint8,
+        )
+        buffer[qualities < _PHRED_OFFSET + min_quality] = _LOW_QUALITY_BASE
+    offsets = np.zeros(len(starts) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return headers, SequenceBuffer(buffer, offsets)
+
+
+def load_fasta(
+    fasta_path: str, reference, min_quality: int = None, packed: bool = False
+) -> tuple:
+    """
+    Load FASTA or FASTQ file.
+
+    The file is memory-mapped and its records are delimited in bulk, so that loading time is
+    linear in the size of the file regardless of how sequences are wrapped.
 
     Parameters
     ----------
@@ -324,36 +2710,152 @@ def load_fasta(fasta_path: str, reference) -> tuple:
         Path where the FASTA file is stored.
     reference : Bool
         Is this file the reference? True of False.
+    min_quality : int, default=None
+        If set and the file is in FASTQ format, bases with a lower Phred quality are masked, so
+        that no k-mer containing them is counted.
+    packed : bool, default=False
+        Return the sequences as PackedSequences, which hold 2 bits per base.
 
     Returns
     -------
-    sequences, taxonomy : tuple
-        Sequences and taxonomy loaded from FASTA file.
+    sequences, headers : tuple
+        Sequences loaded from FASTA file, and their taxonomy if reference or their IDs otherwise.
     """
     logger.info(f"Loading FASTA file {fasta_path}")
-    with open(fasta_path) as fin:
-        header = None
-        sequence = None
-        sequences = []
-        headers = []
-        for line in fin:
-            if line.startswith(">"):
-                if header:
-                    sequences.append(str.encode(sequence))
-                else:
-                    header = line.strip()
-                sequence = ""
-                if reference:
-                    headers.append(extract_taxxi_taxonomy(line.strip()))
-                else:
-                    headers.append(line.strip()[1:])
-            else:
-                sequence = sequence + line.strip()
-        sequences.append(str.encode(sequence))
+    data = _read_fasta(fasta_path)
+    if _is_fastq(data):
+        find_records = _find_fastq_records
+        parse_records = functools.partial(_parse_fastq_records, min_quality=min_quality)
+    else:
+        find_records, parse_records = _find_records, _parse_records
+    starts = find_records(data, 0, len(data))
+    if len(starts) == 0:
+        headers, sequences = [], SequenceBuffer(data[:0], np.zeros(1, dtype=np.int64))
+    else:
+        headers, sequences = parse_records(data, starts, len(data), reference)
+    if packed:
+        sequences = PackedSequences.from_sequences(sequences)
     if reference:
-        return tuple(sequences), np.array(headers, dtype="object")
+        return sequences, np.array(headers, dtype="object")
     else:
-        return tuple(sequences), headers
+        return sequences, headers
+
+
+def iter_fasta(fasta_path: str, chunk_size: int = 10000, min_quality: int = None):
+    """
+    Iterate over a FASTA or FASTQ file in chunks, without loading the whole file.
+
+    Parameters
+    ----------
+    fasta_path : str
+        Path where the FASTA or FASTQ file is stored.
+    chunk_size : int, default=10000
+        Maximum number of sequences per chunk.
+    min_quality : int, default=None
+        If set and the file is in FASTQ format, bases with a lower Phred quality are masked, so
+        that no k-mer containing them is counted.
+
+    Yields
+    ------
+    ids, sequences : tuple
+        IDs and sequences of the next chunk.
+    """
+    logger.info(f"Streaming FASTA file {fasta_path}")
+    data = np.zeros(0, dtype=np.uint8)
+    starts = np.zeros(0, dtype=np.int64)
+    find_records, parse_records = None, None
+    for block in _iter_fasta_blocks(fasta_path):
+        # The format is told by the first block that is not only whitespace
+        if find_records is None:
+            if not np.any(block > _WHITESPACE):
+                continue
+            if _is_fastq(block):
+                find_records = _find_fastq_records
+                parse_records = functools.partial(
+                    _parse_fastq_records, min_quality=min_quality
+                )
+            else:
+                find_records, parse_records = _find_records, _parse_records
+        # Only the last record can continue in the next block, so the data before it is dropped
+        if len(starts) > 0:
+            data = data[starts[0] :]
+            starts = starts - starts[0]
+        else:
+            data = data[:0]
+        begin = len(data)
+        data = np.concatenate((data, block)) if begin > 0 else block
+        starts = np.append(starts, find_records(data, begin, len(data)))
+        while len(starts) > chunk_size:
+            yield parse_records(data, starts[:chunk_size], starts[chunk_size])
+            starts = starts[chunk_size:]
+    if len(starts) > 0:
+        yield parse_records(data, starts, len(data))
+
+
+def _next_record(data: np.ndarray, position: int) -> int:
+    while position < len(data):
+        starts = _find_records(data, position, position + _RECORD_SEARCH)
+        if len(starts) > 0:
+            return int(starts[0])
+        position += _RECORD_SEARCH
+    return len(data)
+
+
+def split_fasta(fasta_path: str, parts: int) -> list:
+    """
+    Split a FASTA file into byte ranges that start at a record.
+
+    Parameters
+    ----------
+    fasta_path : str
+        Path where the uncompressed FASTA file is stored.
+    parts : int
+        Maximum number of ranges, which is reduced for small files so that each range holds at
+        least 64 KiB.
+
+    Returns
+    -------
+    ranges : list
+        Start and stop bytes of each range, in the order of the file. Boundaries are moved
+        forward to the next header, so that ranges hold whole records and may be fewer than
+        parts.
+    """
+    data = _map_fasta(fasta_path)
+    parts = max(min(parts, len(data) // _MIN_BATCH_BASES), 1)
+    bounds = [_next_record(data, len(data) * i // parts) for i in range(parts)]
+    bounds.append(len(data))
+    return [
+        (start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if start < stop
+    ]
+
+
+def parse_fasta_range(
+    fasta_path: str, start: int, stop: int, reference: bool = False
+) -> tuple:
+    """
+    Parse the records of a byte range of a FASTA file.
+
+    Parameters
+    ----------
+    fasta_path : str
+        Path where the uncompressed FASTA file is stored.
+    start : int
+        First byte of the range, which must start a record.
+    stop : int
+        Byte after the range, which must start a record or be the end of the file.
+    reference : bool, default=False
+        Return the taxonomy of the records instead of their IDs.
+
+    Returns
+    -------
+    headers, sequences : tuple
+        Taxonomy if reference or IDs otherwise, and sequences of the records in the range.
+    """
+    data = _map_fasta(fasta_path)
+    starts = _find_records(data, start, stop)
+    if len(starts) == 0:
+        return [], SequenceBuffer(data[:0], np.zeros(1, dtype=np.int64))
+    return _parse_records(data, starts, stop, reference)
 
 
 def extract_taxxi_taxonomy(taxxi: str) -> str:
@@ -370,12 +2872,7 @@ def extract_taxxi_taxonomy(taxxi: str) -> str:
     taxonomy : str
         Taxonomy in format used by HiTaC.
     """
-    taxonomy = []
-    for rank in taxxi.split(","):
-        taxonomy.append(rank)
-    taxonomy[0] = taxonomy[0][taxonomy[0].find("=") + 1 :]
-    taxonomy[-1] = taxonomy[-1][:-1]
-    return taxonomy
+    return taxxi[taxxi.find("=") + 1 : -1].split(",")
 
 
 def convert_taxonomy_to_taxxi(predictions: np.array) -> list:
@@ -442,6 +2939,310 @@ def get_logistic_regression() -> LogisticRegression:
     return logistic_regression
 
 
+def reduce_redundancy(
+    frequencies,
+    taxonomy,
+    similarity: float = None,
+    max_per_taxon: int = None,
+) -> tuple:
+    """
+    Keep representatives of near-identical reference sequences of each taxon, weighted by the number of sequences they represent.
+
+    Sequences of a taxon join the first representative whose k-mer profile has at least the
+    given cosine similarity to theirs, or become representatives otherwise.
+
+    Parameters
+    ----------
+    frequencies : {np.ndarray, csr_matrix}
+        K-mer frequencies of the reference sequences.
+    taxonomy : np.ndarray
+        Taxonomy of the reference sequences.
+    similarity : float, default=None
+        Minimum cosine similarity between the k-mer profiles of a sequence and its
+        representative. If None, only sequences with identical profiles are merged.
+    max_per_taxon : int, default=None
+        Maximum number of representatives per taxon. The smallest clusters of a taxon beyond
+        this number are merged into their most similar representative. If None, the number of
+        representatives is not limited.
+
+    Returns
+    -------
+    frequencies, taxonomy, sample_weight : tuple
+        Frequencies and taxonomy of the representatives, in their original order, and the
+        number of sequences that each one represents. If neither similarity nor max_per_taxon
+        is set, the inputs are returned unchanged with no sample weights.
+    """
+    if similarity is None and max_per_taxon is None:
+        return frequencies, taxonomy, None
+    if similarity is None:
+        similarity = 1 - 1e-9
+    labels = ["\t".join(map(str, ranks)) for ranks in taxonomy]
+    _, taxa = np.unique(labels, return_inverse=True)
+    taxa = taxa.ravel()
+    order = np.argsort(taxa, kind="stable")
+    boundaries = np.flatnonzero(np.diff(taxa[order])) + 1
+    representatives = []
+    sample_weight = []
+    for members in np.split(order, boundaries):
+        profiles = _normalize_profiles(frequencies[members])
+        clusters, sizes = _cluster_profiles(profiles, similarity, max_per_taxon)
+        representatives.append(members[clusters])
+        sample_weight.append(sizes)
+    representatives = np.concatenate(representatives)
+    sample_weight = np.concatenate(sample_weight)
+    kept = np.argsort(representatives)
+    representatives = representatives[kept]
+    logger.info(
+        f"Kept {len(representatives)} of {len(taxa)} reference sequences as representatives"
+    )
+    return (
+        frequencies[representatives],
+        taxonomy[representatives],
+        sample_weight[kept].astype(np.float64),
+    )
+
+
+def _normalize_profiles(frequencies):
+    # Scale k-mer frequencies to unit length, so that dot products are cosine similarities
+    if sp.issparse(frequencies):
+        frequencies = sp.csr_matrix(frequencies, dtype=np.float64)
+        norms = np.sqrt(np.asarray(frequencies.multiply(frequencies).sum(axis=1)))
+        return sp.csr_matrix(frequencies.multiply(1 / np.maximum(norms, 1e-12)))
+    frequencies = np.asarray(frequencies, dtype=np.float64)
+    norms = np.linalg.norm(frequencies, axis=1, keepdims=True)
+    return frequencies / np.maximum(norms, 1e-12)
+
+
+def _similarities(profiles, other) -> np.ndarray:
+    similarities = profiles @ other.T
+    return similarities.toarray() if sp.issparse(similarities) else similarities
+
+
+def _cluster_profiles(profiles, similarity: float, max_clusters: int = None) -> tuple:
+    # Greedy clustering of unit-length profiles, returning the rows of the representatives
+    # and the size of their clusters. Blocks of rows are first compared with the existing
+    # representatives at once, and only the unmatched rows one by one.
+    n = profiles.shape[0]
+    representatives = np.empty(0, dtype=np.int64)
+    assignment = np.empty(n, dtype=np.int64)
+    for start in range(0, n, 256):
+        rows = np.arange(start, min(start + 256, n))
+        if len(representatives) > 0:
+            scores = _similarities(profiles[rows], profiles[representatives])
+            best = scores.argmax(axis=1)
+            matched = scores[np.arange(len(rows)), best] >= similarity
+            assignment[rows[matched]] = best[matched]
+            rows = rows[~matched]
+        scores = _similarities(profiles[rows], profiles[rows])
+        new = []
+        for i, row in enumerate(rows):
+            if new and scores[i, new].max() >= similarity:
+                assignment[row] = len(representatives) + int(np.argmax(scores[i, new]))
+            else:
+                assignment[row] = len(representatives) + len(new)
+                new.append(i)
+        representatives = np.concatenate((representatives, rows[new]))
+    sizes = np.bincount(assignment, minlength=len(representatives))
+    if max_clusters is not None and len(representatives) > max_clusters:
+        largest = np.sort(np.argsort(-sizes, kind="stable")[:max_clusters])
+        merged = np.setdiff1d(np.arange(len(representatives)), largest)
+        scores = _similarities(
+            profiles[representatives[merged]], profiles[representatives[largest]]
+        )
+        kept_sizes = sizes[largest].copy()
+        np.add.at(kept_sizes, scores.argmax(axis=1), sizes[merged])
+        return representatives[largest], kept_sizes
+    return representatives, sizes
+
+
+def select_features(
+    frequencies,
+    taxonomy,
+    kmers,
+    n_kmers: int = None,
+    variance_threshold: float = None,
+) -> tuple:
+    """
+    Select the k-mer features of the reference that are worth keeping in the models.
+
+    Parameters
+    ----------
+    frequencies : {np.ndarray, csr_matrix}
+        K-mer frequencies of the reference sequences.
+    taxonomy : np.ndarray
+        Taxonomy of the reference sequences.
+    kmers : {list, KmerVocabulary}
+        The k-mers of the frequencies.
+    n_kmers : int, default=None
+        Keep this number of features with the highest chi-squared statistic against the
+        lowest taxonomic rank. If None, features are not ranked.
+    variance_threshold : float, default=None
+        Drop features whose variance across the reference is at most this value. If None,
+        features are not filtered by variance.
+
+    Returns
+    -------
+    frequencies, kmers : tuple
+        Frequencies of the selected features and the vocabulary that records the selection,
+        so that only these features are computed for the sequences to classify.
+    """
+    if n_kmers is None and variance_threshold is None:
+        return frequencies, kmers
+    selected = np.arange(frequencies.shape[1])
+    if variance_threshold is not None:
+        mean = _sum_columns(frequencies) / frequencies.shape[0]
+        variance = _sum_columns(frequencies, 2) / frequencies.shape[0] - mean**2
+        selected = selected[variance > variance_threshold]
+    if n_kmers is not None and n_kmers < len(selected):
+        scores = _chi2(frequencies, taxonomy)[selected]
+        selected = np.sort(selected[np.argsort(-scores, kind="stable")[:n_kmers]])
+    if len(selected) == 0:
+        raise ValueError("No k-mer features are left after selection.")
+    logger.info(f"Selected {len(selected)} of {frequencies.shape[1]} k-mer features")
+    parameters = _get_kmer_parameters(kmers)
+    # Selecting again from selected features keeps indices into all features
+    previous = parameters.get("selection")
+    parameters["selection"] = selected if previous is None else previous[selected]
+    return frequencies[:, selected], KmerVocabulary(**parameters)
+
+
+def _sum_columns(frequencies, power: int = 1) -> np.ndarray:
+    # Sum the columns of a matrix raised to a power, in blocks of rows, so that large
+    # memory-mapped matrices are not converted to float at once
+    if sp.issparse(frequencies):
+        return np.asarray(frequencies.power(power).sum(axis=0), np.float64).ravel()
+    sums = np.zeros(frequencies.shape[1])
+    for start in range(0, frequencies.shape[0], 10000):
+        sums += (
+            np.asarray(frequencies[start : start + 10000], np.float64) ** power
+        ).sum(axis=0)
+    return sums
+
+
+def _chi2(frequencies, taxonomy) -> np.ndarray:
+    # Chi-squared statistic of each feature against the lowest taxonomic rank, as in
+    # sklearn.feature_selection.chi2 but with a sparse indicator matrix of the taxa
+    labels = ["\t".join(map(str, ranks)) for ranks in taxonomy]
+    _, classes = np.unique(labels, return_inverse=True)
+    indicator = sp.csr_matrix(
+        (np.ones(len(classes)), (np.arange(len(classes)), classes.ravel()))
+    )
+    observed = indicator.T @ frequencies
+    if sp.issparse(observed):
+        observed = observed.toarray()
+    observed = np.asarray(observed, np.float64)
+    class_probability = np.asarray(indicator.mean(axis=0)).ravel()
+    expected = np.outer(class_probability, observed.sum(axis=0))
+    chi2 = np.divide(
+        (observed - expected) ** 2,
+        expected,
+        out=np.zeros_like(expected),
+        where=expected > 0,
+    )
+    return chi2.sum(axis=0)
+
+
+def compute_training_features(
+    compute_reference,
+    kmer=6,
+    threads: int = cpu_count(),
+    backend: str = "thread",
+    sparse: bool = False,
+    hash_buckets: int = None,
+    hash_seed: int = 0,
+    canonical: bool = False,
+    max_ambiguous: int = None,
+    kmer_sizes: list = None,
+    spaced_seeds: list = None,
+    dtype: str = None,
+    normalization: str = None,
+    cache_dir: str = None,
+    cache_size: float = None,
+    select_kmers: int = None,
+    variance_threshold: float = None,
+    cluster_similarity: float = None,
+    max_per_taxon: int = None,
+) -> tuple:
+    """
+    Compute the k-mer features that models are trained on from the reference.
+
+    The vocabulary is built from the k-mer options, the reference frequencies are computed
+    with it, and then reduced to representatives and selected features, so that several
+    models can be trained on the result.
+
+    Parameters
+    ----------
+    compute_reference : callable
+        Function that takes the vocabulary, the number of threads, whether the output is
+        sparse and the FeatureCache, or None, and returns the k-mer frequencies and taxonomy
+        of the reference and the vocabulary, e.g., compute_reference_frequencies with the
+        path of the reference.
+    kmer : {int, list}, default=6
+        K-mer size, or list of k-mer sizes whose features are combined.
+    threads : int, default='all CPUs'
+        Number of threads to compute in parallel.
+    backend : {"thread", "process"}, default="thread"
+        Compute k-mer frequencies in threads or in processes.
+    sparse : bool, default=False
+        Store k-mer frequencies in a sparse matrix.
+    hash_buckets : int, default=None
+        Hash k-mers into this number of features.
+    hash_seed : int, default=0
+        Seed of the hash function.
+    canonical : bool, default=False
+        Count each k-mer and its reverse complement as the same feature.
+    max_ambiguous : int, default=None
+        Count k-mers with up to this number of ambiguous bases as fractions.
+    kmer_sizes : list, default=None
+        K-mer sizes whose features are combined, used instead of kmer.
+    spaced_seeds : list, default=None
+        Binary masks of spaced k-mers, used instead of kmer and kmer_sizes.
+    dtype : str, default=None
+        Data type of the k-mer frequencies.
+    normalization : {None, "length", "tfidf"}, default=None
+        Normalization of the k-mer counts.
+    cache_dir : str, default=None
+        Directory to cache k-mer frequencies of the reference.
+    cache_size : float, default=None
+        Maximum size of the cache in GB.
+    select_kmers : int, default=None
+        Keep only this number of k-mers most associated with the taxonomy.
+    variance_threshold : float, default=None
+        Drop k-mers whose frequency variance is at most this value.
+    cluster_similarity : float, default=None
+        Merge reference sequences of a taxon whose k-mer profiles have at least this cosine
+        similarity.
+    max_per_taxon : int, default=None
+        Maximum number of representatives per taxon.
+
+    Returns
+    -------
+    frequencies, taxonomy, sample_weight, kmers : tuple
+        Features and taxonomy of the representatives, their weights and the vocabulary of the
+        selected features, which models store to compute the features of their queries.
+    """
+    get_feature_pool(threads, backend)
+    kmers = compute_possible_kmers(
+        kmer_sizes if kmer_sizes else kmer,
+        hash_buckets=hash_buckets,
+        hash_seed=hash_seed,
+        canonical=canonical,
+        max_ambiguous=max_ambiguous,
+        spaced_seeds=spaced_seeds,
+        dtype=dtype,
+        normalization=normalization,
+    )
+    cache = FeatureCache(cache_dir, cache_size) if cache_dir else None
+    frequencies, taxonomy, kmers = compute_reference(kmers, threads, sparse, cache)
+    frequencies, taxonomy, sample_weight = reduce_redundancy(
+        frequencies, taxonomy, cluster_similarity, max_per_taxon
+    )
+    frequencies, kmers = select_features(
+        frequencies, taxonomy, kmers, select_kmers, variance_threshold
+    )
+    return frequencies, taxonomy, sample_weight, kmers
+
+
 def get_hierarchical_classifier(
     threads: int, tmp_dir: str = None
 ) -> LocalClassifierPerParentNode:
@@ -492,6 +3293,150 @@ def get_hierarchical_filter(threads: int, tmp_dir: str = None) -> Filter:
     return hierarchical_filter
 
 
+def fit_classifier_and_filter(
+    x_train,
+    y_train,
+    threads: int = cpu_count(),
+    tmp_dir: str = None,
+    parallel: bool = False,
+    sample_weight: np.ndarray = None,
+) -> tuple:
+    """
+    Fit the hierarchical classifier and the hierarchical filter on the same k-mer frequencies.
+
+    Parameters
+    ----------
+    x_train : {np.ndarray, csr_matrix}
+        K-mer frequencies of the reference sequences.
+    y_train : np.ndarray
+        Taxonomy of the reference sequences.
+    threads : int, default='all CPUs'
+        The number of threads for training in parallel.
+    tmp_dir : str, default=None
+        Temporary directory to persist local classifiers that are trained, with one
+        subdirectory for each model.
+    parallel : bool, default=False
+        Train both models at the same time, splitting the threads between them.
+    sample_weight : np.ndarray, default=None
+        Weight of each reference sequence, e.g., the cluster sizes from reduce_redundancy.
+
+    Returns
+    -------
+    hierarchical_classifier, hierarchical_filter : tuple
+        The fitted hierarchical classifier and filter.
+    """
+    classifier_threads = max(threads // 2, 1) if parallel else threads
+    filter_threads = max(threads - classifier_threads, 1) if parallel else threads
+    hierarchical_classifier = get_hierarchical_classifier(
+        classifier_threads, tmp_dir and os.path.join(tmp_dir, "classifier")
+    )
+    hierarchical_filter = get_hierarchical_filter(
+        filter_threads, tmp_dir and os.path.join(tmp_dir, "filter")
+    )
+    models = (hierarchical_classifier, hierarchical_filter)
+    if parallel:
+        with concurrent.futures.ThreadPoolExecutor(len(models)) as executor:
+            futures = [
+                executor.submit(m.fit, x_train, y_train, sample_weight) for m in models
+            ]
+            for future in futures:
+                future.result()
+    else:
+        for model in models:
+            model.fit(x_train, y_train, sample_weight)
+    return models
+
+
+def get_kmers(model, kmer_size: int = 6):
+    """
+    Get the k-mers a model was trained with.
+
+    Parameters
+    ----------
+    model : {LocalClassifierPerParentNode, Filter}
+        The trained hierarchical classifier or filter.
+    kmer_size : int, default=6
+        K-mer size used when the model does not record its k-mers, e.g., models trained with
+        older versions of HiTaC.
+
+    Returns
+    -------
+    kmers : KmerVocabulary
+        The k-mers used to compute the features of the model.
+    """
+    kmers = getattr(model, "kmers_", None)
+    if kmers is None:
+        kmers = compute_possible_kmers(kmer_size)
+    elif not isinstance(kmers, KmerVocabulary):
+        # Array of k-mers recorded by earlier versions of HiTaC
+        kmers = KmerVocabulary(**_get_kmer_parameters(kmers))
+    return kmers
+
+
+def get_shared_kmers(classifier, filter, kmer_size: int = 6):
+    """
+    Get the k-mers shared by a classifier and a filter, so that features are computed once for both.
+
+    Parameters
+    ----------
+    classifier : LocalClassifierPerParentNode
+        The trained hierarchical classifier.
+    filter : Filter
+        The trained hierarchical filter.
+    kmer_size : int, default=6
+        K-mer size used when the models do not record their k-mers.
+
+    Returns
+    -------
+    kmers : KmerVocabulary
+        The k-mers used to compute the features of both models.
+    """
+    kmers = get_kmers(classifier, kmer_size)
+    if kmers != get_kmers(filter, kmer_size):
+        raise ValueError(
+            "The classifier and the filter were trained with different k-mers"
+        )
+    return kmers
+
+
+def classify_and_filter(
+    x_test, classifier, filter, threshold: float = 0.7, inverse: np.ndarray = None
+) -> tuple:
+    """
+    Classify sequences and filter the predictions using the same k-mer frequencies.
+
+    Parameters
+    ----------
+    x_test : {np.ndarray, csr_matrix}
+        K-mer frequencies of the query sequences.
+    classifier : LocalClassifierPerParentNode
+        The trained hierarchical classifier.
+    filter : Filter
+        The trained hierarchical filter.
+    threshold : float, default=0.7
+        Minimum confidence score to keep taxonomic ranks.
+    inverse : np.ndarray, default=None
+        Index of the row of x_test for each sequence, as returned by dereplicate_sequences, to
+        expand the results of the unique sequences back to all of them.
+
+    Returns
+    -------
+    predictions, filtered_predictions, confidence : tuple
+        Predictions made by the classifier, predictions with ranks above minimum threshold
+        and confidence score for the lowest rank available.
+    """
+    predictions = classifier.predict(x_test)
+    predict_proba = filter.predict_proba(x_test)
+    filtered_predictions, confidence = compute_confidence(
+        predictions, filter.classes_, predict_proba, threshold
+    )
+    if inverse is not None:
+        predictions = predictions[inverse]
+        filtered_predictions = [filtered_predictions[i] for i in inverse]
+        confidence = [confidence[i] for i in inverse]
+    return predictions, filtered_predictions, confidence
+
+
 def load_classification(classification_path: str) -> np.ndarray:
     """
     Load a classification TSV file and extract taxonomy.
@@ -512,3 +3457,79 @@ def load_classification(classification_path: str) -> np.ndarray:
             taxonomy = line.strip().split("\t")[-1].split(",")
             classification.append(taxonomy)
         return np.array(classification, dtype="object")
+
+
+def iter_classification(
+    classification_path: str, chunk_size: int = 10000, ids: bool = False
+):
+    """
+    Iterate over a classification TSV file in chunks, in step with iter_frequencies.
+
+    Parameters
+    ----------
+    classification_path : str
+        The path to the TSV file containing the predictions.
+    chunk_size : int, default=10000
+        Maximum number of predictions per chunk.
+    ids : bool, default=False
+        Also yield the IDs of the predictions.
+
+    Yields
+    ------
+    classification : {np.ndarray, tuple}
+        The classification matrix of the next chunk, preceded by the IDs of its rows if ids.
+    """
+    with open(classification_path, "r") as fin:
+        while True:
+            lines = list(islice(fin, chunk_size))
+            if not lines:
+                return
+            classification = np.array(
+                [line.strip().split("\t")[-1].split(",") for line in lines],
+                dtype="object",
+            )
+            if ids:
+                yield [
+                    line.rstrip("\n").rsplit("\t", 1)[0] for line in lines
+                ], classification
+            else:
+                yield classification
+
+
+def zip_classification(chunks, classification_path: str, chunk_size: int = 10000):
+    """
+    Pair the chunks of iter_frequencies with the predictions of the same sequences.
+
+    Parameters
+    ----------
+    chunks : iterable
+        Chunks yielded by iter_frequencies, whose first item holds the IDs of the sequences.
+    classification_path : str
+        The path to the TSV file containing the predictions of the sequences, in the same order.
+    chunk_size : int, default=10000
+        Maximum number of sequences per chunk, as in iter_frequencies.
+
+    Yields
+    ------
+    chunk, classification : tuple
+        The next chunk and the classification matrix of its sequences.
+
+    Raises
+    ------
+    ValueError
+        If the predictions are not those of the sequences, or there are more or fewer of them.
+    """
+    predictions = iter_classification(classification_path, chunk_size, ids=True)
+    for chunk, prediction in zip_longest(chunks, predictions):
+        sequences = 0 if chunk is None else len(chunk[0])
+        ids, classification = ([], None) if prediction is None else prediction
+        if len(ids) != sequences:
+            raise ValueError(
+                f"{classification_path} has "
+                f"{'more' if len(ids) > sequences else 'fewer'} predictions than sequences"
+            )
+        if list(chunk[0]) != ids:
+            raise ValueError(
+                f"The predictions in {classification_path} are not in the order of the sequences"
+            )
+        yield chunk, classification
@@ -4,12 +4,13 @@ from typing import List
 
 import numpy as np
 from hiclass import LocalClassifierPerLevel
+from sklearn.utils.validation import check_array
 
 
 class Filter(LocalClassifierPerLevel):
     """Add the predict_proba method and classes_ attribute."""
 
-    def fit(self, X, y):
+    def fit(self, X, y, sample_weight=None):
         """
         Fit a local classifier per level.
 
@@ -18,16 +19,19 @@ class Filter(LocalClassifierPerLevel):
         X : {array-like, sparse matrix} of shape (n_samples, n_features)
             The training input samples. Internally, its dtype will be converted
             to ``dtype=np.float32``. If a sparse matrix is provided, it will be
-            converted into a sparse ``csc_matrix``.
+            converted into a sparse ``csr_matrix``.
         y : array-like of shape (n_samples, n_levels)
             The target values, i.e., hierarchical class labels for classification.
+        sample_weight : array-like of shape (n_samples,), default=None
+            Array of weights that are assigned to individual samples.
+            If not provided, then each sample is given unit weight.
 
         Returns
         -------
         self : object
             Fitted estimator.
         """
-        super().fit(X, y)
+        super().fit(X, y, sample_weight)
         self.classes_ = [
             self._remove_separator(classifier.classes_)
             for classifier in self.local_classifiers_
@@ -40,14 +44,16 @@ class Filter(LocalClassifierPerLevel):
 
         Parameters
         ----------
-        X : np.array of shape (n_samples, n_features)
-            The input samples.
+        X : {array-like, sparse matrix} of shape (n_samples, n_features)
+            The input samples. If a sparse matrix is provided, it will be
+            converted into a sparse ``csr_matrix``.
 
         Returns
         -------
         probabilities : np.ndarray of shape (n_levels, n_samples)
             Prediction probabilities for all classes in each hierarchical level.
         """
+        X = check_array(X, accept_sparse="csr")
         probabilities = []
         for classifier in self.local_classifiers_:
             probabilities.append(classifier.predict_proba(X))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Script to classify and filter sequences with hierarchical classifier and filter."""
+import argparse
+import pickle
+import sys
+from argparse import Namespace
+from multiprocessing import cpu_count
+
+from hitac._utils import (
+    FEATURE_BACKENDS,
+    get_feature_pool,
+    get_shared_kmers,
+    iter_frequencies,
+    classify_and_filter,
+    convert_taxonomy_to_taxxi,
+    save_tsv,
+    parse_kmer_size,
+)
+
+
+def parse_args(args: list) -> Namespace:
+    """
+    Parse a list of arguments.
+
+    Parameters
+    ----------
+    args : list
+        Arguments to parse.
+
+    Returns
+    -------
+    _ : Namespace
+        Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Classify and filter sequences with HiTaC, computing k-mer frequencies once",
+    )
+    parser.add_argument(
+        "--reads",
+        type=str,
+        required=True,
+        help="Input FASTA or FASTQ file with sequence(s) to classify, optionally compressed with gzip, bzip2, xz or zstd",
+    )
+    parser.add_argument(
+        "--classifier",
+        type=str,
+        required=True,
+        help="Path to trained hierarchical classifier",
+    )
+    parser.add_argument(
+        "--filter",
+        type=str,
+        required=True,
+        help="Path to trained hierarchical filter",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        required=False,
+        default=0.7,
+        help="Confidence threshold for limiting taxonomic depth. Set to 0 to compute confidence score but not apply it to limit the taxonomic depth of the assignments. [default: 0.7]",
+    )
+    parser.add_argument(
+        "--kmer",
+        type=parse_kmer_size,
+        required=False,
+        default=6,
+        help="K-mer size for feature extraction, or comma-separated k-mer sizes, used only when the models do not record their k-mers [default: 6]",
+    )
+    parser.add_argument(
+        "--sparse",
+        action="store_true",
+        help="Store k-mer frequencies in a sparse matrix, which reduces memory usage for large k-mer sizes [default: False]",
+    )
+    parser.add_argument(
+        "--min-quality",
+        type=int,
+        required=False,
+        default=None,
+        help="Skip k-mers containing bases with a lower Phred quality when reads are in FASTQ format [default: None]",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        required=False,
+        default=10000,
+        help="Number of reads loaded and classified at a time, which bounds memory usage for large inputs [default: 10000]",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        required=False,
+        default=cpu_count(),
+        help="Number of threads to train in parallel [default: all]",
+    )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        required=False,
+        default="thread",
+        choices=FEATURE_BACKENDS,
+        help="Compute k-mer frequencies in threads, which share memory, or in processes, which serialize their inputs and outputs [default: thread]",
+    )
+    parser.add_argument(
+        "--classification",
+        type=str,
+        required=True,
+        help="Path to store predictions",
+    )
+    parser.add_argument(
+        "--filtered-classification",
+        type=str,
+        required=True,
+        help="Path to store filtered predictions",
+    )
+    return parser.parse_args(args)
+
+
+def main():  # pragma: no cover
+    """Classify and filter sequences using HiTaC."""
+    args = parse_args(sys.argv[1:])
+    get_feature_pool(args.threads, args.backend)
+    classifier = pickle.load(open(args.classifier, "rb"))
+    hierarchical_filter = pickle.load(open(args.filter, "rb"))
+    kmers = get_shared_kmers(classifier, hierarchical_filter, args.kmer)
+    with open(args.classification, "w") as output, open(
+        args.filtered_classification, "w"
+    ) as filtered_output:
+        for seq_ids, x_test, inverse in iter_frequencies(
+            args.reads,
+            kmers,
+            args.chunk_size,
+            args.threads,
+            sparse=args.sparse,
+            dereplicate=True,
+            min_quality=args.min_quality,
+        ):
+            predictions, filtered_predictions, _ = classify_and_filter(
+                x_test, classifier, hierarchical_filter, args.threshold, inverse
+            )
+            save_tsv(output, seq_ids, convert_taxonomy_to_taxxi(predictions))
+            taxonomy = [
+                tax.rstrip(",")
+                for tax in convert_taxonomy_to_taxxi(filtered_predictions)
+            ]
+            save_tsv(filtered_output, seq_ids, taxonomy)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -7,13 +7,15 @@ from argparse import Namespace
 from multiprocessing import cpu_count
 
 from hitac._utils import (
-    compute_possible_kmers,
-    load_fasta,
-    compute_frequencies,
+    FEATURE_BACKENDS,
+    get_feature_pool,
+    get_kmers,
+    iter_frequencies,
     convert_taxonomy_to_taxxi,
     save_tsv,
-    load_classification,
+    zip_classification,
     compute_confidence,
+    parse_kmer_size,
 )
 
 
@@ -44,7 +46,7 @@ def parse_args(args: list) -> Namespace:
         "--reads",
         type=str,
         required=True,
-        help="Input FASTA file with sequence(s) to filter",
+        help="Input FASTA or FASTQ file with sequence(s) to filter, optionally compressed with gzip, bzip2, xz or zstd",
     )
     parser.add_argument(
         "--classification",
@@ -61,10 +63,29 @@ def parse_args(args: list) -> Namespace:
     )
     parser.add_argument(
         "--kmer",
-        type=int,
+        type=parse_kmer_size,
         required=False,
         default=6,
-        help="K-mer size for feature extraction [default: 6]",
+        help="K-mer size for feature extraction, or comma-separated k-mer sizes, used only when the model does not record its k-mers [default: 6]",
+    )
+    parser.add_argument(
+        "--sparse",
+        action="store_true",
+        help="Store k-mer frequencies in a sparse matrix, which reduces memory usage for large k-mer sizes [default: False]",
+    )
+    parser.add_argument(
+        "--min-quality",
+        type=int,
+        required=False,
+        default=None,
+        help="Skip k-mers containing bases with a lower Phred quality when reads are in FASTQ format [default: None]",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        required=False,
+        default=10000,
+        help="Number of reads loaded and filtered at a time, which bounds memory usage for large inputs [default: 10000]",
     )
     parser.add_argument(
         "--threads",
@@ -73,6 +94,14 @@ def parse_args(args: list) -> Namespace:
         default=cpu_count(),
         help="Number of threads to train in parallel [default: all]",
     )
+    parser.add_argument(
+        "--backend",
+        type=str,
+        required=False,
+        default="thread",
+        choices=FEATURE_BACKENDS,
+        help="Compute k-mer frequencies in threads, which share memory, or in processes, which serialize their inputs and outputs [default: thread]",
+    )
     parser.add_argument(
         "--filtered-classification",
         type=str,
@@ -85,19 +114,35 @@ def parse_args(args: list) -> Namespace:
 def main():  # pragma: no cover
     """Classify sequences using HiTaC."""
     args = parse_args(sys.argv[1:])
-    kmers = compute_possible_kmers(args.kmer)
-    test_sequences, seq_ids = load_fasta(fasta_path=args.reads, reference=False)
-    x_test = compute_frequencies(test_sequences, kmers, args.threads)
+    get_feature_pool(args.threads, args.backend)
     hierarchical_filter = pickle.load(open(args.filter, "rb"))
-    predict_proba = hierarchical_filter.predict_proba(x_test)
+    kmers = get_kmers(hierarchical_filter, args.kmer)
     classes = hierarchical_filter.classes_
-    classification = load_classification(args.classification)
-    predictions, confidence = compute_confidence(
-        classification, classes, predict_proba, args.threshold
+    chunks = zip_classification(
+        iter_frequencies(
+            args.reads,
+            kmers,
+            args.chunk_size,
+            args.threads,
+            sparse=args.sparse,
+            dereplicate=True,
+            min_quality=args.min_quality,
+        ),
+        args.classification,
+        args.chunk_size,
     )
-    taxonomy = [tax.rstrip(",") for tax in convert_taxonomy_to_taxxi(predictions)]
     with open(args.filtered_classification, "w") as output:
-        save_tsv(output, seq_ids, taxonomy)
+        for (seq_ids, x_test, inverse), classification in chunks:
+            predict_proba = [
+                proba[inverse] for proba in hierarchical_filter.predict_proba(x_test)
+            ]
+            predictions, confidence = compute_confidence(
+                classification, classes, predict_proba, args.threshold
+            )
+            taxonomy = [
+                tax.rstrip(",") for tax in convert_taxonomy_to_taxxi(predictions)
+            ]
+            save_tsv(output, seq_ids, taxonomy)
 
 
 if __name__ == "__main__":  # pragma: no cover
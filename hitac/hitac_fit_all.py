@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Script to fit hierarchical classifier and filter from the same features."""
+import argparse
+import functools
+import pickle
+import sys
+from argparse import Namespace
+
+from hitac._utils import (
+    add_feature_arguments,
+    compute_reference_frequencies,
+    compute_training_features,
+    get_feature_options,
+    fit_classifier_and_filter,
+)
+
+
+def parse_args(args: list) -> Namespace:
+    """
+    Parse a list of arguments.
+
+    Parameters
+    ----------
+    args : list
+        Arguments to parse.
+
+    Returns
+    -------
+    _ : Namespace
+        Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Fit hierarchical classifier and filter, computing k-mer frequencies once",
+    )
+    parser.add_argument(
+        "--reference",
+        type=str,
+        required=True,
+        help="Input FASTA file with reference sequence(s) to train model, optionally compressed with gzip, bzip2, xz or zstd",
+    )
+    add_feature_arguments(parser)
+    parser.add_argument(
+        "--tmp-dir",
+        type=str,
+        required=False,
+        default=None,
+        help="Temporary directory to persist local classifiers that are trained, in a subdirectory for each model. If the job needs to be restarted, it will skip the pre-trained local classifier found in the temporary directory. It also holds the k-mer frequencies that worker processes write with the process backend [default=None].",
+    )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Train the classifier and the filter at the same time, splitting the threads between them [default: False]",
+    )
+    parser.add_argument(
+        "--classifier",
+        type=str,
+        required=True,
+        help="Path to store trained hierarchical classifier",
+    )
+    parser.add_argument(
+        "--filter",
+        type=str,
+        required=True,
+        help="Path to store trained hierarchical filter",
+    )
+    return parser.parse_args(args)
+
+
+def main():  # pragma: no cover
+    """Fit HiTaC's classifier and filter."""
+    args = parse_args(sys.argv[1:])
+    x_train, y_train, sample_weight, kmers = compute_training_features(
+        functools.partial(
+            compute_reference_frequencies, args.reference, tmp_dir=args.tmp_dir
+        ),
+        **get_feature_options(args),
+    )
+    hierarchical_classifier, hierarchical_filter = fit_classifier_and_filter(
+        x_train, y_train, args.threads, args.tmp_dir, args.parallel, sample_weight
+    )
+    hierarchical_classifier.kmers_ = kmers
+    hierarchical_filter.kmers_ = kmers
+    pickle.dump(hierarchical_classifier, open(args.classifier, "wb"))
+    pickle.dump(hierarchical_filter, open(args.filter, "wb"))
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
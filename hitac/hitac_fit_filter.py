@@ -1,15 +1,16 @@
 #!/usr/bin/env python3
 """Script to fit hierarchical filter."""
 import argparse
+import functools
 import pickle
 import sys
 from argparse import Namespace
-from multiprocessing import cpu_count
 
 from hitac._utils import (
-    load_fasta,
-    compute_frequencies,
-    compute_possible_kmers,
+    add_feature_arguments,
+    compute_reference_frequencies,
+    compute_training_features,
+    get_feature_options,
     get_hierarchical_filter,
 )
 
@@ -35,28 +36,15 @@ def parse_args(args: list) -> Namespace:
         "--reference",
         type=str,
         required=True,
-        help="Input FASTA file with reference sequence(s) to train model",
-    )
-    parser.add_argument(
-        "--kmer",
-        type=int,
-        required=False,
-        default=6,
-        help="K-mer size for feature extraction [default: 6]",
-    )
-    parser.add_argument(
-        "--threads",
-        type=int,
-        required=False,
-        default=cpu_count(),
-        help="Number of threads to train in parallel [default: all]",
+        help="Input FASTA file with reference sequence(s) to train model, optionally compressed with gzip, bzip2, xz or zstd",
     )
+    add_feature_arguments(parser)
     parser.add_argument(
         "--tmp-dir",
         type=str,
         required=False,
         default=None,
-        help="Temporary directory to persist local classifiers that are trained. If the job needs to be restarted, it will skip the pre-trained local classifier found in the temporary directory [default=None].",
+        help="Temporary directory to persist local classifiers that are trained. If the job needs to be restarted, it will skip the pre-trained local classifier found in the temporary directory. It also holds the k-mer frequencies that worker processes write with the process backend [default=None].",
     )
     parser.add_argument(
         "--filter",
@@ -70,11 +58,15 @@ def parse_args(args: list) -> Namespace:
 def main():  # pragma: no cover
     """Fit HiTaC's filter."""
     args = parse_args(sys.argv[1:])
-    kmers = compute_possible_kmers(args.kmer)
-    training_sequences, y_train = load_fasta(fasta_path=args.reference, reference=True)
-    x_train = compute_frequencies(training_sequences, kmers, args.threads)
+    x_train, y_train, sample_weight, kmers = compute_training_features(
+        functools.partial(
+            compute_reference_frequencies, args.reference, tmp_dir=args.tmp_dir
+        ),
+        **get_feature_options(args),
+    )
     hierarchical_classifier = get_hierarchical_filter(args.threads, args.tmp_dir)
-    hierarchical_classifier.fit(x_train, y_train)
+    hierarchical_classifier.fit(x_train, y_train, sample_weight)
+    hierarchical_classifier.kmers_ = kmers
     pickle.dump(hierarchical_classifier, open(args.filter, "wb"))
 
 
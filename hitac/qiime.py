@@ -1,5 +1,7 @@
 """QIIME2 public functions for HiTaC."""
 
+import functools
+
 import pandas as pd
 import skbio
 from hiclass import LocalClassifierPerParentNode
@@ -11,29 +13,151 @@ from q2_types.feature_data import (
     Taxonomy,
     DNAFASTAFormat,
 )
-from qiime2.plugin import Float, Int, Str
+from q2_types.per_sample_sequences import (
+    FastqGzFormat,
+    SequencesWithQuality,
+    SingleLanePerSampleSingleEndFastqDirFmt,
+)
+from q2_types.sample_data import SampleData
+from qiime2.plugin import Bool, Choices, Float, Int, List, Range, Str
 
 from ._qiime import HierarchicalTaxonomicClassifier
 from ._utils import (
+    FEATURE_BACKENDS,
+    get_feature_pool,
     _extract_reads,
+    _iter_read_chunks,
+    PackedSequences,
+    FeatureCache,
     extract_qiime2_taxonomy,
-    compute_possible_kmers,
+    compute_training_features,
     compute_frequencies,
+    iter_frequencies,
+    get_kmers,
     get_hierarchical_classifier,
     convert_taxonomy_to_qiime2,
     get_hierarchical_filter,
+    get_shared_kmers,
+    classify_and_filter,
+    dereplicate_sequences,
+    fit_classifier_and_filter,
     compute_confidence,
 )
 from .filter import Filter
 from .plugin_setup import citations, plugin
 
 
+def _compute_training_frequencies(
+    reference_reads: DNAIterator,
+    reference_taxonomy: pd.Series,
+    kmers,
+    threads: int,
+    sparse: bool,
+    cache: FeatureCache = None,
+    tmp_dir: str = None,
+) -> tuple:
+    _, training_sequences = _extract_reads(reference_reads)
+    training_sequences = PackedSequences.from_sequences(training_sequences)
+    taxonomy = extract_qiime2_taxonomy(reference_taxonomy)
+    if cache is None:
+        x_train = compute_frequencies(
+            training_sequences, kmers, threads, sparse=sparse, tmp_dir=tmp_dir
+        )
+        return x_train, taxonomy, kmers
+    key = cache.get_key(training_sequences, kmers, sparse)
+    cached = cache.load(key)
+    if cached is not None:
+        x_train, _, kmers = cached
+        return x_train, taxonomy, kmers
+    x_train = compute_frequencies(
+        training_sequences, kmers, threads, sparse=sparse, tmp_dir=tmp_dir
+    )
+    cache.save(key, x_train, kmers=kmers)
+    return x_train, taxonomy, kmers
+
+
+def _compute_training_features(
+    reference_reads: DNAIterator, reference_taxonomy: pd.Series, parameters: dict
+) -> tuple:
+    # Parameters are the arguments of an action, of which the feature options and tmp_dir are
+    # passed on
+    return compute_training_features(
+        functools.partial(
+            _compute_training_frequencies,
+            reference_reads,
+            reference_taxonomy,
+            tmp_dir=parameters["tmp_dir"],
+        ),
+        **{name: parameters[name] for name in _FEATURE_PARAMETERS},
+    )
+
+
+# Parameters of the actions that train models, passed on to compute_training_features
+_FEATURE_PARAMETERS = {
+    "kmer": Int,
+    "threads": Int,
+    "backend": Str % Choices(FEATURE_BACKENDS),
+    "sparse": Bool,
+    "hash_buckets": Int,
+    "hash_seed": Int % Range(0, None),
+    "canonical": Bool,
+    "max_ambiguous": Int,
+    "kmer_sizes": List[Int],
+    "spaced_seeds": List[Str],
+    "dtype": Str % Choices(["uint8", "uint16", "float32"]),
+    "normalization": Str % Choices(["length", "tfidf"]),
+    "cache_dir": Str,
+    "cache_size": Float,
+    "select_kmers": Int,
+    "variance_threshold": Float,
+    "cluster_similarity": Float,
+    "max_per_taxon": Int,
+}
+
+_FEATURE_DESCRIPTIONS = {
+    "kmer": "K-mer size.",
+    "threads": "Number of threads for parallel training",
+    "backend": "Compute k-mer frequencies in threads, which share memory, or in processes, which serialize their inputs and outputs.",
+    "sparse": "Store k-mer frequencies in a sparse matrix, which reduces memory usage for large k-mer sizes.",
+    "hash_buckets": "Hash k-mers into this number of features, which allows k-mer sizes beyond 8.",
+    "hash_seed": "Seed of the hash function used with hash_buckets.",
+    "canonical": "Count each k-mer and its reverse complement as the same feature, which makes the model strand-agnostic.",
+    "max_ambiguous": "Count k-mers with up to this number of IUPAC ambiguous bases as fractions of every compatible k-mer, and soft-masked bases as uppercase.",
+    "kmer_sizes": "K-mer sizes whose features are computed in a single pass and combined, e.g., 4, 5 and 6. Overrides kmer.",
+    "spaced_seeds": "Binary masks of spaced k-mers, e.g., 1101011, made of the bases at the positions marked with 1. They span longer regions than contiguous k-mers with the same number of features and tolerate substitutions at the other positions. Overrides kmer and kmer_sizes.",
+    "dtype": "Data type of the k-mer frequencies, which reduces memory usage. Integer counts saturate at the largest value of the type.",
+    "normalization": "Divide k-mer counts by the number of k-mers in each sequence (length), and also weight them by their inverse document frequency (tfidf).",
+    "cache_dir": "Directory to cache k-mer frequencies of the reference, which are then reused by later runs with the same reference and k-mer options.",
+    "cache_size": "Maximum size of the cache in GB, evicting the least recently used matrices.",
+    "select_kmers": "Keep only this number of k-mers, those most associated with the taxonomy by the chi-squared statistic, so that the models store and multiply fewer coefficients.",
+    "variance_threshold": "Drop k-mers whose frequency varies across the reference by at most this variance.",
+    "cluster_similarity": "Train on representatives of the reference sequences of each taxon, merging sequences whose k-mer profiles have at least this cosine similarity and weighting representatives by the number of sequences they stand for.",
+    "max_per_taxon": "Maximum number of representatives per taxon, merging the smallest clusters into the most similar representatives.",
+}
+
+
 def fit(
     reference_reads: DNAIterator,
     reference_taxonomy: pd.Series,
     tmp_dir: str = None,
     kmer: int = 6,
     threads: int = cpu_count(),
+    backend: str = "thread",
+    sparse: bool = False,
+    hash_buckets: int = None,
+    hash_seed: int = 0,
+    canonical: bool = False,
+    max_ambiguous: int = None,
+    kmer_sizes: list = None,
+    spaced_seeds: list = None,
+    dtype: str = None,
+    normalization: str = None,
+    cache_dir: str = None,
+    cache_size: float = None,
+    select_kmers: int = None,
+    variance_threshold: float = None,
+    cluster_similarity: float = None,
+    max_per_taxon: int = None,
 ) -> LocalClassifierPerParentNode:
     """
     Fit HiTaC's classifier.
@@ -46,23 +170,56 @@ def fit(
         Reference taxonomy.
     tmp_dir : str
         Temporary directory to persist local classifiers that are trained. If the job needs to be restarted,
-         it will skip the pre-trained local classifier found in the temporary directory.
+         it will skip the pre-trained local classifier found in the temporary directory. It also
+         holds the k-mer frequencies that worker processes write with the process backend.
     kmer : int, default=6
         K-mer size.
     threads : int, default='All CPUs'
         Number of threads for parallel training.
+    backend : str, default="thread"
+        Compute k-mer frequencies in threads or in processes.
+    sparse : bool, default=False
+        Store k-mer frequencies in a sparse matrix.
+    hash_buckets : int, default=None
+        Hash k-mers into this number of features.
+    hash_seed : int, default=0
+        Seed of the hash function.
+    canonical : bool, default=False
+        Count each k-mer and its reverse complement as the same feature.
+    max_ambiguous : int, default=None
+        Count k-mers with up to this number of ambiguous bases as fractions.
+    kmer_sizes : list, default=None
+        K-mer sizes whose features are combined, used instead of kmer.
+    spaced_seeds : list, default=None
+        Binary masks of spaced k-mers, used instead of kmer and kmer_sizes.
+    dtype : str, default=None
+        Data type of the k-mer frequencies.
+    normalization : str, default=None
+        Normalization of the k-mer counts, either length or tfidf.
+    cache_dir : str, default=None
+        Directory to cache k-mer frequencies of the reference.
+    cache_size : float, default=None
+        Maximum size of the cache in GB.
+    select_kmers : int, default=None
+        Keep only this number of k-mers most associated with the taxonomy.
+    variance_threshold : float, default=None
+        Drop k-mers whose frequency variance is at most this value.
+    cluster_similarity : float, default=None
+        Merge reference sequences of a taxon whose k-mer profiles have at least this cosine similarity.
+    max_per_taxon : int, default=None
+        Maximum number of representatives per taxon.
 
     Returns
     -------
     hierarchical_classifier : LocalClassifierPerParentNode
         Local hierarchical classifier based on the taxonomic hierarchy.
     """
-    kmers = compute_possible_kmers(kmer)
-    _, training_sequences = _extract_reads(reference_reads)
-    x_train = compute_frequencies(training_sequences, kmers, threads)
-    y_train = extract_qiime2_taxonomy(reference_taxonomy)
+    x_train, y_train, sample_weight, kmers = _compute_training_features(
+        reference_reads, reference_taxonomy, locals()
+    )
     hierarchical_classifier = get_hierarchical_classifier(threads, tmp_dir)
-    hierarchical_classifier.fit(x_train, y_train)
+    hierarchical_classifier.fit(x_train, y_train, sample_weight)
+    hierarchical_classifier.kmers_ = kmers
     return hierarchical_classifier
 
 
@@ -72,11 +229,13 @@ plugin.methods.register_function(
         "reference_reads": FeatureData[Sequence],
         "reference_taxonomy": FeatureData[Taxonomy],
     },
-    parameters={"tmp_dir": Str, "kmer": Int, "threads": Int},
+    parameters={
+        "tmp_dir": Str,
+        **_FEATURE_PARAMETERS,
+    },
     parameter_descriptions={
-        "tmp_dir": "Temporary directory to persist local classifiers that are trained. If the job needs to be restarted, it will skip the pre-trained local classifier found in the temporary directory.",
-        "kmer": "K-mer size.",
-        "threads": "Number of threads for parallel training",
+        "tmp_dir": "Temporary directory to persist local classifiers that are trained. If the job needs to be restarted, it will skip the pre-trained local classifier found in the temporary directory. It also holds the k-mer frequencies that worker processes write with the process backend.",
+        **_FEATURE_DESCRIPTIONS,
     },
     outputs=[("classifier", HierarchicalTaxonomicClassifier)],
     name="Train HiTaC's hierarchical classifier",
@@ -90,6 +249,9 @@ def classify(
     classifier: LocalClassifierPerParentNode,
     kmer: int = 6,
     threads: int = cpu_count(),
+    backend: str = "thread",
+    sparse: bool = False,
+    chunk_size: int = 10000,
 ) -> pd.DataFrame:
     """
     Classify sequences with HiTaC.
@@ -101,22 +263,33 @@ def classify(
     classifier : LocalClassifierPerParentNode
         Pre-fitted hierarchical classifier.
     kmer : int, default=6
-        K-mer size.
+        K-mer size, used only when the classifier does not record its k-mers.
     threads : int, default='All CPUs'
         Number of threads for parallel classification.
+    backend : str, default="thread"
+        Compute k-mer frequencies in threads or in processes.
+    sparse : bool, default=False
+        Store k-mer frequencies in a sparse matrix.
+    chunk_size : int, default=10000
+        Number of reads loaded and classified at a time.
 
     Returns
     -------
     classification : pd.DataFrame
         DataFrame containing the taxonomies assigned to each sequence.
     """
-    kmers = compute_possible_kmers(kmer)
+    get_feature_pool(threads, backend)
+    kmers = get_kmers(classifier, kmer)
     # transform reads to DNAIterator
     reads = DNAIterator(skbio.read(str(reads), format="fasta", constructor=skbio.DNA))
-    seq_ids, test_sequences = _extract_reads(reads)
-    X_test = compute_frequencies(test_sequences, kmers, threads)
-    predictions = classifier.predict(X_test)
-    taxonomy = convert_taxonomy_to_qiime2(predictions)
+    seq_ids = []
+    taxonomy = []
+    for chunk_ids, test_sequences in _iter_read_chunks(reads, chunk_size):
+        test_sequences, inverse = dereplicate_sequences(test_sequences)
+        X_test = compute_frequencies(test_sequences, kmers, threads, sparse=sparse)
+        predictions = classifier.predict(X_test)[inverse]
+        seq_ids.extend(chunk_ids)
+        taxonomy.extend(convert_taxonomy_to_qiime2(predictions))
     confidence = [-1] * len(seq_ids)
     result = pd.DataFrame(
         {"Taxon": taxonomy, "Confidence": confidence},
@@ -137,10 +310,19 @@ plugin.methods.register_function(
         "reads": "The feature data to be classified.",
         "classifier": "The hierarchical taxonomic classifier for classifying the reads.",
     },
-    parameters={"kmer": Int, "threads": Int},
+    parameters={
+        "kmer": Int,
+        "threads": Int,
+        "backend": Str % Choices(FEATURE_BACKENDS),
+        "sparse": Bool,
+        "chunk_size": Int,
+    },
     parameter_descriptions={
-        "kmer": "K-mer size.",
+        "kmer": "K-mer size, used only when the classifier does not record its k-mers.",
         "threads": "Number of threads for parallel classification",
+        "backend": "Compute k-mer frequencies in threads, which share memory, or in processes, which serialize their inputs and outputs.",
+        "sparse": "Store k-mer frequencies in a sparse matrix, which reduces memory usage for large k-mer sizes.",
+        "chunk_size": "Number of reads loaded and classified at a time, which bounds memory usage for large inputs.",
     },
     outputs=[("classification", FeatureData[Taxonomy])],
     name="Hierarchical classification with HiTaC's pre-fitted model",
@@ -155,6 +337,22 @@ def fit_filter(
     tmp_dir: str = None,
     kmer: int = 6,
     threads: int = cpu_count(),
+    backend: str = "thread",
+    sparse: bool = False,
+    hash_buckets: int = None,
+    hash_seed: int = 0,
+    canonical: bool = False,
+    max_ambiguous: int = None,
+    kmer_sizes: list = None,
+    spaced_seeds: list = None,
+    dtype: str = None,
+    normalization: str = None,
+    cache_dir: str = None,
+    cache_size: float = None,
+    select_kmers: int = None,
+    variance_threshold: float = None,
+    cluster_similarity: float = None,
+    max_per_taxon: int = None,
 ) -> Filter:
     """
     Fit HiTaC's filter.
@@ -167,23 +365,56 @@ def fit_filter(
         Reference taxonomy.
     tmp_dir : str
         Temporary directory to persist local classifiers that are trained. If the job needs to be restarted,
-         it will skip the pre-trained local classifier found in the temporary directory.
+         it will skip the pre-trained local classifier found in the temporary directory. It also
+         holds the k-mer frequencies that worker processes write with the process backend.
     kmer : int, default=6
         K-mer size.
     threads : int, default='All CPUs'
         Number of threads for parallel training.
+    backend : str, default="thread"
+        Compute k-mer frequencies in threads or in processes.
+    sparse : bool, default=False
+        Store k-mer frequencies in a sparse matrix.
+    hash_buckets : int, default=None
+        Hash k-mers into this number of features.
+    hash_seed : int, default=0
+        Seed of the hash function.
+    canonical : bool, default=False
+        Count each k-mer and its reverse complement as the same feature.
+    max_ambiguous : int, default=None
+        Count k-mers with up to this number of ambiguous bases as fractions.
+    kmer_sizes : list, default=None
+        K-mer sizes whose features are combined, used instead of kmer.
+    spaced_seeds : list, default=None
+        Binary masks of spaced k-mers, used instead of kmer and kmer_sizes.
+    dtype : str, default=None
+        Data type of the k-mer frequencies.
+    normalization : str, default=None
+        Normalization of the k-mer counts, either length or tfidf.
+    cache_dir : str, default=None
+        Directory to cache k-mer frequencies of the reference.
+    cache_size : float, default=None
+        Maximum size of the cache in GB.
+    select_kmers : int, default=None
+        Keep only this number of k-mers most associated with the taxonomy.
+    variance_threshold : float, default=None
+        Drop k-mers whose frequency variance is at most this value.
+    cluster_similarity : float, default=None
+        Merge reference sequences of a taxon whose k-mer profiles have at least this cosine similarity.
+    max_per_taxon : int, default=None
+        Maximum number of representatives per taxon.
 
     Returns
     -------
     hierarchical_classifier : Filter
         Local hierarchical filter based on the taxonomic hierarchy.
     """
-    kmers = compute_possible_kmers(kmer)
-    _, training_sequences = _extract_reads(reference_reads)
-    X_train = compute_frequencies(training_sequences, kmers, threads)
-    Y_train = extract_qiime2_taxonomy(reference_taxonomy)
+    X_train, Y_train, sample_weight, kmers = _compute_training_features(
+        reference_reads, reference_taxonomy, locals()
+    )
     hierarchical_filter = get_hierarchical_filter(threads, tmp_dir)
-    hierarchical_filter.fit(X_train, Y_train)
+    hierarchical_filter.fit(X_train, Y_train, sample_weight)
+    hierarchical_filter.kmers_ = kmers
     return hierarchical_filter
 
 
@@ -193,11 +424,13 @@ plugin.methods.register_function(
         "reference_reads": FeatureData[Sequence],
         "reference_taxonomy": FeatureData[Taxonomy],
     },
-    parameters={"tmp_dir": Str, "kmer": Int, "threads": Int},
+    parameters={
+        "tmp_dir": Str,
+        **_FEATURE_PARAMETERS,
+    },
     parameter_descriptions={
-        "tmp_dir": "Temporary directory to persist local classifiers that are trained. If the job needs to be restarted, it will skip the pre-trained local classifier found in the temporary directory.",
-        "kmer": "K-mer size.",
-        "threads": "Number of threads for parallel training",
+        "tmp_dir": "Temporary directory to persist local classifiers that are trained. If the job needs to be restarted, it will skip the pre-trained local classifier found in the temporary directory. It also holds the k-mer frequencies that worker processes write with the process backend.",
+        **_FEATURE_DESCRIPTIONS,
     },
     outputs=[("filter", HierarchicalTaxonomicClassifier)],
     name="Train HiTaC's hierarchical filter",
@@ -206,6 +439,124 @@ plugin.methods.register_function(
 )
 
 
+def fit_all(
+    reference_reads: DNAIterator,
+    reference_taxonomy: pd.Series,
+    tmp_dir: str = None,
+    kmer: int = 6,
+    threads: int = cpu_count(),
+    backend: str = "thread",
+    sparse: bool = False,
+    hash_buckets: int = None,
+    hash_seed: int = 0,
+    canonical: bool = False,
+    max_ambiguous: int = None,
+    kmer_sizes: list = None,
+    spaced_seeds: list = None,
+    dtype: str = None,
+    normalization: str = None,
+    cache_dir: str = None,
+    cache_size: float = None,
+    select_kmers: int = None,
+    variance_threshold: float = None,
+    cluster_similarity: float = None,
+    max_per_taxon: int = None,
+    parallel: bool = False,
+) -> (LocalClassifierPerParentNode, Filter):
+    """
+    Fit HiTaC's classifier and filter from the same k-mer frequencies.
+
+    Parameters
+    ----------
+    reference_reads : DNAIterator
+        Reference reads.
+    reference_taxonomy : pd.Series
+        Reference taxonomy.
+    tmp_dir : str
+        Temporary directory to persist local classifiers that are trained, in a subdirectory for each model.
+         If the job needs to be restarted, it will skip the pre-trained local classifier found in the temporary directory. It also
+         holds the k-mer frequencies that worker processes write with the process backend.
+    kmer : int, default=6
+        K-mer size.
+    threads : int, default='All CPUs'
+        Number of threads for parallel training.
+    backend : str, default="thread"
+        Compute k-mer frequencies in threads or in processes.
+    sparse : bool, default=False
+        Store k-mer frequencies in a sparse matrix.
+    hash_buckets : int, default=None
+        Hash k-mers into this number of features.
+    hash_seed : int, default=0
+        Seed of the hash function.
+    canonical : bool, default=False
+        Count each k-mer and its reverse complement as the same feature.
+    max_ambiguous : int, default=None
+        Count k-mers with up to this number of ambiguous bases as fractions.
+    kmer_sizes : list, default=None
+        K-mer sizes whose features are combined, used instead of kmer.
+    spaced_seeds : list, default=None
+        Binary masks of spaced k-mers, used instead of kmer and kmer_sizes.
+    dtype : str, default=None
+        Data type of the k-mer frequencies.
+    normalization : str, default=None
+        Normalization of the k-mer counts, either length or tfidf.
+    cache_dir : str, default=None
+        Directory to cache k-mer frequencies of the reference.
+    cache_size : float, default=None
+        Maximum size of the cache in GB.
+    select_kmers : int, default=None
+        Keep only this number of k-mers most associated with the taxonomy.
+    variance_threshold : float, default=None
+        Drop k-mers whose frequency variance is at most this value.
+    cluster_similarity : float, default=None
+        Merge reference sequences of a taxon whose k-mer profiles have at least this cosine similarity.
+    max_per_taxon : int, default=None
+        Maximum number of representatives per taxon.
+    parallel : bool, default=False
+        Train the classifier and the filter at the same time, splitting the threads between them.
+
+    Returns
+    -------
+    hierarchical_classifier, hierarchical_filter : tuple
+        Local hierarchical classifier based on the taxonomic hierarchy and the hierarchical filter.
+    """
+    x_train, y_train, sample_weight, kmers = _compute_training_features(
+        reference_reads, reference_taxonomy, locals()
+    )
+    hierarchical_classifier, hierarchical_filter = fit_classifier_and_filter(
+        x_train, y_train, threads, tmp_dir, parallel, sample_weight
+    )
+    hierarchical_classifier.kmers_ = kmers
+    hierarchical_filter.kmers_ = kmers
+    return hierarchical_classifier, hierarchical_filter
+
+
+plugin.methods.register_function(
+    function=fit_all,
+    inputs={
+        "reference_reads": FeatureData[Sequence],
+        "reference_taxonomy": FeatureData[Taxonomy],
+    },
+    parameters={
+        "tmp_dir": Str,
+        **_FEATURE_PARAMETERS,
+        "parallel": Bool,
+    },
+    parameter_descriptions={
+        "tmp_dir": "Temporary directory to persist local classifiers that are trained, in a subdirectory for each model. If the job needs to be restarted, it will skip the pre-trained local classifier found in the temporary directory. It also holds the k-mer frequencies that worker processes write with the process backend.",
+        **_FEATURE_DESCRIPTIONS,
+        "parallel": "Train the classifier and the filter at the same time, splitting the threads between them.",
+    },
+    outputs=[
+        ("classifier", HierarchicalTaxonomicClassifier),
+        ("filter", HierarchicalTaxonomicClassifier),
+    ],
+    name="Train HiTaC's hierarchical classifier and filter",
+    description="Train HiTaC's hierarchical classifier and filter, computing k-mer frequencies of the reference only once",
+    citations=[citations["miranda2020hitac"]],
+)
+
+
 def filter(
     reads: DNAFASTAFormat,
     filter: Filter,
@@ -213,6 +564,9 @@ def filter(
     threshold: float = 0.7,
     kmer: int = 6,
     threads: int = cpu_count(),
+    backend: str = "thread",
+    sparse: bool = False,
+    chunk_size: int = 10000,
 ) -> pd.DataFrame:
     """
     Filter sequences with HiTaC.
@@ -228,27 +582,44 @@ def filter(
     threshold : float, default=0.7
         Confidence threshold for limiting taxonomic depth. Set to 0 to compute confidence score but not apply it to limit the taxonomic depth of the assignments.
     kmer : int, default=6
-        K-mer size.
+        K-mer size, used only when the filter does not record its k-mers.
     threads : int, default='All CPUs'
         Number of threads for parallel filtering.
+    backend : str, default="thread"
+        Compute k-mer frequencies in threads or in processes.
+    sparse : bool, default=False
+        Store k-mer frequencies in a sparse matrix.
+    chunk_size : int, default=10000
+        Number of reads loaded and filtered at a time.
 
     Returns
     -------
     filtered_classification : pd.DataFrame
         DataFrame containing the taxonomies assigned to each sequence and the prediction probability for the lowest taxonomic rank.
     """
-    kmers = compute_possible_kmers(kmer)
+    get_feature_pool(threads, backend)
+    kmers = get_kmers(filter, kmer)
     # transform reads to DNAIterator
     reads = DNAIterator(skbio.read(str(reads), format="fasta", constructor=skbio.DNA))
-    seq_ids, test_sequences = _extract_reads(reads)
-    X_test = compute_frequencies(test_sequences, kmers, threads)
-    predict_proba = filter.predict_proba(X_test)
     classes = filter.classes_
     classification = extract_qiime2_taxonomy(classification["Taxon"])
-    predictions, confidence = compute_confidence(
-        classification, classes, predict_proba, threshold
-    )
-    taxonomy = convert_taxonomy_to_qiime2(predictions)
+    seq_ids = []
+    taxonomy = []
+    confidence = []
+    for chunk_ids, test_sequences in _iter_read_chunks(reads, chunk_size):
+        test_sequences, inverse = dereplicate_sequences(test_sequences)
+        X_test = compute_frequencies(test_sequences, kmers, threads, sparse=sparse)
+        predict_proba = [proba[inverse] for proba in filter.predict_proba(X_test)]
+        start = len(seq_ids)
+        predictions, chunk_confidence = compute_confidence(
+            classification[start : start + len(chunk_ids)],
+            classes,
+            predict_proba,
+            threshold,
+        )
+        seq_ids.extend(chunk_ids)
+        taxonomy.extend(convert_taxonomy_to_qiime2(predictions))
+        confidence.extend(chunk_confidence)
     result = pd.DataFrame(
         {"Taxon": taxonomy, "Confidence": confidence},
         index=seq_ids,
@@ -270,14 +641,474 @@ plugin.methods.register_function(
         "filter": "The hierarchical taxonomic filter for filtering the reads.",
         "classification": "The predictions made by HiTaC",
     },
-    parameters={"threshold": Float, "kmer": Int, "threads": Int},
+    parameters={
+        "threshold": Float,
+        "kmer": Int,
+        "threads": Int,
+        "backend": Str % Choices(FEATURE_BACKENDS),
+        "sparse": Bool,
+        "chunk_size": Int,
+    },
     parameter_descriptions={
         "threshold": "Confidence threshold for limiting taxonomic depth. Set to 0 to compute confidence score but not apply it to limit the taxonomic depth of the assignments.",
-        "kmer": "K-mer size.",
+        "kmer": "K-mer size, used only when the filter does not record its k-mers.",
         "threads": "Number of threads for parallel filtering",
+        "backend": "Compute k-mer frequencies in threads, which share memory, or in processes, which serialize their inputs and outputs.",
+        "sparse": "Store k-mer frequencies in a sparse matrix, which reduces memory usage for large k-mer sizes.",
+        "chunk_size": "Number of reads loaded and filtered at a time, which bounds memory usage for large inputs.",
     },
     outputs=[("filtered_classification", FeatureData[Taxonomy])],
     name="Hierarchical classification filtering with HiTaC's pre-fitted model",
     description="Filter reads using a fitted hierarchical filter.",
     citations=[citations["miranda2020hitac"]],
 )
+
+
+def classify_filter(
+    reads: DNAFASTAFormat,
+    classifier: LocalClassifierPerParentNode,
+    filter: Filter,
+    threshold: float = 0.7,
+    kmer: int = 6,
+    threads: int = cpu_count(),
+    backend: str = "thread",
+    sparse: bool = False,
+    chunk_size: int = 10000,
+) -> (pd.DataFrame, pd.DataFrame):
+    """
+    Classify and filter sequences with HiTaC, computing k-mer frequencies once.
+
+    Parameters
+    ----------
+    reads : DNAFASTAFormat
+        Reads to classify.
+    classifier : LocalClassifierPerParentNode
+        Pre-fitted hierarchical classifier.
+    filter : Filter
+        Pre-fitted hierarchical filter.
+    threshold : float, default=0.7
+        Confidence threshold for limiting taxonomic depth. Set to 0 to compute confidence score but not apply it to limit the taxonomic depth of the assignments.
+    kmer : int, default=6
+        K-mer size, used only when the models do not record their k-mers.
+    threads : int, default='All CPUs'
+        Number of threads for parallel classification.
+    backend : str, default="thread"
+        Compute k-mer frequencies in threads or in processes.
+    sparse : bool, default=False
+        Store k-mer frequencies in a sparse matrix.
+    chunk_size : int, default=10000
+        Number of reads loaded and classified at a time.
+
+    Returns
+    -------
+    classification, filtered_classification : tuple
+        DataFrames containing the taxonomies assigned to each sequence by the classifier and after filtering,
+        the latter with the prediction probability for the lowest taxonomic rank.
+    """
+    get_feature_pool(threads, backend)
+    kmers = get_shared_kmers(classifier, filter, kmer)
+    # transform reads to DNAIterator
+    reads = DNAIterator(skbio.read(str(reads), format="fasta", constructor=skbio.DNA))
+    seq_ids = []
+    taxonomy = []
+    filtered_taxonomy = []
+    confidence = []
+    for chunk_ids, test_sequences in _iter_read_chunks(reads, chunk_size):
+        test_sequences, inverse = dereplicate_sequences(test_sequences)
+        X_test = compute_frequencies(test_sequences, kmers, threads, sparse=sparse)
+        predictions, filtered_predictions, chunk_confidence = classify_and_filter(
+            X_test, classifier, filter, threshold, inverse
+        )
+        seq_ids.extend(chunk_ids)
+        taxonomy.extend(convert_taxonomy_to_qiime2(predictions))
+        filtered_taxonomy.extend(convert_taxonomy_to_qiime2(filtered_predictions))
+        confidence.extend(chunk_confidence)
+    results = []
+    for taxa, scores in [
+        (taxonomy, [-1] * len(seq_ids)),
+        (filtered_taxonomy, confidence),
+    ]:
+        result = pd.DataFrame(
+            {"Taxon": taxa, "Confidence": scores},
+            index=seq_ids,
+            columns=["Taxon", "Confidence"],
+        )
+        result.index.name = "Feature ID"
+        results.append(result)
+    return tuple(results)
+
+
+plugin.methods.register_function(
+    function=classify_filter,
+    inputs={
+        "reads": FeatureData[Sequence],
+        "classifier": HierarchicalTaxonomicClassifier,
+        "filter": HierarchicalTaxonomicClassifier,
+    },
+    input_descriptions={
+        "reads": "The feature data to be classified.",
+        "classifier": "The hierarchical taxonomic classifier for classifying the reads.",
+        "filter": "The hierarchical taxonomic filter for filtering the reads.",
+    },
+    parameters={
+        "threshold": Float,
+        "kmer": Int,
+        "threads": Int,
+        "backend": Str % Choices(FEATURE_BACKENDS),
+        "sparse": Bool,
+        "chunk_size": Int,
+    },
+    parameter_descriptions={
+        "threshold": "Confidence threshold for limiting taxonomic depth. Set to 0 to compute confidence score but not apply it to limit the taxonomic depth of the assignments.",
+        "kmer": "K-mer size, used only when the models do not record their k-mers.",
+        "threads": "Number of threads for parallel classification",
+        "backend": "Compute k-mer frequencies in threads, which share memory, or in processes, which serialize their inputs and outputs.",
+        "sparse": "Store k-mer frequencies in a sparse matrix, which reduces memory usage for large k-mer sizes.",
+        "chunk_size": "Number of reads loaded and classified at a time, which bounds memory usage for large inputs.",
+    },
+    outputs=[
+        ("classification", FeatureData[Taxonomy]),
+        ("filtered_classification", FeatureData[Taxonomy]),
+    ],
+    name="Hierarchical classification and filtering with HiTaC's pre-fitted models",
+    description="Classify reads by taxon and filter the predictions, computing k-mer frequencies only once.",
+    citations=[citations["miranda2020hitac"]],
+)
+
+
+def _iter_fastq_frequencies(
+    reads: SingleLanePerSampleSingleEndFastqDirFmt,
+    kmers,
+    threads: int,
+    sparse: bool,
+    chunk_size: int,
+    min_quality: int,
+):
+    # Each sample is parsed, masked and featurized while it is decompressed, without writing
+    # intermediate files
+    for _, fastq in reads.sequences.iter_views(FastqGzFormat):
+        for chunk_ids, X_test, inverse in iter_frequencies(
+            str(fastq),
+            kmers,
+            chunk_size,
+            threads,
+            sparse=sparse,
+            dereplicate=True,
+            min_quality=min_quality,
+        ):
+            yield [seq_id.split()[0] for seq_id in chunk_ids], X_test, inverse
+
+
+def classify_fastq(
+    reads: SingleLanePerSampleSingleEndFastqDirFmt,
+    classifier: LocalClassifierPerParentNode,
+    kmer: int = 6,
+    min_quality: int = None,
+    threads: int = cpu_count(),
+    backend: str = "thread",
+    sparse: bool = False,
+    chunk_size: int = 10000,
+) -> pd.DataFrame:
+    """
+    Classify demultiplexed FASTQ reads with HiTaC.
+
+    Parameters
+    ----------
+    reads : SingleLanePerSampleSingleEndFastqDirFmt
+        Demultiplexed reads to classify.
+    classifier : LocalClassifierPerParentNode
+        Pre-fitted hierarchical classifier.
+    kmer : int, default=6
+        K-mer size, used only when the classifier does not record its k-mers.
+    min_quality : int, default=None
+        Skip k-mers containing bases with a lower Phred quality.
+    threads : int, default='All CPUs'
+        Number of threads for parallel classification.
+    backend : str, default="thread"
+        Compute k-mer frequencies in threads or in processes.
+    sparse : bool, default=False
+        Store k-mer frequencies in a sparse matrix.
+    chunk_size : int, default=10000
+        Number of reads loaded and classified at a time.
+
+    Returns
+    -------
+    classification : pd.DataFrame
+        DataFrame containing the taxonomies assigned to each read.
+    """
+    get_feature_pool(threads, backend)
+    kmers = get_kmers(classifier, kmer)
+    seq_ids = []
+    taxonomy = []
+    for chunk_ids, X_test, inverse in _iter_fastq_frequencies(
+        reads, kmers, threads, sparse, chunk_size, min_quality
+    ):
+        predictions = classifier.predict(X_test)[inverse]
+        seq_ids.extend(chunk_ids)
+        taxonomy.extend(convert_taxonomy_to_qiime2(predictions))
+    confidence = [-1] * len(seq_ids)
+    result = pd.DataFrame(
+        {"Taxon": taxonomy, "Confidence": confidence},
+        index=seq_ids,
+        columns=["Taxon", "Confidence"],
+    )
+    result.index.name = "Feature ID"
+    return result
+
+
+plugin.methods.register_function(
+    function=classify_fastq,
+    inputs={
+        "reads": SampleData[SequencesWithQuality],
+        "classifier": HierarchicalTaxonomicClassifier,
+    },
+    input_descriptions={
+        "reads": "The demultiplexed single-end reads to be classified.",
+        "classifier": "The hierarchical taxonomic classifier for classifying the reads.",
+    },
+    parameters={
+        "kmer": Int,
+        "min_quality": Int,
+        "threads": Int,
+        "backend": Str % Choices(FEATURE_BACKENDS),
+        "sparse": Bool,
+        "chunk_size": Int,
+    },
+    parameter_descriptions={
+        "kmer": "K-mer size, used only when the classifier does not record its k-mers.",
+        "min_quality": "Skip k-mers containing bases with a lower Phred quality.",
+        "threads": "Number of threads for parallel classification",
+        "backend": "Compute k-mer frequencies in threads, which share memory, or in processes, which serialize their inputs and outputs.",
+        "sparse": "Store k-mer frequencies in a sparse matrix, which reduces memory usage for large k-mer sizes.",
+        "chunk_size": "Number of reads loaded and classified at a time, which bounds memory usage for large inputs.",
+    },
+    outputs=[("classification", FeatureData[Taxonomy])],
+    name="Hierarchical classification of FASTQ reads with HiTaC's pre-fitted model",
+    description="Classify demultiplexed reads by taxon using a fitted hierarchical classifier, streaming them from their FASTQ files.",
+    citations=[citations["miranda2020hitac"]],
+)
+
+
+def filter_fastq(
+    reads: SingleLanePerSampleSingleEndFastqDirFmt,
+    filter: Filter,
+    classification: pd.DataFrame,
+    threshold: float = 0.7,
+    kmer: int = 6,
+    min_quality: int = None,
+    threads: int = cpu_count(),
+    backend: str = "thread",
+    sparse: bool = False,
+    chunk_size: int = 10000,
+) -> pd.DataFrame:
+    """
+    Filter demultiplexed FASTQ reads with HiTaC.
+
+    Parameters
+    ----------
+    reads : SingleLanePerSampleSingleEndFastqDirFmt
+        Demultiplexed reads to filter.
+    filter : Filter
+        Pre-fitted hierarchical filter.
+    classification : pd.DataFrame
+        Predictions made by HiTaC's classifier.
+    threshold : float, default=0.7
+        Confidence threshold for limiting taxonomic depth. Set to 0 to compute confidence score but not apply it to limit the taxonomic depth of the assignments.
+    kmer : int, default=6
+        K-mer size, used only when the filter does not record its k-mers.
+    min_quality : int, default=None
+        Skip k-mers containing bases with a lower Phred quality.
+    threads : int, default='All CPUs'
+        Number of threads for parallel filtering.
+    backend : str, default="thread"
+        Compute k-mer frequencies in threads or in processes.
+    sparse : bool, default=False
+        Store k-mer frequencies in a sparse matrix.
+    chunk_size : int, default=10000
+        Number of reads loaded and filtered at a time.
+
+    Returns
+    -------
+    filtered_classification : pd.DataFrame
+        DataFrame containing the taxonomies assigned to each read and the prediction probability for the lowest taxonomic rank.
+    """
+    get_feature_pool(threads, backend)
+    kmers = get_kmers(filter, kmer)
+    classes = filter.classes_
+    classification = extract_qiime2_taxonomy(classification["Taxon"])
+    seq_ids = []
+    taxonomy = []
+    confidence = []
+    for chunk_ids, X_test, inverse in _iter_fastq_frequencies(
+        reads, kmers, threads, sparse, chunk_size, min_quality
+    ):
+        predict_proba = [proba[inverse] for proba in filter.predict_proba(X_test)]
+        start = len(seq_ids)
+        predictions, chunk_confidence = compute_confidence(
+            classification[start : start + len(chunk_ids)],
+            classes,
+            predict_proba,
+            threshold,
+        )
+        seq_ids.extend(chunk_ids)
+        taxonomy.extend(convert_taxonomy_to_qiime2(predictions))
+        confidence.extend(chunk_confidence)
+    result = pd.DataFrame(
+        {"Taxon": taxonomy, "Confidence": confidence},
+        index=seq_ids,
+        columns=["Taxon", "Confidence"],
+    )
+    result.index.name = "Feature ID"
+    return result
+
+
+plugin.methods.register_function(
+    function=filter_fastq,
+    inputs={
+        "reads": SampleData[SequencesWithQuality],
+        "filter": HierarchicalTaxonomicClassifier,
+        "classification": FeatureData[Taxonomy],
+    },
+    input_descriptions={
+        "reads": "The demultiplexed single-end reads to be filtered.",
+        "filter": "The hierarchical taxonomic filter for filtering the reads.",
+        "classification": "The predictions made by HiTaC",
+    },
+    parameters={
+        "threshold": Float,
+        "kmer": Int,
+        "min_quality": Int,
+        "threads": Int,
+        "backend": Str % Choices(FEATURE_BACKENDS),
+        "sparse": Bool,
+        "chunk_size": Int,
+    },
+    parameter_descriptions={
+        "threshold": "Confidence threshold for limiting taxonomic depth. Set to 0 to compute confidence score but not apply it to limit the taxonomic depth of the assignments.",
+        "kmer": "K-mer size, used only when the filter does not record its k-mers.",
+        "min_quality": "Skip k-mers containing bases with a lower Phred quality.",
+        "threads": "Number of threads for parallel filtering",
+        "backend": "Compute k-mer frequencies in threads, which share memory, or in processes, which serialize their inputs and outputs.",
+        "sparse": "Store k-mer frequencies in a sparse matrix, which reduces memory usage for large k-mer sizes.",
+        "chunk_size": "Number of reads loaded and filtered at a time, which bounds memory usage for large inputs.",
+    },
+    outputs=[("filtered_classification", FeatureData[Taxonomy])],
+    name="Hierarchical classification filtering of FASTQ reads with HiTaC's pre-fitted model",
+    description="Filter the predictions of demultiplexed reads using a fitted hierarchical filter, streaming them from their FASTQ files.",
+    citations=[citations["miranda2020hitac"]],
+)
+
+
+def classify_filter_fastq(
+    reads: SingleLanePerSampleSingleEndFastqDirFmt,
+    classifier: LocalClassifierPerParentNode,
+    filter: Filter,
+    threshold: float = 0.7,
+    kmer: int = 6,
+    min_quality: int = None,
+    threads: int = cpu_count(),
+    backend: str = "thread",
+    sparse: bool = False,
+    chunk_size: int = 10000,
+) -> (pd.DataFrame, pd.DataFrame):
+    """
+    Classify and filter demultiplexed FASTQ reads with HiTaC, computing k-mer frequencies once.
+
+    Parameters
+    ----------
+    reads : SingleLanePerSampleSingleEndFastqDirFmt
+        Demultiplexed reads to classify.
+    classifier : LocalClassifierPerParentNode
+        Pre-fitted hierarchical classifier.
+    filter : Filter
+        Pre-fitted hierarchical filter.
+    threshold : float, default=0.7
+        Confidence threshold for limiting taxonomic depth. Set to 0 to compute confidence score but not apply it to limit the taxonomic depth of the assignments.
+    kmer : int, default=6
+        K-mer size, used only when the models do not record their k-mers.
+    min_quality : int, default=None
+        Skip k-mers containing bases with a lower Phred quality.
+    threads : int, default='All CPUs'
+        Number of threads for parallel classification.
+    backend : str, default="thread"
+        Compute k-mer frequencies in threads or in processes.
+    sparse : bool, default=False
+        Store k-mer frequencies in a sparse matrix.
+    chunk_size : int, default=10000
+        Number of reads loaded and classified at a time.
+
+    Returns
+    -------
+    classification, filtered_classification : tuple
+        DataFrames containing the taxonomies assigned to each read by the classifier and after filtering,
+        the latter with the prediction probability for the lowest taxonomic rank.
+    """
+    get_feature_pool(threads, backend)
+    kmers = get_shared_kmers(classifier, filter, kmer)
+    seq_ids = []
+    taxonomy = []
+    filtered_taxonomy = []
+    confidence = []
+    for chunk_ids, X_test, inverse in _iter_fastq_frequencies(
+        reads, kmers, threads, sparse, chunk_size, min_quality
+    ):
+        predictions, filtered_predictions, chunk_confidence = classify_and_filter(
+            X_test, classifier, filter, threshold, inverse
+        )
+        seq_ids.extend(chunk_ids)
+        taxonomy.extend(convert_taxonomy_to_qiime2(predictions))
+        filtered_taxonomy.extend(convert_taxonomy_to_qiime2(filtered_predictions))
+        confidence.extend(chunk_confidence)
+    results = []
+    for taxa, scores in [
+        (taxonomy, [-1] * len(seq_ids)),
+        (filtered_taxonomy, confidence),
+    ]:
+        result = pd.DataFrame(
+            {"Taxon": taxa, "Confidence": scores},
+            index=seq_ids,
+            columns=["Taxon", "Confidence"],
+        )
+        result.index.name = "Feature ID"
+        results.append(result)
+    return tuple(results)
+
+
+plugin.methods.register_function(
+    function=classify_filter_fastq,
+    inputs={
+        "reads": SampleData[SequencesWithQuality],
+        "classifier": HierarchicalTaxonomicClassifier,
+        "filter": HierarchicalTaxonomicClassifier,
+    },
+    input_descriptions={
+        "reads": "The demultiplexed single-end reads to be classified.",
+        "classifier": "The hierarchical taxonomic classifier for classifying the reads.",
+        "filter": "The hierarchical taxonomic filter for filtering the reads.",
+    },
+    parameters={
+        "threshold": Float,
+        "kmer": Int,
+        "min_quality": Int,
+        "threads": Int,
+        "backend": Str % Choices(FEATURE_BACKENDS),
+        "sparse": Bool,
+        "chunk_size": Int,
+    },
+    parameter_descriptions={
+        "threshold": "Confidence threshold for limiting taxonomic depth. Set to 0 to compute confidence score but not apply it to limit the taxonomic depth of the assignments.",
+        "kmer": "K-mer size, used only when the models do not record their k-mers.",
+        "min_quality": "Skip k-mers containing bases with a lower Phred quality.",
+        "threads": "Number of threads for parallel classification",
+        "backend": "Compute k-mer frequencies in threads, which share memory, or in processes, which serialize their inputs and outputs.",
+        "sparse": "Store k-mer frequencies in a sparse matrix, which reduces memory usage for large k-mer sizes.",
+        "chunk_size": "Number of reads loaded and classified at a time, which bounds memory usage for large inputs.",
+    },
+    outputs=[
+        ("classification", FeatureData[Taxonomy]),
+        ("filtered_classification", FeatureData[Taxonomy]),
+    ],
+    name="Hierarchical classification and filtering of FASTQ reads with HiTaC's pre-fitted models",
+    description="Classify demultiplexed reads by taxon and filter the predictions, streaming them from their FASTQ files and computing k-mer frequencies only once.",
+    citations=[citations["miranda2020hitac"]],
+)
@@ -27,7 +27,7 @@ REQUIRES_PYTHON = ">=3.8"
 KEYWORDS = ["hierarchical taxonomic classifier"]
 DACS_SOFTWARE = "https://gitlab.com/dacs-hpi"
 # What packages are required for this module to be executed?
-REQUIRED = ["pandas", "numpy", "scikit-learn", "hiclass", "scikit-bio"]
+REQUIRED = ["pandas", "numpy", "scipy", "scikit-learn", "hiclass", "scikit-bio"]
 
 # What packages are optional?
 # 'fancy feature': ['django'],}
@@ -41,6 +41,7 @@ extras["dev"] = [
     "pre-commit",
     "pyfakefs",
 ]
+extras["zstd"] = ["zstandard"]
 
 # The rest you shouldn't have to touch too much :)
 # ------------------------------------------------
@@ -131,6 +132,8 @@ setup(
             "hitac-classify=hitac.hitac_classify:main",
             "hitac-fit-filter=hitac.hitac_fit_filter:main",
             "hitac-filter=hitac.hitac_filter:main",
+            "hitac-fit-all=hitac.hitac_fit_all:main",
+            "hitac-classify-filter=hitac.hitac_classify_filter:main",
         ],
     },
     package_data={"hitac": ["citations.bib"]},
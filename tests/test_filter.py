@@ -1,4 +1,5 @@
 import numpy as np
+from scipy.sparse import csr_matrix
 from sklearn.ensemble import RandomForestClassifier
 
 from hitac.filter import Filter
@@ -35,3 +36,18 @@ def test_predict_proba_default():
     ]
     for i in range(max(len(result), len(ground_truth))):
         assert np.array_equal(result[i], ground_truth[i])
+
+
+def test_predict_proba_sparse():
+    X = np.array([[1, 2], [2, 3], [3, 4], [4, 5]])
+    Y = np.array([[1, 2, 3], [1, 4, 5], [1, 6, 7], [1, 2, 8]])
+    filter = Filter(
+        local_classifier=RandomForestClassifier(random_state=0),
+        replace_classifiers=False,
+        n_jobs=2,
+    )
+    filter.fit(csr_matrix(X), Y)
+    result = filter.predict_proba(csr_matrix(X))
+    ground_truth = filter.predict_proba(X)
+    for i in range(max(len(result), len(ground_truth))):
+        assert np.array_equal(result[i], ground_truth[i])
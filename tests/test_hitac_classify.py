@@ -15,6 +15,13 @@ class TestUtils(unittest.TestCase):
                 "9",
                 "--threads",
                 "32",
+                "--backend",
+                "process",
+                "--sparse",
+                "--min-quality",
+                "20",
+                "--chunk-size",
+                "500",
                 "--classification",
                 "classification.tsv",
             ]
@@ -27,5 +34,9 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(parser.kmer, 9)
         self.assertTrue(parser.threads)
         self.assertEqual(parser.threads, 32)
+        self.assertEqual(parser.backend, "process")
+        self.assertTrue(parser.sparse)
+        self.assertEqual(parser.chunk_size, 500)
+        self.assertEqual(parser.min_quality, 20)
         self.assertTrue(parser.classification)
         self.assertEqual(parser.classification, "classification.tsv")
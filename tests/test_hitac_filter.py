@@ -19,6 +19,12 @@ class TestUtils(unittest.TestCase):
                 "128",
                 "--threads",
                 "256",
+                "--backend",
+                "process",
+                "--min-quality",
+                "20",
+                "--chunk-size",
+                "1000",
                 "--filtered-classification",
                 "filtered_classification.tsv",
             ]
@@ -35,5 +41,8 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(parser.kmer, 128)
         self.assertTrue(parser.threads)
         self.assertEqual(parser.threads, 256)
+        self.assertEqual(parser.backend, "process")
+        self.assertEqual(parser.chunk_size, 1000)
+        self.assertEqual(parser.min_quality, 20)
         self.assertTrue(parser.filtered_classification)
         self.assertEqual(parser.filtered_classification, "filtered_classification.tsv")
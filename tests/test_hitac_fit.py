@@ -15,6 +15,32 @@ class TestUtils(unittest.TestCase):
                 "9",
                 "--threads",
                 "32",
+                "--backend",
+                "process",
+                "--hash-buckets",
+                "1024",
+                "--hash-seed",
+                "5",
+                "--canonical",
+                "--max-ambiguous",
+                "2",
+                "--dtype",
+                "float32",
+                "--normalization",
+                "tfidf",
+                "--sparse",
+                "--cache-dir",
+                "cache",
+                "--cache-size",
+                "1.5",
+                "--select-kmers",
+                "1000",
+                "--variance-threshold",
+                "0.5",
+                "--cluster-similarity",
+                "0.97",
+                "--max-per-taxon",
+                "10",
             ]
         )
         self.assertTrue(parser.reference)
@@ -23,5 +49,32 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(parser.kmer, 9)
         self.assertTrue(parser.threads)
         self.assertEqual(parser.threads, 32)
+        self.assertEqual(parser.backend, "process")
+        self.assertEqual(parser.hash_buckets, 1024)
+        self.assertEqual(parser.hash_seed, 5)
+        self.assertTrue(parser.canonical)
+        self.assertEqual(parser.max_ambiguous, 2)
+        self.assertEqual(parser.dtype, "float32")
+        self.assertEqual(parser.normalization, "tfidf")
+        self.assertTrue(parser.sparse)
+        self.assertEqual(parser.cache_dir, "cache")
+        self.assertEqual(parser.cache_size, 1.5)
+        self.assertEqual(parser.select_kmers, 1000)
+        self.assertEqual(parser.variance_threshold, 0.5)
+        self.assertEqual(parser.cluster_similarity, 0.97)
+        self.assertEqual(parser.max_per_taxon, 10)
         self.assertTrue(parser.classifier)
         self.assertEqual(parser.classifier, "classifier.pkl")
+
+    def test_parse_args_negative_hash_seed(self):
+        with self.assertRaises(SystemExit):
+            parse_args(
+                [
+                    "--reference",
+                    "reference.fasta",
+                    "--classifier",
+                    "classifier.pkl",
+                    "--hash-seed",
+                    "-1",
+                ]
+            )
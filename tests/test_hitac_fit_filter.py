@@ -15,6 +15,8 @@ class TestUtils(unittest.TestCase):
                 "8",
                 "--threads",
                 "1",
+                "--backend",
+                "process",
             ]
         )
         self.assertTrue(parser.reference)
@@ -23,5 +25,32 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(parser.kmer, 8)
         self.assertTrue(parser.threads)
         self.assertEqual(parser.threads, 1)
+        self.assertEqual(parser.backend, "process")
         self.assertTrue(parser.filter)
         self.assertEqual(parser.filter, "classifier.pkl")
+
+    def test_parse_args_kmer_sizes(self):
+        parser = parse_args(
+            [
+                "--reference",
+                "reference.fasta",
+                "--filter",
+                "filter.pkl",
+                "--kmer",
+                "4,6",
+            ]
+        )
+        self.assertEqual(parser.kmer, [4, 6])
+
+    def test_parse_args_spaced_seeds(self):
+        parser = parse_args(
+            [
+                "--reference",
+                "reference.fasta",
+                "--filter",
+                "filter.pkl",
+                "--spaced-seeds",
+                "1101011,11011",
+            ]
+        )
+        self.assertEqual(parser.spaced_seeds, "1101011,11011")
@@ -1,6 +1,8 @@
+import gzip
 import itertools
 import os
 import tarfile
+import tempfile
 import unittest
 from io import StringIO
 from pathlib import Path
@@ -12,6 +14,7 @@ import sklearn
 from hiclass import LocalClassifierPerParentNode
 from pyfakefs.fake_filesystem_unittest import Patcher
 from q2_types.feature_data import DNAIterator
+from q2_types.per_sample_sequences import SingleLanePerSampleSingleEndFastqDirFmt
 from sklearn.linear_model import LogisticRegression
 
 from hitac import qiime
@@ -140,6 +143,84 @@ class TestUtils(unittest.TestCase):
         assert len(ground_truth) == len(predictions)
         assert all([a == b for a, b in zip(predictions, ground_truth)])
 
+    def test_classify_filter_1(self):
+        reference_reads = DNAIterator(
+            skbio.read(
+                os.path.join(fixtures_loc, "classify_1_reference_reads.fasta"),
+                format="fasta",
+                constructor=skbio.DNA,
+            )
+        )
+        reference_taxonomy = list(
+            itertools.chain(
+                *pd.read_csv(
+                    os.path.join(fixtures_loc, "classify_1_reference_taxonomy.tsv"),
+                    sep="\t",
+                    usecols=["Taxon"],
+                ).values.tolist()
+            )
+        )
+        query_reads = os.path.join(fixtures_loc, "classify_1_query_reads.fasta")
+        hierarchical_classifier, hierarchical_filter = qiime.fit_all(
+            reference_reads, reference_taxonomy
+        )
+        classification, filtered_classification = qiime.classify_filter(
+            query_reads, hierarchical_classifier, hierarchical_filter
+        )
+        pd.testing.assert_frame_equal(
+            qiime.classify(query_reads, hierarchical_classifier), classification
+        )
+        pd.testing.assert_frame_equal(
+            qiime.filter(query_reads, hierarchical_filter, classification),
+            filtered_classification,
+        )
+
+    def test_classify_fastq_1(self):
+        reference_reads = DNAIterator(
+            skbio.read(
+                os.path.join(fixtures_loc, "classify_1_reference_reads.fasta"),
+                format="fasta",
+                constructor=skbio.DNA,
+            )
+        )
+        reference_taxonomy = list(
+            itertools.chain(
+                *pd.read_csv(
+                    os.path.join(fixtures_loc, "classify_1_reference_taxonomy.tsv"),
+                    sep="\t",
+                    usecols=["Taxon"],
+                ).values.tolist()
+            )
+        )
+        query_reads = os.path.join(fixtures_loc, "classify_1_query_reads.fasta")
+        with tempfile.TemporaryDirectory() as directory:
+            fastq = "sample1_1_L001_R1_001.fastq.gz"
+            with gzip.open(os.path.join(directory, fastq), "wt") as fout:
+                for read in skbio.read(
+                    query_reads, format="fasta", constructor=skbio.DNA
+                ):
+                    quality = "I" * len(read)
+                    fout.write(f"@{read.metadata['id']}\n{read}\n+\n{quality}\n")
+            with open(os.path.join(directory, "MANIFEST"), "w") as fout:
+                fout.write(f"sample-id,filename,direction\nsample1,{fastq},forward\n")
+            with open(os.path.join(directory, "metadata.yml"), "w") as fout:
+                fout.write("{phred-offset: 33}\n")
+            reads = SingleLanePerSampleSingleEndFastqDirFmt(directory, mode="r")
+            hierarchical_classifier, hierarchical_filter = qiime.fit_all(
+                reference_reads, reference_taxonomy
+            )
+            classification = qiime.classify(query_reads, hierarchical_classifier)
+            pd.testing.assert_frame_equal(
+                classification,
+                qiime.classify_fastq(reads, hierarchical_classifier, min_quality=20),
+            )
+            pd.testing.assert_frame_equal(
+                qiime.filter(query_reads, hierarchical_filter, classification),
+                qiime.filter_fastq(
+                    reads, hierarchical_filter, classification, min_quality=20
+                ),
+            )
+
     def test_1_and_2(self):
         lr = LogisticRegression()
         lcpn = LocalClassifierPerParentNode(local_classifier=lr)
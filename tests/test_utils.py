@@ -1,10 +1,20 @@
+import argparse
+import bz2
+import functools
+import gzip
+import lzma
+import os
+import pickle
+import tempfile
 import unittest
+from collections import Counter
 from io import StringIO
 
 import numpy as np
 from hiclass import LocalClassifierPerParentNode
-from numpy.testing import assert_array_equal
+from numpy.testing import assert_array_almost_equal, assert_array_equal
 from pyfakefs.fake_filesystem_unittest import Patcher
+from scipy.sparse import csr_matrix
 
 from hitac import _utils
 from hitac._utils import (
@@ -14,6 +24,7 @@ from hitac._utils import (
     save_tsv,
     get_hierarchical_classifier,
     get_hierarchical_filter,
+    get_kmers,
     load_classification,
 )
 from hitac.filter import Filter
@@ -73,21 +84,434 @@ class TestUtils(unittest.TestCase):
         assert ground_truth.shape == results.shape
         assert np.array_equal(ground_truth, results)
 
-    def test_grouper_1(self):
-        elements = 5
-        items = [1, 2, 3, 4, 5]
-        ground_truth = np.array([items])
-        results = _utils.grouper(elements, items)
+    def test_frequency_3(self):
+        ground_truth = np.array([0, 0, 0, 1, 0, 0, 1, 0, 0, 0, 1, 0, 0, 0, 0, 0])
+        kmers = _utils.compute_possible_kmers(2)
+        results = _utils.compute_kmer_frequency("ATNCGGa", kmers)
         assert ground_truth.shape == results.shape
         assert np.array_equal(ground_truth, results)
 
-    def test_grouper_2(self):
-        elements = 3
-        items = [1, 2, 3, 4, 5]
-        ground_truth = np.array([[1, 2, 3], [4, 5]], dtype="object")
-        results = _utils.grouper(elements, items)
-        assert ground_truth.shape == results.shape
-        assert np.array_equal(ground_truth, results)
+    def test_encode_sequences(self):
+        codes, rows = _utils.encode_sequences([b"ACGTN", b"TG"])
+        assert_array_equal([0, 1, 2, 3, 4, 4, 3, 2], codes)
+        assert_array_equal([0, 0, 0, 0, 0, 0, 1, 1], rows)
+
+    def test_count_kmers(self):
+        sequences = [b"ACGTTGCAAC", b"GG", b"", b"TTNTTT"]
+        kmers = _utils.compute_possible_kmers(3)
+        ground_truth = np.zeros((len(sequences), len(kmers)), dtype=int)
+        for row, sequence in enumerate(sequences):
+            sequence = sequence.decode("utf-8")
+            for i in range(len(sequence) - 2):
+                column = np.flatnonzero(kmers == sequence[i : i + 3])
+                ground_truth[row, column] += 1
+        results = _utils.count_kmers(sequences, 3)
+        assert_array_equal(ground_truth, results)
+
+    def test_count_kmers_sparse(self):
+        sequences = [b"ACGTTGCAAC", b"GG", b"", b"TTNTTT"]
+        dense = _utils.count_kmers(sequences, 3)
+        results = _utils.count_kmers(sequences, 3, sparse=True)
+        assert isinstance(results, csr_matrix)
+        assert dense.shape == results.shape
+        assert_array_equal(dense, results.toarray())
+
+    def test_compute_possible_kmers_hashed(self):
+        results = _utils.compute_possible_kmers(12, hash_buckets=64, hash_seed=3)
+        assert isinstance(results, _utils.KmerVocabulary)
+        assert len(results) == 64
+        assert results.kmer_size == 12
+        assert results.hash_seed == 3
+
+    def test_kmer_vocabulary_names(self):
+        vocabulary = _utils.compute_possible_kmers(31)
+        assert isinstance(vocabulary, _utils.KmerVocabulary)
+        assert vocabulary.shape == (4**31,)
+        assert vocabulary[0] == "A" * 31
+        assert vocabulary[-1] == "T" * 31
+        assert_array_equal(["AC", "CC", "TT"], _utils.KmerVocabulary(2)[[1, 5, -1]])
+        assert_array_equal(
+            ["AA", "AC", "AG", "AT", "CA", "CC", "CG", "GA", "GC", "TA"],
+            _utils.KmerVocabulary(2, canonical=True),
+        )
+        assert_array_equal(
+            ["A", "C", "AA", "AC"],
+            _utils.KmerVocabulary([1, 2], canonical=True)[:4],
+        )
+        assert _utils.KmerVocabulary(None, spaced_seeds="1101")[6] == "AC-G"
+        hashed = _utils.KmerVocabulary([12, 13], hash_buckets=64)
+        assert hashed[64 + 37] == "13-mer bucket 37"
+        selected = _utils.KmerVocabulary(2, selection=[3, 15])
+        assert list(selected) == ["AT", "TT"]
+        with self.assertRaises(ValueError):
+            _utils.compute_possible_kmers(2, alphabet="ACGU")
+
+    def test_kmer_vocabulary_invalid_buckets(self):
+        with self.assertRaises(ValueError):
+            _utils.KmerVocabulary(6, hash_buckets=0)
+
+    def test_invalid_hash_seed(self):
+        for hash_seed in [-1, 2**64]:
+            with self.assertRaisesRegex(ValueError, "hash seed"):
+                _utils.compute_possible_kmers(12, hash_buckets=64, hash_seed=hash_seed)
+            with self.assertRaisesRegex(ValueError, "hash seed"):
+                _utils.count_kmers([b"ACGT"], 2, hash_buckets=8, hash_seed=hash_seed)
+        assert _utils.parse_hash_seed(str(2**64 - 1)) == 2**64 - 1
+        with self.assertRaises(argparse.ArgumentTypeError):
+            _utils.parse_hash_seed("-1")
+
+    def test_kmer_vocabulary_invalid_size(self):
+        for kmer_size in [0, 32, [6, 32]]:
+            with self.assertRaisesRegex(ValueError, "hash_buckets"):
+                _utils.compute_possible_kmers(kmer_size)
+            with self.assertRaisesRegex(ValueError, "hash_buckets"):
+                _utils.count_kmers([b"ACGT"], kmer_size)
+        with self.assertRaisesRegex(ValueError, "hash_buckets"):
+            _utils.KmerVocabulary(None, spaced_seeds="1" * 32)
+        assert len(_utils.compute_possible_kmers(32, hash_buckets=16)) == 16
+        assert _utils.count_kmers([b"A" * 40], 32, hash_buckets=16).sum() == 9
+
+    def test_kmer_vocabulary_canonical_length(self):
+        assert len(_utils.KmerVocabulary(1, canonical=True)) == 2
+        assert len(_utils.KmerVocabulary(2, canonical=True)) == 10
+        assert len(_utils.KmerVocabulary(5, canonical=True)) == 512
+        assert len(_utils.KmerVocabulary(6, canonical=True)) == 2080
+
+    def test_kmer_vocabulary_canonical_names(self):
+        complement = str.maketrans("ACGT", "TGCA")
+        for kmer_size in range(1, 8):
+            kmers = np.asarray(_utils.compute_possible_kmers(kmer_size))
+            canonical = [kmer <= kmer.translate(complement)[::-1] for kmer in kmers]
+            assert_array_equal(
+                kmers[canonical], _utils.KmerVocabulary(kmer_size, canonical=True)
+            )
+            values = np.flatnonzero(canonical).astype(np.uint64)
+            assert_array_equal(
+                np.arange(len(values)), _utils._rank_canonical(values, kmer_size)
+            )
+        vocabulary = _utils.KmerVocabulary(31, canonical=True)
+        assert vocabulary[0] == "A" * 31
+        assert vocabulary[-1] == "T" * 15 + "C" + "A" * 15
+
+    def test_count_kmers_canonical_large(self):
+        sequence = "ACGTTGCAAGGCTTAGCA" * 3
+        frequencies = _utils.count_kmers([sequence], 31, True, canonical=True)
+        vocabulary = _utils.KmerVocabulary(31, canonical=True)
+        self.assertEqual((1, len(vocabulary)), frequencies.shape)
+        complement = str.maketrans("ACGT", "TGCA")
+        expected = Counter(
+            min(kmer, kmer.translate(complement)[::-1])
+            for kmer in (sequence[i : i + 31] for i in range(len(sequence) - 30))
+        )
+        names = vocabulary[frequencies.indices]
+        self.assertEqual(expected, dict(zip(names, frequencies.data)))
+
+    def test_kmer_vocabulary_eq(self):
+        assert _utils.KmerVocabulary(6, True) == _utils.KmerVocabulary(6, True)
+        assert _utils.KmerVocabulary(6, True) != _utils.KmerVocabulary(6, False)
+        assert _utils.KmerVocabulary(6) != _utils.compute_possible_kmers(1)
+
+    def test_count_kmers_canonical(self):
+        # columns: AA, AC, AG, AT, CA, CC, CG, GA, GC, TA
+        # GT is counted as AC and TT as AA, CG is its own reverse complement
+        ground_truth = np.array(
+            [[1, 2, 0, 0, 0, 0, 1, 0, 0, 0], [1, 2, 0, 0, 0, 0, 1, 0, 0, 0]]
+        )
+        results = _utils.count_kmers([b"ACGTT", b"AACGT"], 2, canonical=True)
+        assert_array_equal(ground_truth, results)
+        sparse = _utils.count_kmers([b"ACGTT", b"AACGT"], 2, True, canonical=True)
+        assert_array_equal(ground_truth, sparse.toarray())
+
+    def test_count_kmers_ambiguous(self):
+        # columns: AA, AC, AG, AT, CA, CC, CG, CT, GA, GC, GG, GT, TA, TC, TG, TT
+        # AN is spread over AA, AC, AG and AT, and RT over AT and GT
+        results = _utils.count_kmers([b"ACAN", b"ART"], 2, max_ambiguous=1)
+        ground_truth = np.zeros((2, 16))
+        ground_truth[0, [0, 2, 3]] = 0.25
+        ground_truth[0, [1, 4]] = [1.25, 1]
+        ground_truth[1, [0, 2, 3, 11]] = [0.5, 0.5, 0.5, 0.5]
+        assert_array_almost_equal(ground_truth, results)
+        sparse = _utils.count_kmers([b"ACAN", b"ART"], 2, True, max_ambiguous=1)
+        assert_array_almost_equal(ground_truth, sparse.toarray())
+
+    def test_count_kmers_ambiguous_limit(self):
+        # NN exceeds the limit and X is not an IUPAC code, only AN and NA are counted
+        results = _utils.count_kmers([b"ANNA", b"AXA"], 2, max_ambiguous=1)
+        ground_truth = np.zeros((2, 16))
+        ground_truth[0, [0, 1, 2, 3, 4, 8, 12]] = [0.5] + [0.25] * 6
+        assert_array_almost_equal(ground_truth, results)
+        ambiguous = _utils.count_kmers([b"ANNA"], 3, max_ambiguous=2)
+        assert_array_almost_equal([2], ambiguous.sum(axis=1))
+
+    def test_count_kmers_soft_masked(self):
+        results = _utils.count_kmers([b"acgT", b"ACGT"], 2, max_ambiguous=0)
+        assert_array_equal(results[1], results[0])
+        strict = _utils.count_kmers([b"acgT"], 2)
+        assert_array_equal([0], strict.sum(axis=1))
+
+    def test_compute_frequencies_ambiguous(self):
+        kmers = _utils.compute_possible_kmers(2, max_ambiguous=1)
+        results = _utils.compute_frequencies([b"ACAN", b"ART"], kmers, 1, 1)
+        assert results.dtype == np.float64
+        assert_array_almost_equal([3, 2], results.sum(axis=1))
+
+    def test_count_kmers_multiple_sizes(self):
+        sequences = [b"ACGTTGCANGTCA", b"AC", b"TTGRCA"]
+        for parameters in [
+            {},
+            {"canonical": True},
+            {"hash_buckets": 16, "hash_seed": 3},
+            {"max_ambiguous": 1, "canonical": True},
+        ]:
+            results = _utils.count_kmers(sequences, [4, 2, 3], **parameters)
+            ground_truth = np.hstack(
+                [_utils.count_kmers(sequences, k, **parameters) for k in [2, 3, 4]]
+            )
+            assert_array_almost_equal(ground_truth, results)
+            sparse = _utils.count_kmers(sequences, [2, 3, 4], True, **parameters)
+            assert_array_almost_equal(ground_truth, sparse.toarray())
+
+    def test_count_kmers_spaced_seeds(self):
+        # AG, CT and GA, with the N at a skipped position
+        results = _utils.count_kmers([b"ACGTA", b"ANG"], None, spaced_seeds="101")
+        ground_truth = np.zeros((2, 16))
+        ground_truth[0, [2, 7, 8]] = 1
+        ground_truth[1, 2] = 1
+        assert_array_equal(ground_truth, results)
+        contiguous = _utils.count_kmers([b"ACGTTGCA"], 3)
+        assert_array_equal(
+            contiguous, _utils.count_kmers([b"ACGTTGCA"], None, spaced_seeds=["111"])
+        )
+
+    def test_count_kmers_spaced_seeds_canonical(self):
+        sequence = b"ACGGTTCAGTCAGGACTTACCNGAT"
+        reverse = sequence[::-1].translate(bytes.maketrans(b"ACGTN", b"TGCAN"))
+        for parameters in [{}, {"hash_buckets": 64}, {"max_ambiguous": 1}]:
+            results = _utils.count_kmers(
+                [sequence, reverse],
+                None,
+                canonical=True,
+                spaced_seeds=["11011", "1010101"],
+                **parameters,
+            )
+            assert_array_almost_equal(results[0], results[1])
+
+    def test_kmer_vocabulary_spaced_seeds(self):
+        vocabulary = _utils.compute_possible_kmers(spaced_seeds=["1101011", "11011"])
+        assert vocabulary.kmer_size is None
+        assert vocabulary.layout == [("1101011", 0, 1024), ("11011", 1024, 1280)]
+        with self.assertRaises(ValueError):
+            _utils.KmerVocabulary(None, spaced_seeds="0110")
+        with self.assertRaises(ValueError):
+            _utils.KmerVocabulary(None, canonical=True, spaced_seeds="1101")
+
+    def test_count_kmers_dtype(self):
+        results = _utils.count_kmers([b"A" * 300, b"ACGT"], 1, dtype="uint8")
+        assert results.dtype == np.uint8
+        assert_array_equal([[255, 0, 0, 0], [1, 1, 1, 1]], results)
+        sparse = _utils.count_kmers([b"A" * 300], 1, True, dtype="float32")
+        assert sparse.dtype == np.float32
+        assert_array_equal([[300, 0, 0, 0]], sparse.toarray())
+
+    def test_count_kmers_out(self):
+        sequences = [b"A" * 300, b"ACGT", b"", b"CCGTTA", b"AANAC"]
+        expected = _utils.count_kmers(sequences, 2, dtype="uint8")
+        output = np.ones((7, 16), dtype=np.uint8)
+        accumulate_size = _utils._ACCUMULATE_SIZE
+        _utils._ACCUMULATE_SIZE = 32
+        try:
+            result = _utils.count_kmers(sequences, 2, dtype="uint8", out=output[1:6])
+            blocks = _utils.count_kmers(sequences, 2, max_ambiguous=1)
+        finally:
+            _utils._ACCUMULATE_SIZE = accumulate_size
+        assert np.shares_memory(result, output)
+        assert_array_equal(expected, output[1:6])
+        assert_array_equal([1], np.unique(output[[0, 6]]))
+        assert_array_equal(_utils.count_kmers(sequences, 2, max_ambiguous=1), blocks)
+
+    def test_count_kmers_normalization(self):
+        results = _utils.count_kmers([b"AAAC", b"", b"CG"], 2, normalization="length")
+        assert_array_almost_equal(
+            [2 / 3, 1 / 3, 0], results[:, [0, 1, 6]].T.ravel()[::3]
+        )
+        assert_array_almost_equal([1, 0, 1], results.sum(axis=1))
+        idf = np.arange(16, dtype=float)
+        tfidf = _utils.count_kmers(
+            [b"AAAC"], 2, normalization="tfidf", idf=idf, dtype="float32"
+        )
+        assert tfidf.dtype == np.float32
+        assert_array_almost_equal([[0, 1 / 3] + [0] * 14], tfidf)
+
+    def test_compute_frequencies_tfidf(self):
+        sequences = [b"AAAC", b"ACGT", b"CCAA"]
+        for sparse in [False, True]:
+            kmers = _utils.compute_possible_kmers(2, normalization="tfidf")
+            results = _utils.compute_frequencies(sequences, kmers, 1, 2, sparse)
+            if sparse:
+                results = results.toarray()
+            tf = _utils.count_kmers(sequences, 2, normalization="length")
+            idf = np.log(4 / (1 + np.count_nonzero(tf, axis=0))) + 1
+            assert_array_almost_equal(idf, kmers.idf)
+            assert_array_almost_equal(tf * idf, results)
+            # the stored idf is reused for new sequences
+            assert_array_almost_equal(
+                results[:1], _utils.compute_frequencies(sequences[:1], kmers, 1)
+            )
+
+    def test_kmer_vocabulary_invalid_dtype(self):
+        with self.assertRaises(ValueError):
+            _utils.KmerVocabulary(6, dtype="uint8", normalization="length")
+        with self.assertRaises(ValueError):
+            _utils.KmerVocabulary(6, normalization="l2")
+
+    def test_kmer_vocabulary_layout(self):
+        vocabulary = _utils.compute_possible_kmers([5, 4], canonical=True)
+        assert vocabulary.kmer_size == [4, 5]
+        assert vocabulary.layout == [(4, 0, 136), (5, 136, 648)]
+        assert len(vocabulary) == 648
+        assert _utils.KmerVocabulary([6]) == _utils.KmerVocabulary(6)
+
+    def test_count_kmers_selection(self):
+        sequences = [b"ACGTTGCA", b"AAAACCCC"]
+        selection = np.array([0, 5, 15])
+        for normalization in [None, "length"]:
+            frequencies = _utils.count_kmers(sequences, 2, normalization=normalization)
+            assert_array_almost_equal(
+                frequencies[:, selection],
+                _utils.count_kmers(
+                    sequences, 2, normalization=normalization, selection=selection
+                ),
+            )
+        vocabulary = _utils.KmerVocabulary(2, selection=selection)
+        assert len(vocabulary) == 3
+        assert vocabulary != _utils.KmerVocabulary(2)
+
+    def test_select_features(self):
+        sequences = [b"ACGTTGCA", b"AAAACCCC", b"GGGGTTTT", b"ACACACAC"]
+        taxonomy = np.array([["a", "b"], ["a", "b"], ["a", "c"], ["a", "c"]])
+        kmers = _utils.compute_possible_kmers(2)
+        frequencies = _utils.compute_frequencies(sequences, kmers, 1)
+        assert _utils.select_features(frequencies, taxonomy, kmers) == (
+            frequencies,
+            kmers,
+        )
+        selected, vocabulary = _utils.select_features(
+            frequencies, taxonomy, kmers, n_kmers=5
+        )
+        assert selected.shape == (4, 5)
+        # AA, CC and GG only occur in one of the taxa, then ties keep the first k-mers
+        assert_array_equal([0, 4, 5, 6, 10], vocabulary.selection)
+        assert_array_equal(
+            selected, _utils.compute_frequencies(sequences, vocabulary, 1)
+        )
+        selected, vocabulary = _utils.select_features(
+            selected, taxonomy, vocabulary, variance_threshold=1
+        )
+        assert_array_equal([0, 4, 5, 10], vocabulary.selection)
+        assert_array_equal(
+            selected,
+            _utils.compute_frequencies(sequences, vocabulary, 1, sparse=True).toarray(),
+        )
+        with self.assertRaises(ValueError):
+            _utils.select_features(frequencies, taxonomy, kmers, variance_threshold=100)
+
+    def test_compute_training_features(self):
+        parser = argparse.ArgumentParser()
+        _utils.add_feature_arguments(parser)
+        args = parser.parse_args(
+            ["--spaced-seeds", "101,11", "--select-kmers", "5", "--threads", "1"]
+        )
+        options = _utils.get_feature_options(args)
+        self.assertEqual(["101", "11"], options["spaced_seeds"])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reference.fasta")
+            with open(path, "w") as fout:
+                fout.write(
+                    ">1;tax=d:a,p:b;\nACGTTGCA\n>2;tax=d:a,p:b;\nAAAACCCC\n"
+                    ">3;tax=d:a,p:c;\nGGGGTTTT\n>4;tax=d:a,p:c;\nACACACAC\n"
+                )
+            frequencies, taxonomy, sample_weight, kmers = (
+                _utils.compute_training_features(
+                    functools.partial(_utils.compute_reference_frequencies, path),
+                    **options,
+                )
+            )
+        self.assertEqual((4, 5), frequencies.shape)
+        self.assertEqual(["101", "11"], kmers.spaced_seeds)
+        self.assertIsNone(sample_weight)
+        assert_array_equal(["d:a", "p:c"], taxonomy[-1])
+        assert_array_equal(
+            frequencies,
+            _utils.compute_frequencies(
+                [b"ACGTTGCA", b"AAAACCCC", b"GGGGTTTT", b"ACACACAC"], kmers, 1
+            ),
+        )
+
+    def test_parse_kmer_size(self):
+        assert _utils.parse_kmer_size("6") == 6
+        assert _utils.parse_kmer_size("4,5,6") == [4, 5, 6]
+
+    def test_count_kmers_hashed_canonical(self):
+        sequence = b"ACGGTTCAGTCAGGACTTACCCGAT"
+        reverse = sequence[::-1].translate(bytes.maketrans(b"ACGT", b"TGCA"))
+        results = _utils.count_kmers(
+            [sequence, reverse], 11, hash_buckets=128, canonical=True
+        )
+        assert_array_equal(results[0], results[1])
+
+    def test_count_kmers_hashed(self):
+        sequences = [b"ACGTACGTACGTACGTAC", b"ACGTACGTACGTNCGTAC", b"TTTT"]
+        results = _utils.count_kmers(sequences, 12, hash_buckets=32, hash_seed=7)
+        assert results.shape == (3, 32)
+        assert_array_equal([7, 1, 0], results.sum(axis=1))
+        # the same k-mers fall into the same buckets
+        assert_array_equal(
+            results[0], _utils.count_kmers(sequences[:1], 12, False, 32, 7)[0]
+        )
+        other_seed = _utils.count_kmers(sequences, 12, hash_buckets=32, hash_seed=8)
+        assert not np.array_equal(results, other_seed)
+        sparse = _utils.count_kmers(
+            sequences, 12, sparse=True, hash_buckets=32, hash_seed=7
+        )
+        assert_array_equal(results, sparse.toarray())
+
+    def test_compute_frequencies_hashed(self):
+        sequences = (b"CCAACCGGTT", b"CGGGCCAATT")
+        kmers = _utils.compute_possible_kmers(9, hash_buckets=16)
+        results = _utils.compute_frequencies(sequences, kmers, 1)
+        assert results.shape == (2, 16)
+        assert_array_equal([2, 2], results.sum(axis=1))
+
+    def test_schedule_batches(self):
+        sequences = [b"A" * 10] * 5
+        self.assertEqual([(0, 5)], _utils.schedule_batches(sequences, 2))
+        self.assertEqual(
+            [(0, 2), (2, 4), (4, 5)], _utils.schedule_batches(sequences, 2, 2)
+        )
+        self.assertEqual([], _utils.schedule_batches([], 2))
+
+    def test_schedule_batches_balanced(self):
+        long = b"A" * (_utils._MIN_BATCH_BASES * 4)
+        short = b"A" * 99
+        sequences = [short] * 8000 + [long] + [short] * 4000
+        batches = _utils.schedule_batches(sequences, 4)
+        # Batches cover all sequences, contiguously and without overlaps
+        self.assertEqual(
+            list(range(len(sequences))),
+            [i for start, stop in sorted(batches) for i in range(start, stop)],
+        )
+        # The long sequence goes in its own batch, which is scheduled first
+        self.assertEqual((8000, 8001), batches[0])
+        bases = [
+            sum(len(sequence) + 1 for sequence in sequences[start:stop])
+            for start, stop in batches[1:]
+        ]
+        self.assertEqual(sorted(bases, reverse=True), bases)
+        total = sum(len(sequence) + 1 for sequence in sequences)
+        self.assertLessEqual(
+            max(bases),
+            max(total // (4 * _utils._BATCHES_PER_WORKER), _utils._MIN_BATCH_BASES),
+        )
 
     def test_compute_frequencies_1(self):
         sequences = (b"CCAACC", b"CGGGCC")
@@ -112,6 +536,209 @@ class TestUtils(unittest.TestCase):
         assert ground_truth.shape == results.shape
         assert np.array_equal(ground_truth, results)
 
+    def test_compute_frequencies_batches(self):
+        sequences = (b"CCAACC", b"CGGGCC", b"ACGT", b"TTTGA", b"G")
+        kmers = _utils.compute_possible_kmers(2)
+        ground_truth = _utils.count_kmers(sequences, 2)
+        results = _utils.compute_frequencies(sequences, kmers, 2, batch_size=2)
+        assert_array_equal(ground_truth, results)
+
+    def test_write_group_frequency(self):
+        kmers = _utils.compute_possible_kmers(1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "frequencies.dat")
+            output = np.memmap(path, dtype=np.int64, mode="w+", shape=(3, 4))
+            _utils.write_group_frequency(
+                ([b"CCAACC", b"CGGGCC"], kmers, path, (3, 4), 1)
+            )
+            assert_array_equal([[0, 0, 0, 0], [2, 4, 0, 0], [0, 3, 3, 0]], output)
+            del output
+
+    def test_feature_pool(self):
+        sequences = (b"CCAACC", b"CGGGCC")
+        kmers = _utils.compute_possible_kmers(1)
+        with _utils.FeaturePool(2, "process") as pool:
+            results = _utils.compute_frequencies(sequences, kmers, pool=pool)
+            executor = pool._executor
+            _utils.compute_frequencies(sequences, kmers, pool=pool)
+            self.assertIs(executor, pool._executor)
+            results_2 = _utils.compute_frequencies(
+                sequences, _utils.compute_possible_kmers(2), pool=pool
+            )
+            self.assertIsNot(executor, pool._executor)
+        self.assertIsNone(pool._executor)
+        assert_array_equal([[2, 4, 0, 0], [0, 3, 3, 0]], results)
+        assert results_2.shape == (2, 16)
+
+    def test_feature_pool_thread(self):
+        sequences = (b"CCAACC", b"CGGGCC", b"ACGT")
+        kmers = _utils.compute_possible_kmers(2)
+        with _utils.FeaturePool(2, "thread") as pool:
+            results = _utils.compute_frequencies(sequences, kmers, pool=pool)
+            executor = pool._executor
+            results_sparse = _utils.compute_frequencies(
+                sequences, kmers, pool=pool, sparse=True
+            )
+            self.assertIs(executor, pool._executor)
+        self.assertIsNone(pool._executor)
+        with _utils.FeaturePool(2, "process") as pool:
+            expected = _utils.compute_frequencies(sequences, kmers, pool=pool)
+        assert_array_equal(expected, results)
+        assert_array_equal(expected, results_sparse.toarray())
+        with self.assertRaises(ValueError):
+            _utils.FeaturePool(2, "fiber")
+
+    def test_get_feature_pool(self):
+        pool = _utils.get_feature_pool(2)
+        self.assertIs(pool, _utils.get_feature_pool(2))
+        self.assertEqual("thread", pool.backend)
+        self.assertIsNot(pool, _utils.get_feature_pool(1))
+        pool = _utils.get_feature_pool(1, "process")
+        self.assertEqual("process", pool.backend)
+        self.assertIs(pool, _utils.get_feature_pool(1))
+        _utils.shutdown_feature_pool()
+        self.assertIsNone(_utils._feature_pool)
+
+    def test_compute_frequencies_sparse(self):
+        sequences = (b"CCAACC", b"CGGGCC", b"ACGT")
+        kmers = _utils.compute_possible_kmers(2)
+        ground_truth = _utils.compute_frequencies(sequences, kmers, 1)
+        results = _utils.compute_frequencies(
+            sequences, kmers, 2, batch_size=2, sparse=True
+        )
+        assert isinstance(results, csr_matrix)
+        assert_array_equal(ground_truth, results.toarray())
+
+    def test_feature_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = _utils.FeatureCache(directory)
+            kmers = _utils.compute_possible_kmers(2, normalization="tfidf")
+            sequences = [b"ACGT", b"AAAC"]
+            key = cache.get_key(sequences, kmers)
+            assert key != cache.get_key(sequences, kmers, sparse=True)
+            assert key != cache.get_key(sequences[:1], kmers)
+            assert key != cache.get_key(sequences, _utils.compute_possible_kmers(2))
+            assert cache.load(key) is None
+            frequencies = _utils.compute_frequencies(sequences, kmers, 1)
+            cache.save(key, frequencies, np.array(["a", "b"]), kmers)
+            cached, labels, cached_kmers = cache.load(key)
+            assert_array_equal(frequencies, cached)
+            assert_array_equal(["a", "b"], labels)
+            assert cached_kmers == kmers
+            assert cached_kmers.idf is not None
+            sparse_key = cache.get_key(sequences, kmers, sparse=True)
+            cache.save(sparse_key, csr_matrix(frequencies), kmers=kmers)
+            cached, labels, _ = cache.load(sparse_key)
+            assert isinstance(cached, csr_matrix)
+            assert_array_equal(frequencies, cached.toarray())
+            assert labels is None
+
+    def test_feature_cache_eviction(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = _utils.FeatureCache(directory, max_size=1e-9)
+            cache.save("first", np.zeros((2, 2)))
+            cache.save("second", np.zeros((2, 2)))
+            assert cache.load("first") is None
+            assert cache.load("second") is not None
+
+    def test_split_fasta(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reference.fasta")
+            with open(path, "w") as fout:
+                fout.write("\n")
+                for i in range(20):
+                    fout.write(f">{i};tax=d:D{i % 3};\n" + "ACGT>" * i + "\n")
+            minimum = _utils._MIN_BATCH_BASES
+            _utils._MIN_BATCH_BASES = 1
+            try:
+                ranges = _utils.split_fasta(path, 6)
+                self.assertEqual(
+                    [(1, os.path.getsize(path))], _utils.split_fasta(path, 1)
+                )
+                kmers = _utils.compute_possible_kmers(2)
+                results = {}
+                for backend in ["thread", "process"]:
+                    with _utils.FeaturePool(2, backend) as pool:
+                        results[backend] = _utils.compute_fasta_frequencies(
+                            path, kmers, reference=True, pool=pool
+                        )
+                        _, sparse_frequencies = _utils.compute_fasta_frequencies(
+                            path, kmers, sparse=True, pool=pool
+                        )
+            finally:
+                _utils._MIN_BATCH_BASES = minimum
+            self.assertEqual(6, len(ranges))
+            self.assertEqual(1, ranges[0][0])
+            self.assertEqual(
+                [start for start, _ in ranges[1:]], [stop for _, stop in ranges[:-1]]
+            )
+            headers = []
+            sequences = []
+            for start, stop in ranges:
+                range_headers, range_sequences = _utils.parse_fasta_range(
+                    path, start, stop
+                )
+                headers.extend(range_headers)
+                sequences.extend(range_sequences)
+            self.assertEqual([f"{i};tax=d:D{i % 3};" for i in range(20)], headers)
+            expected_sequences, expected_taxonomy = load_fasta(path, reference=True)
+            self.assertEqual(expected_sequences, sequences)
+            expected = _utils.compute_frequencies(expected_sequences, kmers, 1)
+            for taxonomy, frequencies in results.values():
+                assert_array_equal(expected_taxonomy, taxonomy)
+                assert_array_equal(expected, frequencies)
+            assert_array_equal(expected, sparse_frequencies.toarray())
+            # Worker processes write their ranges into a memory-mapped matrix instead of
+            # returning blocks that are concatenated
+            self.assertIsInstance(results["process"][1], np.memmap)
+            self.assertNotIsInstance(results["thread"][1], np.memmap)
+
+    def test_compute_frequencies_tmp_dir(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reference.fasta")
+            with open(path, "w") as fout:
+                for i in range(20):
+                    fout.write(f">{i};tax=d:D{i % 3};\n" + "ACGT" * (i + 1) + "\n")
+            sequences, _ = load_fasta(path, reference=True)
+            kmers = _utils.compute_possible_kmers(2)
+            expected = _utils.compute_frequencies(sequences, kmers, 1)
+            tmp_dir = os.path.join(directory, "tmp")
+            minimum = _utils._MIN_BATCH_BASES
+            _utils._MIN_BATCH_BASES = 1
+            try:
+                with _utils.FeaturePool(2, "process") as pool:
+                    for frequencies in [
+                        _utils.compute_frequencies(
+                            sequences, kmers, pool=pool, tmp_dir=tmp_dir
+                        ),
+                        _utils.compute_fasta_frequencies(
+                            path, kmers, pool=pool, tmp_dir=tmp_dir
+                        )[1],
+                    ]:
+                        assert_array_equal(expected, frequencies)
+                        self.assertEqual(tmp_dir, os.path.dirname(frequencies.filename))
+            finally:
+                _utils._MIN_BATCH_BASES = minimum
+            self.assertEqual([], os.listdir(tmp_dir))
+
+    def test_compute_reference_frequencies(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reference.fasta")
+            with open(path, "w") as fout:
+                fout.write(">1;tax=d:Fungi,p:Ascomycota;\nACGT\n")
+                fout.write(">2;tax=d:Fungi,p:Basidiomycota;\nAACC\n")
+            cache = _utils.FeatureCache(os.path.join(directory, "cache"))
+            kmers = _utils.compute_possible_kmers(2)
+            frequencies, taxonomy, _ = _utils.compute_reference_frequencies(
+                path, kmers, 1, cache=cache
+            )
+            cached, cached_taxonomy, _ = _utils.compute_reference_frequencies(
+                path, kmers, 1, cache=cache
+            )
+            assert cached.filename.startswith(cache.directory)
+            assert_array_equal(frequencies, cached)
+            assert_array_equal(taxonomy, cached_taxonomy)
+
     def test_extract_qiime2_ranks_1(self):
         taxonomy = (
             "d__Fungi; p__Ascomycota; c__Orbiliomycetes; "
@@ -477,6 +1104,349 @@ class TestUtils(unittest.TestCase):
             self.assertSequenceEqual(ground_truth_sequences, sequences)
             self.assertSequenceEqual(ground_truth_ids, ids)
 
+    def test_iter_fasta(self):
+        with Patcher() as patcher:
+            contents = ">1\nCCGAG\n>2 description\nACGAAT\nACTCTC\n>3\nTTGAAATA\n"
+            patcher.fs.create_file("reads.fasta", contents=contents)
+            chunks = list(_utils.iter_fasta("reads.fasta", chunk_size=2))
+            self.assertEqual(
+                [
+                    (["1", "2 description"], [b"CCGAG", b"ACGAATACTCTC"]),
+                    (["3"], [b"TTGAAATA"]),
+                ],
+                chunks,
+            )
+            self.assertEqual([], list(_utils.iter_fasta("reads.fasta", 3))[1:])
+
+    def test_load_fasta_mapped(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reference.fasta")
+            with open(path, "wb") as fout:
+                fout.write(
+                    b">1;tax=d:Fungi,p:Ascomycota; \r\nCCG\r\nAG\r\n>2;tax=d:Fungi,p:Basidiomycota;\n>3;tax=d:Fungi;\nTT GA"
+                )
+            sequences, taxonomy = load_fasta(fasta_path=path, reference=True)
+            self.assertIsInstance(sequences, _utils.SequenceBuffer)
+            self.assertEqual([b"CCGAG", b"", b"TTGA"], list(sequences))
+            assert_array_equal([0, 5, 5, 9], sequences.offsets)
+            self.assertEqual(
+                [
+                    ["d:Fungi", "p:Ascomycota"],
+                    ["d:Fungi", "p:Basidiomycota"],
+                    ["d:Fungi"],
+                ],
+                list(taxonomy),
+            )
+            _, ids = load_fasta(fasta_path=path, reference=False)
+            self.assertEqual(
+                [
+                    "1;tax=d:Fungi,p:Ascomycota;",
+                    "2;tax=d:Fungi,p:Basidiomycota;",
+                    "3;tax=d:Fungi;",
+                ],
+                ids,
+            )
+
+    def test_iter_fasta_windows(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reads.fasta")
+            with open(path, "w") as fout:
+                for i in range(20):
+                    fout.write(f">{i}\n" + "ACGT" * i + "\n")
+            window = _utils._FASTA_WINDOW
+            _utils._FASTA_WINDOW = 7
+            try:
+                chunks = list(_utils.iter_fasta(path, chunk_size=6))
+            finally:
+                _utils._FASTA_WINDOW = window
+            self.assertEqual([6, 6, 6, 2], [len(ids) for ids, _ in chunks])
+            self.assertEqual(
+                [str(i) for i in range(20)], sum([ids for ids, _ in chunks], [])
+            )
+            self.assertEqual(
+                [b"ACGT" * i for i in range(20)],
+                [sequence for _, sequences in chunks for sequence in sequences],
+            )
+
+    def test_packed_sequences(self):
+        sequences = [b"ACGTA", b"", b"NNacGT", b"T", b"ACGTRYACGT"]
+        packed = _utils.PackedSequences.from_sequences(sequences)
+        self.assertEqual(sequences, packed)
+        self.assertEqual(6, len(packed.packed))
+        assert_array_equal([[7], [2]], packed.case_runs)
+        gaps, lengths, values = packed.exception_runs
+        assert_array_equal([5, 9, 0], gaps)
+        assert_array_equal([2, 1, 1], lengths)
+        self.assertEqual(b"NRY", values.tobytes())
+        self.assertEqual(b"T", packed[-2])
+        for start in range(len(sequences)):
+            for stop in range(start, len(sequences) + 1):
+                self.assertEqual(sequences[start:stop], packed[start:stop])
+                self.assertEqual(
+                    sequences[start:stop],
+                    pickle.loads(pickle.dumps(packed[start:stop])),
+                )
+        self.assertEqual(2, len(packed[2:4].packed))
+        buffer, rows = _utils._join_sequences(packed[1:])
+        expected_buffer, expected_rows = _utils._join_sequences(sequences[1:])
+        assert_array_equal(expected_buffer, buffer)
+        assert_array_equal(expected_rows, rows)
+        kmers = _utils.compute_possible_kmers(2, max_ambiguous=1)
+        assert_array_equal(
+            _utils.compute_frequencies(sequences, kmers, 1),
+            _utils.compute_frequencies(packed, kmers, 1),
+        )
+        self.assertEqual(
+            sequences, _utils.PackedSequences.from_sequences(packed.unpack())
+        )
+        self.assertEqual([], _utils.PackedSequences.from_sequences([]))
+
+    def test_packed_sequences_codes(self):
+        sequences = [b"ACGTA", b"", b"NNacGT", b"T", b"ACGTRYacgt", b"gN"]
+        packed = _utils.PackedSequences.from_sequences(sequences)
+        for start in range(len(sequences)):
+            for stop in range(start + 1, len(sequences) + 1):
+                buffer, rows = _utils._join_sequences(sequences[start:stop])
+                for soft_masked, table in [
+                    (False, _utils._BASE_CODES),
+                    (True, _utils._SOFT_MASKED_BASE_CODES),
+                ]:
+                    codes, masks, separators, packed_rows = packed[
+                        start:stop
+                    ].join_codes(soft_masked, ambiguous=True)
+                    assert_array_equal(table[buffer], codes)
+                    assert_array_equal(_utils._IUPAC_MASKS[buffer], masks)
+                    assert_array_equal(buffer == _utils._NEWLINE, separators)
+                    assert_array_equal(rows, packed_rows)
+        for max_ambiguous in [None, 0, 2]:
+            for spaced_seeds in [None, ["101"]]:
+                parameters = dict(
+                    kmer_size=3, max_ambiguous=max_ambiguous, spaced_seeds=spaced_seeds
+                )
+                assert_array_equal(
+                    _utils.count_kmers(sequences, **parameters),
+                    _utils.count_kmers(packed, **parameters),
+                )
+
+    def test_packed_sequences_size(self):
+        rng = np.random.default_rng(0)
+        bases = rng.choice(np.frombuffer(b"ACGT", dtype=np.uint8), 300000)
+        ambiguous = bases.copy()
+        ambiguous[rng.random(len(bases)) < 0.1] = ord("N")
+        for buffer, limit in [
+            (bases, len(bases) // 4 + 2000),
+            (bases | _utils._LOWERCASE_BIT, len(bases) // 4 + 2000),
+            (ambiguous, len(bases)),
+        ]:
+            sequences = [buffer[i : i + 1500].tobytes() for i in range(0, 300000, 1500)]
+            packed = _utils.PackedSequences.from_sequences(sequences)
+            self.assertEqual(sequences, packed)
+            self.assertLess(packed.nbytes, limit)
+
+    def test_compressed_fasta(self):
+        contents = b">1;tax=d:Fungi;\nCCGAG\n>2;tax=d:Fungi;\nACGAAT\nACTCTC\n"
+        with tempfile.TemporaryDirectory() as directory:
+            for name, compress in [
+                ("reads.fasta.gz", gzip.compress),
+                ("reads.fasta.bz2", bz2.compress),
+                ("reads.fasta.xz", lzma.compress),
+            ]:
+                path = os.path.join(directory, name)
+                with open(path, "wb") as fout:
+                    fout.write(compress(contents))
+                sequences, taxonomy = load_fasta(fasta_path=path, reference=True)
+                self.assertEqual([b"CCGAG", b"ACGAATACTCTC"], sequences)
+                self.assertEqual([["d:Fungi"], ["d:Fungi"]], taxonomy.tolist())
+                kmers = _utils.compute_possible_kmers(2)
+                _, frequencies = _utils.compute_fasta_frequencies(
+                    path, kmers, 1, reference=True
+                )
+                assert_array_equal(
+                    _utils.compute_frequencies(sequences, kmers, 1), frequencies
+                )
+                window = _utils._FASTA_WINDOW
+                _utils._FASTA_WINDOW = 4
+                try:
+                    chunks = list(_utils.iter_fasta(path, chunk_size=1))
+                finally:
+                    _utils._FASTA_WINDOW = window
+                self.assertEqual(
+                    [
+                        (["1;tax=d:Fungi;"], [b"CCGAG"]),
+                        (["2;tax=d:Fungi;"], [b"ACGAATACTCTC"]),
+                    ],
+                    chunks,
+                )
+
+    def test_compressed_fasta_error(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reads.fasta.gz")
+            with open(path, "wb") as fout:
+                fout.write(gzip.compress(b">1\nACGT\n")[:-8])
+            with self.assertRaises(EOFError):
+                list(_utils.iter_fasta(path))
+
+    def test_iter_fastq(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reads.fastq")
+            with open(path, "wb") as fout:
+                fout.write(
+                    b"@1 description\nACGTACGT\n+\nIIII#III\n@2\r\nGGGG\r\n+2\r\n@@@@\r\n@3\nAC\n+\n!I"
+                )
+            sequences, ids = load_fasta(fasta_path=path, reference=False)
+            self.assertEqual([b"ACGTACGT", b"GGGG", b"AC"], sequences)
+            self.assertEqual(["1 description", "2", "3"], ids)
+            window = _utils._FASTA_WINDOW
+            _utils._FASTA_WINDOW = 5
+            try:
+                chunks = list(_utils.iter_fasta(path, chunk_size=2, min_quality=20))
+            finally:
+                _utils._FASTA_WINDOW = window
+            self.assertEqual(
+                [
+                    (["1 description", "2"], [b"ACGT.CGT", b"GGGG"]),
+                    (["3"], [b".C"]),
+                ],
+                chunks,
+            )
+            frequencies = _utils.count_kmers(chunks[0][1], 2, max_ambiguous=1)
+            self.assertEqual(5, frequencies[0].sum())
+            with open(path, "wb") as fout:
+                fout.write(b"@1\nACGT\n+\nIII\n")
+            with self.assertRaisesRegex(ValueError, "'1' must have the same length"):
+                load_fasta(fasta_path=path, reference=False)
+
+    def test_fastq_whitespace(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reads.fastq")
+            with open(path, "wb") as fout:
+                fout.write(b"\n \n@1\nACGT\n+\n@III\n@2\nGG\n+\nII\n\n\n")
+            sequences, ids = load_fasta(fasta_path=path, reference=False)
+            self.assertEqual([b"ACGT", b"GG"], sequences)
+            self.assertEqual(["1", "2"], ids)
+            window = _utils._FASTA_WINDOW
+            _utils._FASTA_WINDOW = 3
+            try:
+                chunks = list(_utils.iter_fasta(path, chunk_size=1))
+            finally:
+                _utils._FASTA_WINDOW = window
+            self.assertEqual([(["1"], [b"ACGT"]), (["2"], [b"GG"])], chunks)
+
+    def test_fastq_truncated(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reads.fastq")
+            for contents in [
+                b"@1\nACGT\n+\nIIII\n@2 read\nGG\n+\n",
+                b"@1\nACGT\n+\nIIII\n@2 read\nGG\n+\nI",
+                b"@1\nACGT\n+\nIIII\n@2 read\nGG\n",
+            ]:
+                with open(path, "wb") as fout:
+                    fout.write(contents)
+                with self.assertRaisesRegex(
+                    ValueError, "Truncated FASTQ record '2 read'"
+                ):
+                    load_fasta(fasta_path=path, reference=False)
+                with self.assertRaisesRegex(
+                    ValueError, "Truncated FASTQ record '2 read'"
+                ):
+                    list(_utils.iter_fasta(path))
+
+    def test_sequence_buffer(self):
+        sequences = _utils.SequenceBuffer(
+            np.frombuffer(b"ACGTAAC", dtype=np.uint8), np.array([0, 4, 4, 7])
+        )
+        self.assertEqual(3, len(sequences))
+        self.assertEqual(b"AAC", sequences[-1])
+        self.assertEqual([b"", b"AAC"], sequences[1:])
+        assert_array_equal([0, 0, 3], sequences[1:].offsets)
+        self.assertEqual([b"ACGT", b"AAC"], sequences[::2])
+        with self.assertRaises(IndexError):
+            sequences[3]
+        buffer, rows = _utils._join_sequences(sequences)
+        self.assertEqual(b"ACGT\n\nAAC", buffer.tobytes())
+        assert_array_equal(_utils._join_sequences(list(sequences))[1], rows)
+        self.assertEqual([(0, 3)], _utils.schedule_batches(sequences, 1))
+        assert_array_equal(
+            _utils.compute_frequencies(
+                list(sequences), _utils.compute_possible_kmers(2), 1
+            ),
+            _utils.compute_frequencies(sequences, _utils.compute_possible_kmers(2), 1),
+        )
+
+    def test_iter_frequencies(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reads.fasta")
+            with open(path, "w") as fout:
+                fout.write(">1\nACGT\n>2\nAAAA\n>3\nCCGG\n")
+            kmers = _utils.compute_possible_kmers(2)
+            chunks = list(_utils.iter_frequencies(path, kmers, 2, 1))
+            self.assertEqual([["1", "2"], ["3"]], [ids for ids, _ in chunks])
+            assert_array_equal(
+                _utils.compute_frequencies([b"ACGT", b"AAAA", b"CCGG"], kmers, 1),
+                np.vstack([frequencies for _, frequencies in chunks]),
+            )
+
+    def test_iter_frequencies_dereplicate(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "reads.fasta")
+            with open(path, "w") as fout:
+                fout.write(">1\nACGT\n>2\nAAAA\n>3\nACGT\n>4\nCCGG\n")
+            kmers = _utils.compute_possible_kmers(2)
+            chunks = list(_utils.iter_frequencies(path, kmers, 3, 1, dereplicate=True))
+            self.assertEqual([["1", "2", "3"], ["4"]], [ids for ids, _, _ in chunks])
+            self.assertEqual([2, 1], [len(x) for _, x, _ in chunks])
+            assert_array_equal(
+                _utils.compute_frequencies(
+                    [b"ACGT", b"AAAA", b"ACGT", b"CCGG"], kmers, 1
+                ),
+                np.vstack([x[inverse] for _, x, inverse in chunks]),
+            )
+
+    def test_dereplicate_sequences(self):
+        unique_sequences, inverse = _utils.dereplicate_sequences(
+            [b"ACGT", b"AAAA", b"ACGT", b"acgt", b"AAAA"]
+        )
+        self.assertEqual([b"ACGT", b"AAAA", b"acgt"], unique_sequences)
+        assert_array_equal([0, 1, 0, 2, 1], inverse)
+        unique_sequences, inverse = _utils.dereplicate_sequences([])
+        self.assertEqual([], unique_sequences)
+        self.assertEqual(0, len(inverse))
+
+    def test_iter_classification(self):
+        with Patcher() as patcher:
+            contents = (
+                "1\td:Fungi,p:Ascomycota\n2\td:Fungi\n3\td:Fungi,p:Basidiomycota\n"
+            )
+            patcher.fs.create_file("classification.tsv", contents=contents)
+            chunks = list(_utils.iter_classification("classification.tsv", 2))
+            self.assertEqual(2, len(chunks))
+            self.assertEqual(["d:Fungi", "p:Ascomycota"], chunks[0][0])
+            self.assertEqual(["d:Fungi"], chunks[0][1])
+            assert_array_equal([["d:Fungi", "p:Basidiomycota"]], chunks[1])
+            ids, classification = next(
+                _utils.iter_classification("classification.tsv", 2, ids=True)
+            )
+            self.assertEqual(["1", "2"], ids)
+            assert_array_equal(chunks[0], classification)
+
+    def test_zip_classification(self):
+        with Patcher() as patcher:
+            contents = (
+                "1\td:Fungi,p:Ascomycota\n2\td:Fungi\n3\td:Fungi,p:Basidiomycota\n"
+            )
+            patcher.fs.create_file("classification.tsv", contents=contents)
+            chunks = [(["1", "2"], "x1"), (["3"], "x2")]
+            pairs = list(_utils.zip_classification(chunks, "classification.tsv", 2))
+            self.assertEqual(chunks, [chunk for chunk, _ in pairs])
+            assert_array_equal([["d:Fungi", "p:Basidiomycota"]], pairs[1][1])
+            for chunks in [
+                [(["1", "2"], "x1")],
+                [(["1", "2"], "x1"), (["3"], "x2"), (["4"], "x3")],
+                [(["1", "3"], "x1"), (["2"], "x2")],
+            ]:
+                with self.assertRaises(ValueError):
+                    list(_utils.zip_classification(chunks, "classification.tsv", 2))
+
     def test_convert_taxonomy_to_taxxi(self):
         ground_truth = [
             "d:Fungi,p:Ascomycota,c:Sordariomycetes",
@@ -521,6 +1491,47 @@ class TestUtils(unittest.TestCase):
         print(content)
         self.assertEqual(ground_truth, content)
 
+    def test_reduce_redundancy(self):
+        frequencies = np.array(
+            [[4, 0, 0], [4, 0, 0], [0, 4, 0], [4, 0, 1], [4, 0, 0], [0, 0, 4]]
+        )
+        taxonomy = np.array([["a", "b"]] * 4 + [["a", "c"]] * 2)
+        x, y, sample_weight = _utils.reduce_redundancy(frequencies, taxonomy)
+        self.assertIs(frequencies, x)
+        self.assertIs(taxonomy, y)
+        self.assertIsNone(sample_weight)
+        for matrix in [frequencies, csr_matrix(frequencies)]:
+            x, y, sample_weight = _utils.reduce_redundancy(matrix, taxonomy, 0.9)
+            x = x.toarray() if hasattr(x, "toarray") else x
+            # [4, 0, 1] is close to [4, 0, 0], but [4, 0, 0] of another taxon is kept
+            assert_array_equal(frequencies[[0, 2, 4, 5]], x)
+            assert_array_equal(taxonomy[[0, 2, 4, 5]], y)
+            assert_array_equal([3, 1, 1, 1], sample_weight)
+        # Without similarity, only identical profiles are merged
+        x, y, sample_weight = _utils.reduce_redundancy(
+            frequencies, taxonomy, max_per_taxon=10
+        )
+        assert_array_equal(frequencies[[0, 2, 3, 4, 5]], x)
+        assert_array_equal([2, 1, 1, 1, 1], sample_weight)
+        x, y, sample_weight = _utils.reduce_redundancy(
+            frequencies, taxonomy, max_per_taxon=1
+        )
+        assert_array_equal(frequencies[[0, 4]], x)
+        assert_array_equal([4, 2], sample_weight)
+
+    def test_fit_with_sample_weight(self):
+        x_train = _utils.compute_frequencies(
+            ["ACGTACGTAC", "ACGTACGTAA", "TTGCATTGCA"],
+            _utils.compute_possible_kmers(2),
+            threads=1,
+        )
+        y_train = np.array([["a", "b"], ["a", "b"], ["c", "d"]])
+        hierarchical_classifier, hierarchical_filter = _utils.fit_classifier_and_filter(
+            x_train, y_train, threads=1, sample_weight=np.array([1.0, 1.0, 2.0])
+        )
+        assert_array_equal(y_train, hierarchical_classifier.predict(x_train))
+        assert_array_equal([1.0, 1.0, 2.0], hierarchical_filter.sample_weight_)
+
     def test_get_hierarchical_classifier(self):
         threads = 1
         hierarchical_classifier = get_hierarchical_classifier(threads)
@@ -531,6 +1542,82 @@ class TestUtils(unittest.TestCase):
         hierarchical_classifier = get_hierarchical_filter(threads)
         self.assertIsInstance(hierarchical_classifier, Filter)
 
+    def test_fit_classifier_and_filter(self):
+        x_train = _utils.compute_frequencies(
+            ["ACGTACGTAC", "ACGTACGTAA", "TTGCATTGCA", "TTGCATTGCC"],
+            _utils.compute_possible_kmers(2),
+            threads=1,
+        )
+        y_train = np.array([["a", "b"], ["a", "b"], ["c", "d"], ["c", "d"]])
+        for parallel in [False, True]:
+            hierarchical_classifier, hierarchical_filter = (
+                _utils.fit_classifier_and_filter(
+                    x_train, y_train, threads=2 if parallel else 1, parallel=parallel
+                )
+            )
+            self.assertIsInstance(hierarchical_classifier, LocalClassifierPerParentNode)
+            self.assertIsInstance(hierarchical_filter, Filter)
+            self.assertEqual(hierarchical_classifier.n_jobs, 1)
+            self.assertEqual(hierarchical_filter.n_jobs, 1)
+            assert_array_equal(y_train, hierarchical_classifier.predict(x_train))
+
+    def test_get_kmers(self):
+        hierarchical_classifier = get_hierarchical_classifier(1)
+        assert_array_equal(
+            _utils.compute_possible_kmers(3), get_kmers(hierarchical_classifier, 3)
+        )
+        hierarchical_classifier.kmers_ = _utils.KmerVocabulary(12, hash_buckets=128)
+        kmers = get_kmers(hierarchical_classifier, 3)
+        self.assertIs(hierarchical_classifier.kmers_, kmers)
+        # Arrays of k-mers recorded by earlier versions are turned into vocabularies
+        hierarchical_classifier.kmers_ = np.array(["AA", "AC", "AG", "AT"])
+        self.assertEqual(
+            _utils.KmerVocabulary(2), get_kmers(hierarchical_classifier, 3)
+        )
+
+    def test_get_shared_kmers(self):
+        classifier = get_hierarchical_classifier(1)
+        hierarchical_filter = get_hierarchical_filter(1)
+        assert_array_equal(
+            _utils.compute_possible_kmers(3),
+            _utils.get_shared_kmers(classifier, hierarchical_filter, 3),
+        )
+        classifier.kmers_ = _utils.KmerVocabulary(12, hash_buckets=128)
+        with self.assertRaises(ValueError):
+            _utils.get_shared_kmers(classifier, hierarchical_filter, 3)
+        hierarchical_filter.kmers_ = _utils.KmerVocabulary(12, hash_buckets=128)
+        kmers = _utils.get_shared_kmers(classifier, hierarchical_filter, 3)
+        self.assertIs(classifier.kmers_, kmers)
+
+    def test_classify_and_filter(self):
+        x_train = _utils.compute_frequencies(
+            ["ACGTACGTAC", "ACGTACGTAA", "TTGCATTGCA", "TTGCATTGCC"],
+            _utils.compute_possible_kmers(2),
+            threads=1,
+        )
+        y_train = np.array([["a", "b"], ["a", "b"], ["c", "d"], ["c", "d"]])
+        classifier, hierarchical_filter = _utils.fit_classifier_and_filter(
+            x_train, y_train, threads=1
+        )
+        predictions, filtered_predictions, confidence = _utils.classify_and_filter(
+            x_train, classifier, hierarchical_filter, 0
+        )
+        assert_array_equal(y_train, predictions)
+        expected = _utils.compute_confidence(
+            predictions,
+            hierarchical_filter.classes_,
+            hierarchical_filter.predict_proba(x_train),
+            0,
+        )
+        self.assertEqual(expected, (filtered_predictions, confidence))
+        inverse = np.array([3, 0, 3])
+        predictions, filtered_predictions, confidence = _utils.classify_and_filter(
+            x_train, classifier, hierarchical_filter, 0, inverse
+        )
+        assert_array_equal(y_train[inverse], predictions)
+        self.assertEqual([expected[0][i] for i in inverse], filtered_predictions)
+        self.assertEqual([expected[1][i] for i in inverse], confidence)
+
     def test_load_classification(self):
         with Patcher() as patcher:
             classification_contents = "1;tax=d:Fungi,p:Ascomycota,c:Sordariomycetes;\td:Fungi,p:Ascomycota,c:Sordariomycetes\n"